@@ -11,6 +11,7 @@ from django.utils import timezone
 
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
+from django.db.models.functions import Lower
 
 from dxpcore.utils.services import send_mail
 
@@ -48,6 +49,15 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['phone', 'name']
 
+    class Meta:
+        indexes = [
+            # admin user listing: keyset pagination on (name, id)
+            models.Index(fields=['name', 'id'], condition=models.Q(deleted=False), name='user_listing_idx'),
+            # case-insensitive prefix search on name and email
+            models.Index(Lower('name'), name='user_name_lower_idx'),
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Blog, BlogView, ChatRoom, FriendRequest, Hotel, Political, TouristSite, Message
+from .models import Blog, BlogView, BlogViewDaily, ChatRoom, FriendRequest, Hotel, ImageDerivative, ImageSource, Political, StatCounter, TouristSite, Message, UserEvent
 
 
 @admin.register(Hotel)
@@ -21,7 +21,7 @@ class TouristSiteAdmin(admin.ModelAdmin):
 
 @admin.register(Blog)
 class BlogAdmin(admin.ModelAdmin):
-    list_display = ('title', 'writer', 'is_published', 'created_at')
+    list_display = ('title', 'writer', 'is_published', 'view_count', 'created_at')
     search_fields = ('title', 'writer__name')
     list_filter = ('is_published', 'created_at')
 
@@ -30,12 +30,29 @@ class BlogViewAdmin(admin.ModelAdmin):
     list_display = ('user', 'blog', 'ip_address', 'created_at')
     search_fields = ('user__name', 'blog__title', 'ip_address')
 
+@admin.register(BlogViewDaily)
+class BlogViewDailyAdmin(admin.ModelAdmin):
+    list_display = ('blog', 'day', 'views')
+    search_fields = ('blog__title',)
+    list_filter = ('day',)
+
+@admin.register(StatCounter)
+class StatCounterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value')
+    search_fields = ('name',)
+
 @admin.register(FriendRequest)
 class FriendRequestAdmin(admin.ModelAdmin):
     list_display = ('sender', 'receiver', 'created_at')
     search_fields = ('sender__name', 'receiver__name')
     list_filter = ('created_at',)
 
+@admin.register(UserEvent)
+class UserEventAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'title', 'created_at')
+    search_fields = ('user__name', 'title')
+    list_filter = ('kind', 'created_at')
+
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
     list_display = ('id', 'room_id', 'name', 'is_group', 'created_at')
@@ -46,4 +63,18 @@ class ChatRoomAdmin(admin.ModelAdmin):
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'room', 'sender', 'content', 'timestamp')
     search_fields = ('room__name', 'sender__name', 'content')
-    list_filter = ('timestamp',)
\ No newline at end of file
+    list_filter = ('timestamp',)
+
+
+@admin.register(ImageSource)
+class ImageSourceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'width', 'height', 'attempts', 'processed_at')
+    search_fields = ('name',)
+    list_filter = ('status',)
+
+
+@admin.register(ImageDerivative)
+class ImageDerivativeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'source', 'variant', 'format', 'width', 'height', 'size')
+    search_fields = ('source__name', 'file')
+    list_filter = ('variant', 'format')
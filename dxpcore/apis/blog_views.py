@@ -0,0 +1,197 @@
+'''
+Buffered blog view ingestion.
+
+Reading a blog does not write to the database: ViewBlogAPI calls
+record_view(), which stores the event in the 'buffers' cache under a number
+taken from an atomic counter. flush_views() (manage.py flushblogviews) moves
+the buffered events to the database in bulk -- BlogView rows, BlogViewDaily
+counts, unique reader sketches, Blog.view_count and the dashboard stats
+(apis.stats) -- in one transaction that also advances a RollupCheckpoint,
+so a run that dies halfway is simply done again and nothing is counted
+twice. The Blog content version is bumped once it commits.
+
+A run only consumes the events numbered up to what the previous run saw, so
+an event whose number was taken but not yet written to the cache is never
+skipped. Events evicted from the cache before a flush are lost and
+reported as dropped, which is why production keeps the buffers on their own
+noeviction Redis instance (see CACHES in settings).
+
+Raw BlogView rows are deleted after BLOG_VIEW_RETENTION; the counts live
+on in the rollups.
+'''
+
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.models import User
+from apis import stats
+from apis.models import Blog, BlogUniqueSketch, BlogView, BlogViewDaily, RollupCheckpoint
+from apis.versions import bump_model_version
+from dxpcore.utils.hll import HyperLogLog
+
+# events wait in the 'buffers' cache, which must not evict them
+buffer = caches['buffers']
+SEQUENCE_KEY = 'blog_views:sequence'
+# buffered events must be flushed within this time
+EVENT_TIMEOUT = 24 * 60 * 60
+CHECKPOINT = 'blog_views'
+FLUSH_CHUNK = 1000
+BLOG_VIEW_RETENTION = timedelta(days=90)
+
+
+def event_key(number):
+    return f'blog_views:event:{number}'
+
+
+def record_view(blog_id, user_id=None, ip_address=None):
+    '''Buffers one read of a blog'''
+    buffer.add(SEQUENCE_KEY, 0, None)
+    try:
+        number = buffer.incr(SEQUENCE_KEY)
+    except ValueError:
+        # the counter was evicted between add and incr
+        buffer.add(SEQUENCE_KEY, 0, None)
+        number = buffer.incr(SEQUENCE_KEY)
+    buffer.set(event_key(number), (blog_id, user_id, ip_address, time.time()), EVENT_TIMEOUT)
+
+
+def flush_views(chunk_size=FLUSH_CHUNK):
+    '''Moves buffered events into the database and returns (flushed, dropped)'''
+    sequence = buffer.get(SEQUENCE_KEY, 0)
+    flushed = dropped = 0
+    with transaction.atomic():
+        checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT)
+        start, end = checkpoint.position, checkpoint.horizon
+        if sequence < end:
+            # the counter started over (cache flushed or restarted)
+            start = end = 0
+        for first in range(start + 1, end + 1, chunk_size):
+            keys = [event_key(number) for number in range(first, min(first + chunk_size, end + 1))]
+            events = buffer.get_many(keys)
+            dropped += len(keys) - len(events)
+            flushed += write_events(events.values())
+        checkpoint.position, checkpoint.horizon = end, sequence
+        checkpoint.save()
+    for first in range(start + 1, end + 1, chunk_size):
+        buffer.delete_many([event_key(number) for number in range(first, min(first + chunk_size, end + 1))])
+    return flushed, dropped
+
+
+def write_events(events):
+    '''Writes (blog id, user id, ip address, unix time) events and returns how many were kept'''
+    events = list(events)
+    blog_ids = set(Blog.objects.filter(id__in={event[0] for event in events}).values_list('id', flat=True))
+    user_ids = {event[1] for event in events if event[1]}
+    if user_ids:
+        user_ids = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+    rows, daily, totals, buckets = [], Counter(), Counter(), Counter()
+    readers = defaultdict(set)
+    for blog_id, user_id, ip_address, stamp in events:
+        # the blog was deleted after it was read
+        if blog_id not in blog_ids:
+            continue
+        created_at = datetime.fromtimestamp(stamp, tz=dt_timezone.utc)
+        rows.append(BlogView(
+            blog_id=blog_id, user_id=user_id if user_id in user_ids else None,
+            ip_address=ip_address, created_at=created_at,
+        ))
+        daily[(blog_id, created_at.date())] += 1
+        totals[blog_id] += 1
+        buckets[stats.bucket_start(created_at)] += 1
+        reader = reader_key(user_id, ip_address)
+        if reader:
+            readers[(blog_id, created_at.date())].add(reader)
+
+    BlogView.objects.bulk_create(rows, batch_size=500)
+    add_daily_views(daily)
+    add_unique_readers(readers)
+    stats.add_view_buckets(buckets)
+    stats.adjust_counter(stats.VIEWS_COUNTER, len(rows))
+    # one UPDATE per distinct increment rather than per blog
+    for count, ids in group_by_count(totals).items():
+        Blog.objects.filter(id__in=ids).update(view_count=F('view_count') + count)
+    if rows:
+        # update() sends no post_save, and the blog lists show view_count
+        transaction.on_commit(lambda: bump_model_version(Blog))
+    return len(rows)
+
+
+def add_daily_views(daily):
+    '''Adds {(blog id, day): views} to BlogViewDaily'''
+    if not daily:
+        return
+    existing = set(
+        BlogViewDaily.objects.filter(
+            day__in={day for _blog_id, day in daily}, blog_id__in={blog_id for blog_id, _day in daily}
+        ).values_list('blog_id', 'day')
+    )
+    BlogViewDaily.objects.bulk_create([
+        BlogViewDaily(blog_id=blog_id, day=day, views=views)
+        for (blog_id, day), views in daily.items() if (blog_id, day) not in existing
+    ])
+    increments = defaultdict(list)
+    for (blog_id, day), views in daily.items():
+        if (blog_id, day) in existing:
+            increments[(day, views)].append(blog_id)
+    for (day, views), ids in increments.items():
+        BlogViewDaily.objects.filter(day=day, blog_id__in=ids).update(views=F('views') + views)
+
+
+def reader_key(user_id, ip_address):
+    '''Who read: the user when signed in, else the address'''
+    if user_id:
+        return f'user:{user_id}'
+    return f'ip:{ip_address}' if ip_address else None
+
+
+def add_unique_readers(readers):
+    '''Adds {(blog id, day): reader keys} to the BlogUniqueSketch of each blog and of all blogs'''
+    if not readers:
+        return
+    site = defaultdict(set)
+    for (_blog_id, day), keys in readers.items():
+        site[(None, day)] |= keys
+    readers = {**readers, **site}
+    stored = BlogUniqueSketch.objects.filter(day__in={day for _blog_id, day in site}).filter(
+        Q(blog_id__in={blog_id for blog_id, _day in readers if blog_id}) | Q(blog__isnull=True)
+    )
+    existing = {(sketch.blog_id, sketch.day): sketch for sketch in stored}
+    created, updated = [], []
+    for (blog_id, day), keys in readers.items():
+        row = existing.get((blog_id, day))
+        sketch = HyperLogLog.from_bytes(row.sketch) if row else HyperLogLog()
+        for key in keys:
+            sketch.add(key)
+        if row:
+            row.sketch = sketch.to_bytes()
+            updated.append(row)
+        else:
+            created.append(BlogUniqueSketch(blog_id=blog_id, day=day, sketch=sketch.to_bytes()))
+    BlogUniqueSketch.objects.bulk_create(created, batch_size=500)
+    BlogUniqueSketch.objects.bulk_update(updated, ['sketch'], batch_size=500)
+
+
+def group_by_count(counts):
+    groups = defaultdict(list)
+    for key, count in counts.items():
+        groups[count].append(key)
+    return groups
+
+
+def prune_views(retention=BLOG_VIEW_RETENTION, batch_size=5000):
+    '''Deletes raw BlogView rows older than retention and returns how many'''
+    cutoff = timezone.now() - retention
+    deleted = 0
+    while True:
+        ids = list(BlogView.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += BlogView.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,209 @@
+'''
+Bulk import and export of catalogue content (hotels, tourist sites,
+political sites) as CSV or NDJSON.
+
+Imports are read as a stream and handled CHUNK_SIZE rows at a time: each
+chunk is validated with the model's serializer, existing rows are fetched
+with one query, and the chunk is written with bulk_create/bulk_update in
+its own transaction. Invalid rows are skipped and reported with their line
+number; valid rows of the same chunk are still saved. A row with an `id`
+updates that object, a row without one creates a new object.
+
+bulk_create/bulk_update do not send model signals, so everything the
+receivers in apis.models would have done (geohash, search index, content
+version, dashboard counters) is done here per chunk.
+
+Exports iterate the table in chunks and are meant to be consumed by a
+streaming response or written line by line, never built in memory.
+'''
+
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apis import stats
+from apis.models import Hotel, Political, TouristSite
+from apis.search import index_objects
+from apis.serializers import HotelSerializer, PoliticalSerializer, TouristSiteSerialiser
+from apis.versions import bump_model_version
+from dxpcore.utils import geo
+
+# kind -> (model, serializer used for validation)
+CATALOGUE = {
+    'hotel': (Hotel, HotelSerializer),
+    'tourist_site': (TouristSite, TouristSiteSerialiser),
+    'political': (Political, PoliticalSerializer),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 500
+# how many row errors are reported back at most
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportFormatError(ValueError):
+    '''Raised when the input cannot be parsed at all'''
+
+
+def import_fields(model):
+    '''Fields that can be set by an import: editable, concrete, not files'''
+    return [
+        field.name for field in model._meta.concrete_fields
+        if field.editable and not field.primary_key and not isinstance(field, models.FileField)
+    ]
+
+
+def export_fields(model):
+    return ['id', *import_fields(model), *(
+        field.name for field in model._meta.concrete_fields if isinstance(field, models.FileField)
+    ), 'geohash', 'created_at', 'updated_at']
+
+
+def read_rows(lines, format_name):
+    '''
+    Yields (line number, row dict) from an iterable of text lines.
+    Empty CSV cells are read as "not given".
+    '''
+    if format_name == 'csv':
+        reader = csv.DictReader(lines)
+        try:
+            for row in reader:
+                yield reader.line_num, {key: value for key, value in row.items() if key and value not in ('', None)}
+        except csv.Error as error:
+            raise ImportFormatError(f'line {reader.line_num}: {error}')
+    elif format_name == 'ndjson':
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                raise ImportFormatError(f'line {number}: {error}')
+            if not isinstance(row, dict):
+                raise ImportFormatError(f'line {number}: expected a JSON object')
+            yield number, row
+    else:
+        raise ImportFormatError(f'Unsupported format: {format_name}')
+
+
+def decode_lines(chunks):
+    '''Decodes an iterable of UTF-8 byte lines, dropping a leading BOM'''
+    first = True
+    for line in chunks:
+        text = line.decode('utf-8') if isinstance(line, bytes) else line
+        if first:
+            text = text.lstrip('\ufeff')
+            first = False
+        yield text
+
+
+def import_rows(kind, rows, chunk_size=CHUNK_SIZE):
+    '''Upserts (line number, row) pairs of kind and returns a report'''
+    model, serializer_class = CATALOGUE[kind]
+    report = {'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        import_chunk(model, serializer_class, chunk, report)
+    return report
+
+
+def import_chunk(model, serializer_class, chunk, report):
+    allowed = set(import_fields(model))
+    ids = set()
+    for _line, row in chunk:
+        try:
+            ids.add(int(row['id']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    existing = model.objects.in_bulk(ids)
+
+    # one serializer each for creates and partial updates, so fields are built once
+    creator, updater = serializer_class(), serializer_class(partial=True)
+    created, updated, touched = [], [], set()
+    for line, row in chunk:
+        data = {key: value for key, value in row.items() if key in allowed}
+        object_id = row.get('id')
+        if object_id not in (None, ''):
+            try:
+                instance = existing.get(int(object_id))
+            except (TypeError, ValueError):
+                instance = None
+            if instance is None:
+                fail(report, line, {'id': [f'No {model._meta.verbose_name} with id {object_id}']})
+                continue
+        else:
+            instance = None
+        try:
+            validated = (updater if instance else creator).run_validation(data)
+        except ValidationError as error:
+            fail(report, line, error.detail)
+            continue
+        values = {key: value for key, value in validated.items() if key in allowed}
+        obj = instance or model()
+        for key, value in values.items():
+            setattr(obj, key, value)
+        # what the pre_save receiver would have derived
+        if geo.valid_point(obj.latitude, obj.longitude):
+            obj.geohash = geo.encode(obj.latitude, obj.longitude, geo.MAX_PRECISION)
+        else:
+            obj.geohash = ''
+        if obj.pk:
+            touched.update(values)
+            updated.append(obj)
+        else:
+            created.append(obj)
+
+    now = timezone.now()
+    with transaction.atomic():
+        model.objects.bulk_create(created)
+        if updated:
+            for obj in updated:
+                obj.updated_at = now
+            model.objects.bulk_update(updated, [*touched, 'geohash', 'updated_at'])
+        index_objects(created + updated)
+        if created or updated:
+            transaction.on_commit(lambda: bump_model_version(model))
+        if created:
+            transaction.on_commit(lambda: stats.adjust_counter(stats.counter_name(model), len(created)))
+    report['created'] += len(created)
+    report['updated'] += len(updated)
+
+
+def fail(report, line, errors):
+    report['failed'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'line': line, 'errors': errors})
+
+
+class Echo:
+    '''File-like object whose write() hands the value back, for csv.writer'''
+
+    def write(self, value):
+        return value
+
+
+def export_lines(kind, format_name, chunk_size=2000):
+    '''Yields the whole table of kind as CSV or NDJSON lines, chunk by chunk'''
+    model, _serializer_class = CATALOGUE[kind]
+    fields = export_fields(model)
+    rows = model.objects.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size)
+    if format_name == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n'
@@ -1,12 +1,37 @@
+import asyncio
 import json
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from notifications.presence import HEARTBEAT_INTERVAL, online_user_ids, user_connected, user_disconnected, user_seen
 from .models import ChatRoom
 
 logger = logging.getLogger(__name__)
 
-class NewChatConsumer(AsyncWebsocketConsumer):
+
+class PresenceMixin:
+    '''Counts an accepted connection as the user being online, with a heartbeat while it stays open'''
+
+    async def mark_online(self):
+        await database_sync_to_async(user_connected)(self.user.id)
+        # only a counted connection may decrement the counter on disconnect
+        self.presence_counted = True
+        self.heartbeat = asyncio.ensure_future(self.send_heartbeats())
+
+    async def send_heartbeats(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            await database_sync_to_async(user_seen)(self.user.id)
+
+    async def mark_offline(self):
+        if not getattr(self, 'presence_counted', False):
+            return
+        self.presence_counted = False
+        self.heartbeat.cancel()
+        await database_sync_to_async(user_disconnected)(self.user.id)
+
+
+class NewChatConsumer(PresenceMixin, AsyncWebsocketConsumer):
     async def connect(self):
         logger.info(f"Attempting to connect: {self.scope}")
         self.room_name = self.scope['url_route']['kwargs']['room_name']
@@ -20,6 +45,7 @@ class NewChatConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             await self.accept()
+            await self.mark_online()
             # Send chat history on connect
             await self.send_chat_history()
             # Mark all messages as read for the user
@@ -53,6 +79,7 @@ class NewChatConsumer(AsyncWebsocketConsumer):
                 self.room_group_name,
                 self.channel_name
             )
+        await self.mark_offline()
 
     async def receive(self, text_data):
         data = json.loads(text_data)
@@ -80,7 +107,7 @@ class NewChatConsumer(AsyncWebsocketConsumer):
         elif message:  # Normal chat message
             recipient = data.get('recipient')
             # Save the message to the database
-            await self.save_message(self.room_name, self.user, message)
+            room = await self.save_message(self.room_name, self.user, message)
             from datetime import datetime
             timestamp = datetime.utcnow().isoformat()
             if recipient:
@@ -119,7 +146,20 @@ class NewChatConsumer(AsyncWebsocketConsumer):
                 }
             )
             # Notify all members' unread count groups
-            await self.notify_unread_count_groups()
+            member_ids = await self.get_member_ids()
+            await self.notify_unread_count_groups(member_ids)
+            # Members without any live connection get a (coalesced) push instead
+            if room:
+                await self.queue_offline_pushes(room, member_ids, message)
+
+    @database_sync_to_async
+    def queue_offline_pushes(self, room, member_ids, content):
+        from notifications.utils import queue_chat_push
+        recipients = [user_id for user_id in member_ids if user_id != self.user.id]
+        online = online_user_ids(recipients)
+        for user_id in recipients:
+            if user_id not in online:
+                queue_chat_push(user_id, room, self.user.name, content)
 
     @database_sync_to_async
     def get_member_ids(self):
@@ -130,8 +170,9 @@ class NewChatConsumer(AsyncWebsocketConsumer):
         except ChatRoom.DoesNotExist:
             return []
 
-    async def notify_unread_count_groups(self):
-        member_ids = await self.get_member_ids()
+    async def notify_unread_count_groups(self, member_ids=None):
+        if member_ids is None:
+            member_ids = await self.get_member_ids()
         for user_id in member_ids:
             group_name = f'unread_count_{user_id}'
             await self.channel_layer.group_send(
@@ -145,8 +186,9 @@ class NewChatConsumer(AsyncWebsocketConsumer):
         try:
             room = ChatRoom.objects.get(name=room_name)
             Message.objects.create(room=room, sender=sender, content=content)
+            return room
         except ChatRoom.DoesNotExist:
-            pass
+            return None
 
     async def chat_message(self, event):
         await self.send(text_data=json.dumps({
@@ -173,7 +215,7 @@ class NewChatConsumer(AsyncWebsocketConsumer):
         from .models import ChatRoom, Message
         try:
             room = ChatRoom.objects.get(name=self.room_name)
-            messages = Message.objects.filter(room=room).order_by('timestamp')
+            messages = Message.objects.filter(room=room).select_related('sender').order_by('timestamp')
             return [
                 {
                     'id': msg.id,
@@ -204,7 +246,7 @@ class NewChatConsumer(AsyncWebsocketConsumer):
             pass
 
 
-class ChatRoomsConsumer(AsyncWebsocketConsumer):
+class ChatRoomsConsumer(PresenceMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.group_name = 'chatrooms_updates'
         self.user = await self.get_user_from_token(self.scope['query_string'])
@@ -212,6 +254,7 @@ class ChatRoomsConsumer(AsyncWebsocketConsumer):
             self.scope['user'] = self.user
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+            await self.mark_online()
             await self.send_chatrooms_list()
         else:
             await self.close()
@@ -233,6 +276,7 @@ class ChatRoomsConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self.mark_offline()
 
     async def receive(self, text_data):
         # Optionally handle client messages
@@ -246,38 +290,59 @@ class ChatRoomsConsumer(AsyncWebsocketConsumer):
         """
         Return chatrooms where the user is a member,
         include `other_user` (if private) and the last message.
+        Four queries however many rooms: the rooms with their unread counts
+        and last message ids, the other members, the last messages and the
+        avatar variants.
         """
+        from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+        from accounts.models import User
+        from .images import thumbnail_url, variant_map
         from .models import Message
 
-        chatrooms = ChatRoom.objects.filter(members=self.user)
+        unread = Q(messages__is_read=False, messages__sender__is_active=True) & ~Q(messages__sender=self.user)
+        chatrooms = (
+            ChatRoom.objects.filter(members=self.user)
+            .annotate(
+                unread=Count('messages', filter=unread, distinct=True),
+                last_message_id=Subquery(
+                    Message.objects.filter(room=OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+                ),
+            )
+            .prefetch_related(Prefetch(
+                'members', queryset=User.objects.exclude(id=self.user.id).order_by('id'), to_attr='other_members'
+            ))
+        )
+        chatrooms = list(chatrooms)
+        last_messages = Message.objects.select_related('sender').in_bulk(
+            [room.last_message_id for room in chatrooms if room.last_message_id]
+        )
 
         result = []
+        avatars = {}
         for room in chatrooms:
             data = {
                 'id': room.id,
                 'name': room.name,
                 'is_group': room.is_group,
-                'unread': room.get_total_unread_messages(self.user),
+                'unread': room.unread,
                 'created_at': room.created_at.isoformat(),
             }
 
             # Add other user for private chats
             if not room.is_group:
-                other_members = room.members.exclude(id=self.user.id)
-                if other_members.exists():
-                    data['other_user'] = other_members.first().name
+                if room.other_members:
+                    other_user = room.other_members[0]
+                    data['other_user'] = other_user.name
                     # avatar
-                    data['other_user_avatar'] = other_members.first().avatar.url if other_members.first().avatar else ''
+                    data['other_user_avatar'] = other_user.avatar.url if other_user.avatar else ''
+                    avatars[room.id] = other_user.avatar.name
                 else:
                     data['other_user'] = None
                     data['other_user_avatar'] = ''
+                data['other_user_avatar_thumb'] = ''
 
-            # Fetch last message
-            last_message = (
-                Message.objects.filter(room=room)
-                .order_by('-timestamp')
-                .first()
-            )
+            # last message
+            last_message = last_messages.get(room.last_message_id)
 
             if last_message:
                 data['last_message'] = {
@@ -290,6 +355,11 @@ class ChatRoomsConsumer(AsyncWebsocketConsumer):
 
             result.append(data)
 
+        # 96px avatars for the list, resolved in one query
+        variants = variant_map(avatars.values())
+        for data in result:
+            if data['id'] in avatars:
+                data['other_user_avatar_thumb'] = thumbnail_url(variants, avatars[data['id']])
         return result
 
 
@@ -301,13 +371,14 @@ class ChatRoomsConsumer(AsyncWebsocketConsumer):
         }, default=str))
 
 
-class UnreadCountConsumer(AsyncWebsocketConsumer):
+class UnreadCountConsumer(PresenceMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.user = await self.get_user_from_token(self.scope['query_string'])
         if self.user:
             self.group_name = f'unread_count_{self.user.id}'
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+            await self.mark_online()
             await self.send_unread_count()
         else:
             await self.close()
@@ -315,6 +386,7 @@ class UnreadCountConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self.mark_offline()
 
     @database_sync_to_async
     def get_user_from_token(self, query_string):
@@ -334,11 +406,7 @@ class UnreadCountConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def get_total_unread_count(self):
         from .models import ChatRoom
-        chatrooms = ChatRoom.objects.filter(members=self.user)
-        total = 0
-        for room in chatrooms:
-            total += room.get_total_unread_messages(self.user)
-        return total
+        return ChatRoom.total_unread_messages(self.user)
 
     async def send_unread_count(self):
         count = await self.get_total_unread_count()
@@ -352,4 +420,64 @@ class UnreadCountConsumer(AsyncWebsocketConsumer):
         await self.send_unread_count()
 
     async def unread_count_update(self, event):
-        await self.send_unread_count()
\ No newline at end of file
+        await self.send_unread_count()
+
+
+class NotificationsConsumer(PresenceMixin, AsyncWebsocketConsumer):
+    '''Streams new inbox entries (apis.inbox) to the signed-in user as they are committed'''
+    async def connect(self):
+        from . import inbox
+        self.user = await self.get_user_from_token(self.scope['query_string'])
+        if self.user:
+            self.group_names = (inbox.user_group(self.user.id), inbox.BROADCAST_GROUP)
+            for group_name in self.group_names:
+                await self.channel_layer.group_add(group_name, self.channel_name)
+            await self.accept()
+            await self.mark_online()
+            await self.send_unread_count()
+        else:
+            await self.close()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_names'):
+            for group_name in self.group_names:
+                await self.channel_layer.group_discard(group_name, self.channel_name)
+        await self.mark_offline()
+
+    @database_sync_to_async
+    def get_user_from_token(self, query_string):
+        from urllib.parse import parse_qs
+        from knox.auth import TokenAuthentication
+        parsed = parse_qs(query_string.decode())
+        token = parsed.get("token", [None])[0]
+        if not token:
+            return None
+        try:
+            user_auth_tuple = TokenAuthentication().authenticate_credentials(token.encode())
+            return user_auth_tuple[0]  # the user object
+        except Exception as e:
+            logger.warning(f"Token auth failed: {e}")
+            return None
+
+    @database_sync_to_async
+    def get_unread_count(self):
+        from .inbox import unread_count
+        return unread_count(self.user)
+
+    async def send_unread_count(self):
+        count = await self.get_unread_count()
+        await self.send(text_data=json.dumps({
+            'type': 'inbox_unread',
+            'unread': count
+        }))
+
+    async def receive(self, text_data):
+        # the client asks for the count again, e.g. after marking the inbox read
+        await self.send_unread_count()
+
+    async def inbox_entries(self, event):
+        # no database work here: a broadcast reaches every connected user at once
+        await self.send(text_data=json.dumps({
+            'type': 'notifications',
+            'entries': event['entries']
+        }))
@@ -0,0 +1,202 @@
+'''
+Blog feed for readers: published blogs in a seeded random order or in
+trending order, paged by cursor.
+
+Both orders are computed from a cached pool of published blog ids, keyed by
+the publication version, which a receiver in apis.models bumps whenever a
+blog is saved or deleted, so publishing or unpublishing rebuilds it on the
+next read. It is not the Blog content version: that one also moves with
+every blog view flush (view_count), every few seconds under traffic.
+Serving a page fetches only the blogs on that page.
+
+Random: every id gets a position from a hash of (seed, id). A client keeps
+its seed while scrolling and the cursor holds the last position served, so
+blogs published or removed in the meantime never make the feed repeat or
+skip an item.
+
+Trending: views of the last TRENDING_WINDOW, each weighted by
+0.5 ** (age / TRENDING_HALF_LIFE). The ranking is recomputed at most every
+TRENDING_TTL and kept a while longer under its own stamp, so a client
+scrolling through one ranking keeps paging through that same list.
+'''
+
+import base64
+import hashlib
+import heapq
+import json
+import random
+import secrets
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from apis.models import Blog, BlogView
+from apis.pagination import InvalidCursor
+
+FEEDS = ('random', 'trending')
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+POOL_TIMEOUT = 24 * 60 * 60
+TRENDING_WINDOW = timedelta(days=14)
+TRENDING_HALF_LIFE = timedelta(days=2)
+TRENDING_TTL = 10 * 60
+# how long a computed ranking stays available to clients paging through it
+TRENDING_KEEP = 60 * 60
+PUBLICATION_KEY = 'blog_feed:publication'
+
+
+def publication_version():
+    '''Unix time at which a blog was last saved or deleted (view counts aside)'''
+    now = time.time()
+    cache.add(PUBLICATION_KEY, now, None)
+    return cache.get(PUBLICATION_KEY, now)
+
+
+def bump_publication_version():
+    cache.set(PUBLICATION_KEY, time.time(), None)
+
+
+def published_pool():
+    '''Returns the ids of published blogs, newest first'''
+    key = f'blog_feed:pool:{publication_version()}'
+    pool = cache.get(key)
+    if pool is None:
+        pool = list(Blog.objects.filter(is_published=True).order_by('-created_at', '-id').values_list('id', flat=True))
+        cache.set(key, pool, POOL_TIMEOUT)
+    return pool
+
+
+def new_seed():
+    return secrets.randbelow(2 ** 31)
+
+
+def random_sample(count):
+    '''Returns up to count published blog ids picked at random'''
+    pool = published_pool()
+    return random.sample(pool, min(count, len(pool)))
+
+
+def position(seed, blog_id):
+    '''Where blog_id sits in the random order of seed'''
+    digest = hashlib.blake2b(f'{seed}:{blog_id}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def random_page(seed, after=None, limit=PAGE_SIZE):
+    '''
+    Returns (ids, last) for the page of the seeded order following the
+    (position, id) pair `after`; last is None on the last page.
+    '''
+    keyed = ((position(seed, blog_id), blog_id) for blog_id in published_pool())
+    if after is not None:
+        after = tuple(after)
+        keyed = (item for item in keyed if item > after)
+    page = heapq.nsmallest(limit + 1, keyed)
+    last = page[limit - 1] if len(page) > limit else None
+    return [blog_id for _position, blog_id in page[:limit]], last
+
+
+def trending_scores(now=None):
+    '''Returns {blog id: decayed view score} over the trending window'''
+    now = now or timezone.now()
+    half_life = TRENDING_HALF_LIFE.total_seconds()
+    rows = (
+        BlogView.objects.filter(created_at__gte=now - TRENDING_WINDOW)
+        .annotate(hour=TruncHour('created_at'))
+        .values_list('blog_id', 'hour')
+        .annotate(views=Count('id'))
+        .order_by()
+    )
+    scores = {}
+    for blog_id, hour, views in rows:
+        age = (now - hour).total_seconds()
+        scores[blog_id] = scores.get(blog_id, 0.0) + views * 0.5 ** (age / half_life)
+    return scores
+
+
+def trending_ranking():
+    '''
+    Returns (stamp, ids): the current ranking and the stamp it is stored
+    under. Blogs without recent views follow the scored ones, newest first.
+    '''
+    pointer = f'blog_feed:trending:{publication_version()}'
+    stamp = cache.get(pointer)
+    ids = cache.get(f'blog_feed:trending:{stamp}') if stamp else None
+    if ids is None:
+        pool = published_pool()
+        scores = trending_scores()
+        ranked = sorted((blog_id for blog_id in pool if blog_id in scores), key=lambda blog_id: -scores[blog_id])
+        ids = ranked + [blog_id for blog_id in pool if blog_id not in scores]
+        stamp = f'{time.time():.6f}'
+        cache.set(f'blog_feed:trending:{stamp}', ids, TRENDING_KEEP)
+        cache.set(pointer, stamp, TRENDING_TTL)
+    return stamp, ids
+
+
+def trending_page(stamp=None, offset=0, limit=PAGE_SIZE):
+    '''Returns (ids, stamp, next offset or None) of a page of the ranking stored under stamp (or the current one)'''
+    ids = cache.get(f'blog_feed:trending:{stamp}') if stamp else None
+    if ids is None:
+        stamp, ids = trending_ranking()
+    page = ids[offset:offset + limit]
+    following = offset + limit if offset + limit < len(ids) else None
+    return page, stamp, following
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, feed):
+    '''Returns the values of a cursor issued for feed'''
+    try:
+        values = json.loads(base64.urlsafe_b64decode((cursor + '=' * (-len(cursor) % 4)).encode()))
+    except ValueError:
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != 3 or values[0] != feed:
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def is_int(value):
+    # bool is an int subclass, but true/false never come from our cursors
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def feed_page(feed, cursor=None, seed=None, limit=PAGE_SIZE):
+    '''
+    Returns (blogs, next cursor, seed) for one page of feed. Without a cursor
+    the random feed starts over with seed (a new one when not given).
+    Raises InvalidCursor for a cursor we did not issue.
+    '''
+    if feed == 'trending':
+        stamp, offset = None, 0
+        if cursor:
+            _feed, stamp, offset = decode_cursor(cursor, feed)
+            if not isinstance(stamp, str) or len(stamp) > 20 or not is_int(offset) or offset < 0:
+                raise InvalidCursor('Invalid cursor')
+        ids, stamp, following = trending_page(stamp, offset, limit)
+        next_cursor = encode_cursor([feed, stamp, following]) if following is not None else None
+    else:
+        after = None
+        if cursor:
+            _feed, seed, after = decode_cursor(cursor, feed)
+            if not is_int(seed) or not (isinstance(after, list) and len(after) == 2 and all(map(is_int, after))):
+                raise InvalidCursor('Invalid cursor')
+        elif seed is None:
+            seed = new_seed()
+        ids, last = random_page(seed, after, limit)
+        next_cursor = encode_cursor([feed, seed, list(last)]) if last else None
+    return fetch_in_order(ids), next_cursor, seed
+
+
+def fetch_in_order(ids):
+    '''Returns the published blogs of ids, in that order, with their writers'''
+    blogs = Blog.objects.filter(is_published=True).select_related('writer').in_bulk(ids)
+    return [blogs[blog_id] for blog_id in ids if blog_id in blogs]
@@ -0,0 +1,209 @@
+'''
+Resized image derivatives.
+
+Saving a model with image fields queues each stored file as an ImageSource.
+The image worker (manage.py runimageworker) decodes it once, applies the
+EXIF orientation and writes a WebP and a JPEG copy per variant size with all
+metadata stripped. Files are named after a hash of their bytes, so a URL
+never changes content and can be cached forever. Once they are committed,
+the content version of every model that uses the image is bumped, so cached
+list responses pick up the new variants.
+
+Pillow is only imported by the functions that decode or encode, so loading
+this module (serializers do, for variant_map) does not pull it in.
+
+Serializers expose the results through variant_map(), which resolves the
+derivatives of many images in one query.
+'''
+
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apis.models import ImageDerivative, ImageSource
+from apis.versions import bump_model_version
+from dxpcore.utils.constants import ImageStatus
+from notifications.queue import claim_due, record_failure
+
+# variant name -> longest edge in pixels; thumb covers a 48px avatar at 2x
+VARIANTS = {
+    'thumb': 96,
+    'small': 320,
+    'medium': 800,
+    'large': 1600,
+}
+
+# format -> (Pillow format, file extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+DERIVATIVES_DIR = 'derivatives'
+ORIENTATION_TAG = 0x0112
+IMAGE_MAX_ATTEMPTS = 3
+
+# models whose image fields get derivatives: model label -> field names
+IMAGE_FIELDS = {
+    'apis.hotel': ('image', 'second_image', 'third_image'),
+    'apis.political': ('image', 'second_image', 'third_image'),
+    'apis.touristsite': ('image', 'second_image', 'third_image'),
+    'apis.blog': ('feature_image',),
+    'accounts.user': ('avatar',),
+}
+
+
+def queue_images(names) -> None:
+    '''Queues the given storage names for processing (already known names are ignored)'''
+    names = {name for name in names if name}
+    if names:
+        ImageSource.objects.bulk_create([ImageSource(name=name) for name in names], ignore_conflicts=True)
+
+
+def queue_instance_images(instance) -> None:
+    '''Queues every image field of a model instance once the transaction commits'''
+    fields = IMAGE_FIELDS.get(instance._meta.label_lower, ())
+    names = [getattr(instance, field).name for field in fields]
+    if any(names):
+        transaction.on_commit(lambda: queue_images(names))
+
+
+def encode(image, format_name):
+    '''Returns the bytes of image saved in format_name, without any metadata'''
+    from PIL import Image
+
+    pillow_format, _extension, options = FORMATS[format_name]
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = BytesIO()
+    # nothing but the pixels is written: no exif, xmp or comments
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def store_derivative(content, extension) -> str:
+    '''Saves content under a name derived from its hash and returns the name'''
+    digest = hashlib.sha256(content).hexdigest()[:24]
+    name = f'{DERIVATIVES_DIR}/{digest[:2]}/{digest}.{extension}'
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(content))
+    return name
+
+
+def generate_derivatives(source) -> None:
+    '''Decodes source once and writes every variant that is not larger than the original'''
+    from PIL import Image, ImageOps
+
+    with default_storage.open(source.name, 'rb') as handle:
+        image = Image.open(handle)
+        width, height = image.size
+        if image.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8):
+            width, height = height, width
+        # let the JPEG decoder downscale by powers of two up front
+        image.draft('RGB', (max(VARIANTS.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+    source.width, source.height = width, height
+
+    derivatives = []
+    current = image
+    sizes = sorted(VARIANTS.items(), key=lambda item: item[1], reverse=True)
+    smallest = sizes[-1][0]
+    # largest first, each variant is resized from the previous one
+    for variant, edge in sizes:
+        if edge >= max(image.size) and variant != smallest:
+            # never upscale; every image still gets a thumb
+            continue
+        if edge < max(current.size):
+            current = current.copy()
+            current.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        for format_name, (_pillow_format, extension, _options) in FORMATS.items():
+            content = encode(current, format_name)
+            derivatives.append(ImageDerivative(
+                source=source, variant=variant, format=format_name, file=store_derivative(content, extension),
+                width=current.width, height=current.height, size=len(content),
+            ))
+
+    with transaction.atomic():
+        source.derivatives.all().delete()
+        ImageDerivative.objects.bulk_create(derivatives)
+        source.status = ImageStatus.READY.value
+        source.processed_at = timezone.now()
+        source.save(update_fields=['status', 'processed_at', 'width', 'height'])
+        transaction.on_commit(lambda: bump_image_versions(source.name))
+
+
+def bump_image_versions(name) -> None:
+    '''Bumps the content version of every model with a row whose image fields reference name'''
+    from django.apps import apps
+
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        references = Q()
+        for field in fields:
+            references |= Q(**{field: name})
+        if model.objects.filter(references).exists():
+            bump_model_version(model)
+
+
+def process_images(batch_size=20) -> int:
+    '''Generates derivatives for a batch of due sources and returns how many were handled'''
+    sources = claim_due(ImageSource.objects.all(), batch_size)
+    for source in sources:
+        try:
+            generate_derivatives(source)
+        except Exception as error:
+            record_failure(source, error, IMAGE_MAX_ATTEMPTS, failed_status=ImageStatus.FAILED.value)
+    return len(sources)
+
+
+def variant_map(names) -> dict:
+    '''
+    Returns {storage name: {variant: {'width', 'height', 'webp', 'jpeg'}}} for
+    the given storage names in one query. Names without derivatives yet are
+    left out; clients fall back to the original URL.
+    '''
+    names = {name for name in names if name}
+    result = {}
+    if not names:
+        return result
+    rows = ImageDerivative.objects.filter(source__name__in=names).values_list(
+        'source__name', 'variant', 'format', 'file', 'width', 'height'
+    )
+    for name, variant, format_name, file, width, height in rows:
+        entry = result.setdefault(name, {}).setdefault(variant, {'width': width, 'height': height})
+        entry[format_name] = default_storage.url(file)
+    return result
+
+
+def thumbnail_url(variants, name, format_name='jpeg') -> str:
+    '''URL of the thumb variant of name from a variant_map(), or '' when there is none'''
+    return variants.get(name, {}).get('thumb', {}).get(format_name, '')
+
+
+def prune_orphans() -> int:
+    '''Deletes sources no model references any more, and derivative files nothing points to'''
+    from django.apps import apps
+
+    referenced = set()
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        for field in fields:
+            referenced.update(model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True))
+    orphans = ImageSource.objects.exclude(name__in=referenced)
+    files = set(ImageDerivative.objects.filter(source__in=orphans).values_list('file', flat=True))
+    deleted, _ = orphans.delete()
+    # identical images share derivative files
+    files -= set(ImageDerivative.objects.filter(file__in=files).values_list('file', flat=True))
+    for name in files:
+        default_storage.delete(name)
+    return deleted
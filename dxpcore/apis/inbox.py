@@ -0,0 +1,212 @@
+'''
+Per-user notification inbox.
+
+A user's inbox merges two sources, newest first:
+
+- Notification broadcasts, stored once for everyone and merged in when the
+  inbox is read (fan-out on read), so sending one costs a single row
+  however many users there are;
+- the user's own UserEvent rows (friend requests, ...).
+
+Read state is one watermark per user (InboxState.read_until): everything
+created up to it has been read. Users without a state row have read
+everything up to the time they joined, so a new account does not start with
+every old broadcast unread. The unread count is two index range counts past
+the watermark, capped at MAX_UNREAD.
+
+Pages are keyset pages over (created_at, source, id) across both sources,
+so each page is two index range scans of page_size + 1 rows, however deep.
+
+New entries are also pushed to connected clients (NotificationsConsumer,
+ws/notifications/): receivers in apis.models add each entry created in a
+transaction to a Delivery, one per savepoint level, whose single on_commit
+callback sends the batch as a few group_send messages -- broadcasts to
+BROADCAST_GROUP, events to the user's group -- of at most DELIVERY_CHUNK
+entries each. Each callback is registered inside its savepoint, so rolling
+one back drops exactly its entries; the connection only keeps weak
+references to the deliveries, so a dropped one is gone with its callback
+and never collects more entries. Delivery is best effort: the callbacks
+are robust, so a channel layer that is down is logged and never fails the
+write or the request.
+'''
+
+import base64
+import json
+from collections import defaultdict
+from weakref import WeakValueDictionary
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.encoders import JSONEncoder
+
+from apis.models import InboxState, Notification, UserEvent
+from apis.pagination import InvalidCursor, KeysetPaginator, capped_count
+
+BROADCAST = 'broadcast'
+EVENT = 'event'
+# order of the sources among entries created at the same moment (higher first)
+SOURCE_RANK = {BROADCAST: 0, EVENT: 1}
+ENTRY_FIELDS = ('id', 'title', 'message', 'created_at')
+MAX_UNREAD = 100
+BROADCAST_GROUP = 'inbox_broadcast'
+DELIVERY_CHUNK = 50
+
+paginator = KeysetPaginator(('-created_at', '-id'), page_size=20, max_page_size=100)
+
+
+def add_event(user, kind, title, message, **data):
+    '''Puts an event in the inbox of user'''
+    return UserEvent.objects.create(user=user, kind=kind.value, title=title, message=message, data=data)
+
+
+def read_until(user):
+    '''The user's read watermark'''
+    watermark = InboxState.objects.filter(user=user).values_list('read_until', flat=True).first()
+    return watermark or user.created_at
+
+
+def sources(user):
+    '''{source: queryset of inbox entries} for user'''
+    return {
+        BROADCAST: Notification.objects.values(*ENTRY_FIELDS),
+        EVENT: UserEvent.objects.filter(user=user).values(*ENTRY_FIELDS, 'kind', 'data'),
+    }
+
+
+def unread_count(user, watermark=None):
+    '''Entries created after the watermark, counted up to MAX_UNREAD'''
+    watermark = watermark or read_until(user)
+    unread = 0
+    for queryset in sources(user).values():
+        unread += capped_count(queryset.filter(created_at__gt=watermark), MAX_UNREAD - unread)
+        if unread >= MAX_UNREAD:
+            break
+    return unread
+
+
+def mark_read(user, until=None):
+    '''Moves the watermark forward to until (default now) and returns it'''
+    now = timezone.now()
+    until = min(until or now, now)
+    if not InboxState.objects.filter(user=user, read_until__lt=until).update(read_until=until):
+        state, _ = InboxState.objects.get_or_create(user=user, defaults={'read_until': max(until, user.created_at)})
+        until = state.read_until
+    return until
+
+
+def encode_cursor(entry):
+    return paginator.encode_values([entry['created_at'], entry['source'], entry['id']])
+
+
+def decode_cursor(cursor):
+    '''Returns (created_at, source, id) of the last entry of the previous page'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, source, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(created_at)
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None or source not in SOURCE_RANK or not isinstance(entry_id, int):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, source, entry_id
+
+
+def seek(queryset, source, position):
+    '''Entries of source that come after position in the merged order'''
+    created_at, last_source, last_id = position
+    if SOURCE_RANK[source] < SOURCE_RANK[last_source]:
+        return queryset.filter(created_at__lte=created_at)
+    if SOURCE_RANK[source] > SOURCE_RANK[last_source]:
+        return queryset.filter(created_at__lt=created_at)
+    return queryset.filter(paginator.seek_filter([created_at, last_id]))
+
+
+def page(user, cursor=None, page_size=paginator.page_size, watermark=None):
+    '''
+    Returns (entries, next_cursor) of the page after cursor. Raises
+    InvalidCursor for a cursor we did not issue.
+    '''
+    position = decode_cursor(cursor) if cursor else None
+    watermark = watermark or read_until(user)
+    entries = []
+    for source, queryset in sources(user).items():
+        if position:
+            queryset = seek(queryset, source, position)
+        for entry in queryset.order_by(*paginator.ordering)[:page_size + 1]:
+            entry['source'] = source
+            entry.setdefault('kind', BROADCAST)
+            entry.setdefault('data', {})
+            entries.append(entry)
+    entries.sort(key=lambda entry: (entry['created_at'], SOURCE_RANK[entry['source']], entry['id']), reverse=True)
+    next_cursor = None
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        next_cursor = encode_cursor(entries[-1])
+    for entry in entries:
+        entry['read'] = entry['created_at'] <= watermark
+    return entries, next_cursor
+
+
+def user_group(user_id):
+    '''Channel layer group of the connections of one user'''
+    return f'inbox_{user_id}'
+
+
+def as_entry(instance):
+    '''A Notification or UserEvent as an inbox entry, JSON ready'''
+    event = isinstance(instance, UserEvent)
+    return {
+        'id': instance.id,
+        'title': instance.title,
+        'message': instance.message,
+        # as the REST responses render it, so it can be posted back as `until`
+        'created_at': JSONEncoder().default(instance.created_at),
+        'source': EVENT if event else BROADCAST,
+        'kind': instance.kind if event else BROADCAST,
+        'data': instance.data if event else {},
+        'read': False,
+    }
+
+
+class Delivery:
+    '''Inbox entries created at one savepoint level of a transaction, sent to their groups on commit'''
+
+    def __init__(self):
+        self.entries = defaultdict(list)
+        self.sent = False
+
+    def send(self):
+        self.sent = True
+        channel_layer = get_channel_layer()
+        for group, entries in self.entries.items():
+            for start in range(0, len(entries), DELIVERY_CHUNK):
+                async_to_sync(channel_layer.group_send)(group, {
+                    'type': 'inbox_entries',
+                    'entries': entries[start:start + DELIVERY_CHUNK],
+                })
+
+
+def queue_delivery(instance):
+    '''Sends a new Notification or UserEvent to the connected clients once the transaction commits'''
+    group = user_group(instance.user_id) if isinstance(instance, UserEvent) else BROADCAST_GROUP
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        # on_commit runs it right away
+        delivery = Delivery()
+        delivery.entries[group].append(as_entry(instance))
+        transaction.on_commit(delivery.send, robust=True)
+        return
+    # only the pending callback keeps a delivery alive: once it has run or
+    # was dropped by a rollback, the next entry starts a new one
+    pending = getattr(connection, 'inbox_deliveries', None)
+    if pending is None:
+        pending = connection.inbox_deliveries = WeakValueDictionary()
+    level = tuple(connection.savepoint_ids)
+    delivery = pending.get(level)
+    if delivery is None or delivery.sent:
+        delivery = pending[level] = Delivery()
+        transaction.on_commit(delivery.send, robust=True)
+    delivery.entries[group].append(as_entry(instance))
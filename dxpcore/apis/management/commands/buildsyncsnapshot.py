@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apis.sync import build_snapshot, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the gzipped full snapshot for offline clients and prune expired tombstones'
+
+    def handle(self, *args, **options):
+        manifest = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {manifest['file']} ({manifest['size']} bytes)"))
+        pruned = prune_tombstones()
+        if pruned:
+            self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} tombstones"))
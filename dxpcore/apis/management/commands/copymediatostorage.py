@@ -0,0 +1,34 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Copy files from the local MEDIA_ROOT into the configured media storage, keeping their names'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(settings.MEDIA_ROOT), help='Directory to copy from')
+        parser.add_argument('--dry-run', action='store_true', help='List what would be copied')
+
+    def handle(self, *args, **options):
+        if settings.MEDIA_STORAGE == 'local':
+            raise CommandError('MEDIA_STORAGE is local: set it to the target storage first')
+        copied = skipped = 0
+        for root, _dirs, files in os.walk(options['source']):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, options['source']).replace(os.sep, '/')
+                # existing names are kept as they are: stored media is immutable
+                if default_storage.exists(name):
+                    skipped += 1
+                    continue
+                if not options['dry_run']:
+                    with open(path, 'rb') as handle:
+                        saved = default_storage.save(name, File(handle))
+                    if saved != name:
+                        raise CommandError(f'{name} was stored as {saved}')
+                copied += 1
+        self.stdout.write(self.style.SUCCESS(f"Copied {copied} files, {skipped} already present"))
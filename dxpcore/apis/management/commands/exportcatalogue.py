@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from apis.bulk import CATALOGUE, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Write every hotel, tourist site or political site as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(CATALOGUE))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write (defaults to stdout)')
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['kind'], options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+                handle.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
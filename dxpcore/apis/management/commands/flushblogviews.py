@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apis.blog_views import BLOG_VIEW_RETENTION, flush_views, prune_views
+
+
+class Command(BaseCommand):
+    help = 'Write buffered blog views to the database and roll them up per blog and day'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Flush once and exit (views buffered since the previous run wait for the next one)')
+        parser.add_argument('--sleep', type=float, default=10.0, help='Seconds between flushes')
+        parser.add_argument('--prune', action='store_true', help='Delete raw views past the retention window and exit')
+        parser.add_argument('--retention-days', type=int, default=BLOG_VIEW_RETENTION.days)
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            deleted = prune_views(timedelta(days=options['retention_days']))
+            self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} views"))
+            return
+        while True:
+            flushed, dropped = flush_views()
+            if flushed or dropped:
+                self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} views ({dropped} dropped)"))
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
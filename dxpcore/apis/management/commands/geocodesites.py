@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apis.nearby import LOCATED_KINDS
+from apis.versions import bump_model_version
+from dxpcore.utils import geo
+
+
+class Command(BaseCommand):
+    help = 'Fill in coordinates of hotels, tourist sites and political sites from a local gazetteer file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('gazetteer', help='GeoNames dump (.txt/.tsv) or CSV with name,latitude,longitude[,population]')
+        parser.add_argument('--overwrite', action='store_true', help='Re-geocode rows that already have coordinates')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be matched without saving')
+
+    def handle(self, *args, **options):
+        try:
+            gazetteer = geo.Gazetteer.load(options['gazetteer'])
+        except (OSError, KeyError, ValueError) as error:
+            raise CommandError(f"Could not read gazetteer: {error}")
+        self.stdout.write(f"Loaded {len(gazetteer)} place names")
+
+        for kind, model in LOCATED_KINDS.items():
+            matched, missed = self.geocode(model, gazetteer, options)
+            self.stdout.write(self.style.SUCCESS(f"{kind}: geocoded {matched}, no match for {missed}"))
+
+    def geocode(self, model, gazetteer, options):
+        queryset = model.objects.all()
+        if not options['overwrite']:
+            queryset = queryset.filter(latitude__isnull=True)
+        matched = missed = 0
+        batch = []
+        for obj in queryset.order_by('id').iterator(chunk_size=options['batch_size']):
+            # the landmark is usually more specific than the address
+            point = gazetteer.lookup(getattr(obj, 'landmark', '')) or gazetteer.lookup(obj.address)
+            if point is None:
+                missed += 1
+                continue
+            matched += 1
+            obj.latitude, obj.longitude = point
+            # bulk_update bypasses save() and its signals
+            obj.geohash = geo.encode(obj.latitude, obj.longitude, geo.MAX_PRECISION)
+            obj.updated_at = timezone.now()
+            batch.append(obj)
+            if len(batch) >= options['batch_size']:
+                self.save(model, batch, options)
+                batch = []
+        self.save(model, batch, options)
+        if matched and not options['dry_run']:
+            bump_model_version(model)
+        return matched, missed
+
+    def save(self, model, batch, options):
+        if batch and not options['dry_run']:
+            model.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash', 'updated_at'])
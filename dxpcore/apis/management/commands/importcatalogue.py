@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.bulk import CATALOGUE, CHUNK_SIZE, FORMATS, ImportFormatError, decode_lines, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Create or update hotels, tourist sites or political sites from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(CATALOGUE))
+        parser.add_argument('path', help="File to read, or - for stdin")
+        parser.add_argument('--format', choices=sorted(FORMATS), help='Defaults from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format_name = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            if path == '-':
+                report = self.load(options['kind'], sys.stdin.buffer, format_name, options['chunk_size'])
+            else:
+                with open(path, 'rb') as handle:
+                    report = self.load(options['kind'], handle, format_name, options['chunk_size'])
+        except (OSError, ImportFormatError, UnicodeDecodeError) as error:
+            raise CommandError(str(error))
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']}, updated {report['updated']}, failed {report['failed']}"
+        ))
+
+    def load(self, kind, handle, format_name, chunk_size):
+        return import_rows(kind, read_rows(decode_lines(handle), format_name), chunk_size=chunk_size)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apis.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the catalogue and published blogs'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} documents"))
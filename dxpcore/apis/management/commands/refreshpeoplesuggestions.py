@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apis.models import PeopleSuggestionState
+from apis.suggestions import refresh_stale_suggestions, refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute people suggestions for users whose suggestions are stale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute for every user with suggestions')
+        parser.add_argument('--watch', action='store_true', help='Keep running and refresh users as they go stale')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=5.0, help='Seconds to wait when nobody is stale')
+
+    def handle(self, *args, **options):
+        refreshed = 0
+        if options['all']:
+            for user_id in PeopleSuggestionState.objects.values_list('user_id', flat=True).iterator(chunk_size=500):
+                refresh_suggestions(user_id)
+                refreshed += 1
+            self.stdout.write(self.style.SUCCESS(f"Refreshed suggestions for {refreshed} users"))
+            return
+
+        while True:
+            processed = refresh_stale_suggestions(options['batch_size'])
+            refreshed += processed
+            if processed:
+                continue
+            if not options['watch']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed suggestions for {refreshed} users"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apis.stats import rebuild_view_buckets, refresh_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the web dashboard counters from the tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', action='store_true', help='Also rebuild the view buckets from the raw views still kept')
+
+    def handle(self, *args, **options):
+        refresh_counters()
+        self.stdout.write(self.style.SUCCESS('Refreshed counters'))
+        if options['views']:
+            rebuild_view_buckets()
+            self.stdout.write(self.style.SUCCESS('Rebuilt view buckets'))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apis.images import IMAGE_FIELDS, prune_orphans, process_images, queue_images
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG derivatives for uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--sleep', type=float, default=5.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--backfill', action='store_true', help='Queue every image already stored before starting')
+        parser.add_argument('--prune', action='store_true', help='Delete derivatives of images no longer referenced and exit')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            deleted = prune_orphans()
+            self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} rows"))
+            return
+        if options['backfill']:
+            self.backfill()
+        while True:
+            processed = process_images(options['batch_size'])
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} images"))
+            if options['once'] and not processed:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
+
+    def backfill(self):
+        from django.apps import apps
+
+        for label, fields in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field in fields:
+                names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True)
+                queue_images(names.iterator())
+        self.stdout.write(self.style.SUCCESS('Queued existing images'))
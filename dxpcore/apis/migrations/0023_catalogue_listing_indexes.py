@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0022_people_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['-created_at', 'id'], name='hotel_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['category', '-created_at', 'id'], name='hotel_category_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='political',
+            index=models.Index(fields=['-created_at', 'id'], name='political_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='political',
+            index=models.Index(fields=['category', '-created_at', 'id'], name='political_category_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='touristsite',
+            index=models.Index(fields=['-created_at', 'id'], name='tourist_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='touristsite',
+            index=models.Index(fields=['category', '-created_at', 'id'], name='tourist_category_listing_idx'),
+        ),
+    ]
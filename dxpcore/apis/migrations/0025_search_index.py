@@ -0,0 +1,58 @@
+from django.db import migrations
+
+from dxpcore.utils.constants import BlogCategory, HotelCategory, PoliticalCategory, TourismCategory
+
+# same rowid layout as apis.search: object id << 8 | category code << 3 | kind code
+KINDS = (
+    ('hotel', 'Hotel', 1, HotelCategory),
+    ('tourist_site', 'TouristSite', 2, TourismCategory),
+    ('political', 'Political', 3, PoliticalCategory),
+    ('blog', 'Blog', 4, BlogCategory),
+)
+
+
+def populate_search_index(apps, schema_editor):
+    rows = []
+    for kind, model_name, code, categories in KINDS:
+        model = apps.get_model('apis', model_name)
+        category_codes = {member.value: index for index, member in enumerate(categories, start=1)}
+        queryset = model.objects.filter(is_published=True) if kind == 'blog' else model.objects.all()
+        for obj in queryset.iterator():
+            if kind == 'blog':
+                fields = [obj.title, '', f'{obj.subtitle}\n{obj.content}']
+            else:
+                location = ' '.join(filter(None, [obj.address, getattr(obj, 'landmark', '')]))
+                fields = [obj.name, location, obj.description or '']
+            rowid = obj.pk << 8 | category_codes.get(obj.category, 0) << 3 | code
+            rows.append([rowid, kind, obj.pk, obj.category, *fields])
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO search_index (rowid, kind, object_id, category, title, location, body) VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0024_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE VIRTUAL TABLE search_index USING fts5(
+                    kind UNINDEXED,
+                    object_id UNINDEXED,
+                    category UNINDEXED,
+                    title,
+                    location,
+                    body,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3 4'
+                )
+            """,
+            reverse_sql='DROP TABLE search_index',
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:31
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0025_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='hotel',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddField(
+            model_name='political',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='political',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='political',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddField(
+            model_name='touristsite',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='touristsite',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='touristsite',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['geohash'], name='hotel_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['latitude', 'longitude'], name='hotel_latlon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='political',
+            index=models.Index(fields=['geohash'], name='political_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='political',
+            index=models.Index(fields=['latitude', 'longitude'], name='political_latlon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='touristsite',
+            index=models.Index(fields=['geohash'], name='tourist_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='touristsite',
+            index=models.Index(fields=['latitude', 'longitude'], name='tourist_latlon_idx'),
+        ),
+    ]
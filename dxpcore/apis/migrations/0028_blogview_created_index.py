@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0027_tombstones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogview',
+            index=models.Index(fields=['created_at', 'blog'], name='blogview_created_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:46
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    '''Counts the views recorded so far into BlogViewDaily and Blog.view_count'''
+    Blog = apps.get_model('apis', 'Blog')
+    BlogView = apps.get_model('apis', 'BlogView')
+    BlogViewDaily = apps.get_model('apis', 'BlogViewDaily')
+    daily = (
+        BlogView.objects.annotate(day=TruncDate('created_at', tzinfo=dt_timezone.utc))
+        .values_list('blog_id', 'day').annotate(views=Count('id')).order_by()
+    )
+    rows, totals = [], {}
+    for blog_id, day, views in daily.iterator():
+        rows.append(BlogViewDaily(blog_id=blog_id, day=day, views=views))
+        totals[blog_id] = totals.get(blog_id, 0) + views
+        if len(rows) >= 1000:
+            BlogViewDaily.objects.bulk_create(rows)
+            rows = []
+    BlogViewDaily.objects.bulk_create(rows)
+    for blog_id, views in totals.items():
+        Blog.objects.filter(id=blog_id).update(view_count=views)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0028_blogview_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('horizon', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='blogview',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='BlogViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='apis.blog')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'blog'], name='blog_view_daily_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('blog', 'day'), name='unique_blog_view_day')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:50
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+
+
+def backfill_buckets(apps, schema_editor):
+    '''Counts the views recorded so far into quarter hour buckets; the counters build themselves on first read'''
+    BlogView = apps.get_model('apis', 'BlogView')
+    BlogViewBucket = apps.get_model('apis', 'BlogViewBucket')
+    buckets = {}
+    for created_at in BlogView.objects.values_list('created_at', flat=True).iterator(chunk_size=5000):
+        created_at = created_at.astimezone(dt_timezone.utc)
+        start = created_at.replace(minute=created_at.minute - created_at.minute % 15, second=0, microsecond=0)
+        buckets[start] = buckets.get(start, 0) + 1
+    BlogViewBucket.objects.bulk_create(
+        [BlogViewBucket(start=start, views=views) for start, views in buckets.items()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0029_blog_view_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField(unique=True)),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+    ]
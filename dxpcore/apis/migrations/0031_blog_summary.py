@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:51
+
+from django.db import migrations, models
+
+from dxpcore.utils.text import summarize
+
+
+def backfill_summaries(apps, schema_editor):
+    '''Derives the excerpt, word count and reading time of the existing blogs'''
+    Blog = apps.get_model('apis', 'Blog')
+    blogs = []
+    for blog in Blog.objects.only('id', 'content').iterator(chunk_size=500):
+        blog.excerpt, blog.word_count, blog.reading_time = summarize(blog.content)
+        blogs.append(blog)
+        if len(blogs) >= 500:
+            Blog.objects.bulk_update(blogs, ['excerpt', 'word_count', 'reading_time'])
+            blogs = []
+    Blog.objects.bulk_update(blogs, ['excerpt', 'word_count', 'reading_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0030_dashboard_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='excerpt',
+            field=models.CharField(default='', editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
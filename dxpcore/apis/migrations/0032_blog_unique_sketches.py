@@ -0,0 +1,58 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:53
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from dxpcore.utils.hll import HyperLogLog
+
+
+def backfill_sketches(apps, schema_editor):
+    '''Sketches the readers of the views still kept, one day at a time'''
+    BlogView = apps.get_model('apis', 'BlogView')
+    BlogUniqueSketch = apps.get_model('apis', 'BlogUniqueSketch')
+
+    def write(day, sketches):
+        BlogUniqueSketch.objects.bulk_create([
+            BlogUniqueSketch(blog_id=blog_id, day=day, sketch=sketch.to_bytes()) for blog_id, sketch in sketches.items()
+        ], batch_size=500)
+
+    current, sketches = None, {}
+    views = BlogView.objects.order_by('created_at').values_list('blog_id', 'user_id', 'ip_address', 'created_at')
+    for blog_id, user_id, ip_address, created_at in views.iterator(chunk_size=5000):
+        reader = f'user:{user_id}' if user_id else (f'ip:{ip_address}' if ip_address else None)
+        if not reader:
+            continue
+        day = created_at.astimezone(dt_timezone.utc).date()
+        if day != current:
+            if sketches:
+                write(current, sketches)
+            current, sketches = day, {}
+        for key in (blog_id, None):
+            sketches.setdefault(key, HyperLogLog()).add(reader)
+    if sketches:
+        write(current, sketches)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0031_blog_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogUniqueSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sketch', models.BinaryField()),
+                ('blog', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='unique_sketches', to='apis.blog')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('blog', 'day'), name='unique_blog_sketch_day'), models.UniqueConstraint(condition=models.Q(('blog__isnull', True)), fields=('day',), name='unique_site_sketch_day')],
+            },
+        ),
+        migrations.RunPython(backfill_sketches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0032_blog_unique_sketches'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_until', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(default='friend_request', max_length=30)),
+                ('title', models.CharField(max_length=100)),
+                ('message', models.CharField(max_length=255)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at', 'id'], name='notification_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='inboxstate',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_state', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='userevent',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_events', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='userevent',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='user_event_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,133 @@
+import hashlib
+import math
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from apis import response_cache
+from apis.versions import last_modified, model_versions
+
+
+class ConditionalGetMixin:
+    '''
+    Conditional GET (ETag / Last-Modified) for APIViews.
+
+    The validator comes from the content versions of `versioned_models`
+    (or an overridden get_last_modified), so it is computed before the list
+    query runs. A view's get() starts with:
+
+        not_modified = self.not_modified(request)
+        if not_modified:
+            return not_modified
+
+    and every GET response then carries ETag, Cache-Control and, once the
+    changed second has passed, Last-Modified.
+    '''
+    versioned_models = ()
+    cache_control = 'public, max-age=0, must-revalidate'
+
+    def get_last_modified(self, request):
+        '''Returns when the response for request last changed'''
+        return last_modified(*self.versioned_models)
+
+    def get_etag_parts(self, request):
+        '''Extra values the response varies on besides the URL (e.g. the user's role)'''
+        return []
+
+    def get_etag(self, request, modified):
+        parts = [type(self).__name__, request.get_full_path(), modified.isoformat(), *map(str, self.get_etag_parts(request))]
+        return '"%s"' % hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def http_last_modified(self, modified):
+        '''
+        Whole-second Last-Modified for modified, rounded up so If-Modified-Since
+        never predates the change. None while that second is still running: a
+        later write in the same second would round to the same value, so only
+        the ETag validates until then.
+        '''
+        stamp = math.ceil(modified.timestamp())
+        return stamp if stamp <= time.time() else None
+
+    def not_modified(self, request):
+        '''Returns a 304 response when the client's copy is current, else None'''
+        modified = self.get_last_modified(request)
+        etag = self.get_etag(request, modified)
+        stamp = self.http_last_modified(modified)
+        self._validators = (etag, stamp)
+        response = get_conditional_response(request._request, etag=etag, last_modified=stamp)
+        if response is not None and response.status_code == 304:
+            return response
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, '_validators', None)
+        if request.method in ('GET', 'HEAD') and validators and response.status_code in (200, 304):
+            etag, stamp = validators
+            response['ETag'] = etag
+            if stamp is not None:
+                response['Last-Modified'] = http_date(stamp)
+            response['Cache-Control'] = self.cache_control
+            if self.cache_control.startswith('private'):
+                patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class ResponseCacheMixin:
+    '''
+    Serves GETs from the rendered-response cache (see apis.response_cache).
+    Only for views whose output depends on nothing but the URL and the
+    content of `versioned_models`. A view's get() starts with:
+
+        cached = self.cached_response(request)
+        if cached:
+            return cached
+
+    and the response it builds otherwise is stored on the way out.
+    '''
+    versioned_models = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        response_cache.cached_views[cls.__name__] = cls
+
+    def cached_response(self, request):
+        '''Returns the cached response for request, or None when the view has to build it'''
+        self._cache_fill = None
+        if request.accepted_renderer.format != 'json':
+            return None
+        view_name = type(self).__name__
+        key = response_cache.variant_key(view_name, request)
+        version = '-'.join(f'{stamp:.6f}' for stamp in model_versions(*self.versioned_models))
+        entry = cache.get(key)
+        if entry and entry['version'] == version:
+            response_cache.record(view_name, 'hit')
+            return HttpResponse(entry['content'], content_type=entry['content_type'])
+
+        if not cache.add(response_cache.lock_key(key, version), 1, response_cache.LOCK_TIMEOUT):
+            # someone else is rebuilding this variant
+            if entry:
+                response_cache.record(view_name, 'stale')
+                return HttpResponse(entry['content'], content_type=entry['content_type'])
+            entry = response_cache.wait_for(key, version)
+            if entry:
+                response_cache.record(view_name, 'wait')
+                return HttpResponse(entry['content'], content_type=entry['content_type'])
+        response_cache.record(view_name, 'miss')
+        self._cache_fill = (key, version)
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        fill = getattr(self, '_cache_fill', None)
+        if fill:
+            key, version = fill
+            if response.status_code == 200:
+                response.render()
+                response_cache.store(key, version, response.content, response['Content-Type'])
+            else:
+                cache.delete(response_cache.lock_key(key, version))
+        return response
@@ -1,10 +1,12 @@
 from uuid import uuid4
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.utils import timezone
 from django.conf import settings
 from accounts.models import User
-from dxpcore.utils.constants import (BlogCategory, HotelCategory, PoliticalCategory,
+from dxpcore.utils.constants import (BlogCategory, HotelCategory, ImageStatus, InboxEventKind, PoliticalCategory,
                                      TourismCategory)
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
@@ -23,6 +25,13 @@ class ChatRoom(models.Model):
         '''Returns the total number of unread messages for a user in this chatroom'''
         return self.messages.filter(is_read=False, sender__is_active=True).exclude(sender=user).count()
     
+    @staticmethod
+    def total_unread_messages(user):
+        '''Returns the number of unread messages for a user across all of their chatrooms'''
+        return Message.objects.filter(
+            room__members=user, is_read=False, sender__is_active=True
+        ).exclude(sender=user).count()
+
     def read_all_messages(self, user):
         '''Marks all messages as read for a user in this chatroom'''
         self.messages.filter(is_read=False, sender__is_active=True).exclude(sender=user).update(is_read=True)
@@ -55,6 +64,35 @@ class FriendRequest(models.Model):
         return f"{self.sender.name} -> {self.receiver.name}"
 
 
+class PeopleSuggestion(models.Model):
+    '''Precomputed "people you may know" candidate for a user'''
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='people_suggestions')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggested_to')
+    mutual_friends = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'], name='unique_people_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-mutual_friends', 'candidate'], name='people_suggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.candidate_id} ({self.mutual_friends} mutual)"
+
+
+class PeopleSuggestionState(models.Model):
+    '''Tracks when a user's suggestions were computed and whether they are stale'''
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='people_suggestion_state')
+    stale = models.BooleanField(default=False)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} ({'stale' if self.stale else 'fresh'})"
+
+
 class Hotel(models.Model):
     '''Model to store information about hotels'''
     name = models.CharField(max_length=255)
@@ -68,9 +106,22 @@ class Hotel(models.Model):
     third_image = models.ImageField(upload_to='hotels/', null=True, blank=True)
     category = models.CharField(max_length=50, default=HotelCategory.STANDARD.value) 
 
+    # coordinates; geohash is derived from them on save for nearby queries
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='hotel_listing_idx'),
+            models.Index(fields=['category', '-created_at', 'id'], name='hotel_category_listing_idx'),
+            models.Index(fields=['geohash'], name='hotel_geohash_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='hotel_latlon_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -88,9 +139,22 @@ class Political(models.Model):
     second_image = models.ImageField(upload_to='political/', null=True, blank=True)
     third_image = models.ImageField(upload_to='political/', null=True, blank=True)
 
+    # coordinates; geohash is derived from them on save for nearby queries
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='political_listing_idx'),
+            models.Index(fields=['category', '-created_at', 'id'], name='political_category_listing_idx'),
+            models.Index(fields=['geohash'], name='political_geohash_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='political_latlon_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -108,9 +172,22 @@ class TouristSite(models.Model):
     third_image = models.ImageField(upload_to='tourism/', null=True, blank=True)
     category = models.CharField(max_length=50, default=TourismCategory.OTHERS.value)
 
+    # coordinates; geohash is derived from them on save for nearby queries
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='tourist_listing_idx'),
+            models.Index(fields=['category', '-created_at', 'id'], name='tourist_category_listing_idx'),
+            models.Index(fields=['geohash'], name='tourist_geohash_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='tourist_latlon_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -125,6 +202,12 @@ class Blog(models.Model):
     feature_image = models.ImageField(upload_to='blog/', null=True, blank=True)
     writer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blogs', null=True, blank=True)
     is_published = models.BooleanField(default=False)
+    # derived from content on save, for list screens (set_blog_summary)
+    excerpt = models.CharField(max_length=300, default='', editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False)
+    # maintained by the blog view rollup (apis.blog_views)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -143,15 +226,144 @@ class Blog(models.Model):
 
 
 class BlogView(models.Model):
+    '''A single read of a blog. Written in bulk from the view buffer and kept for BLOG_VIEW_RETENTION'''
     blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name='views')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # when the read happened, not when it was flushed
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # recent views per blog (trending feed) without touching the table
+            models.Index(fields=['created_at', 'blog'], name='blogview_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user or self.ip_address} viewed {self.blog.title} at {self.created_at}"
 
 
+
+class BlogViewDaily(models.Model):
+    '''Number of reads of a blog on one (UTC) day'''
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name='daily_views')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['blog', 'day'], name='unique_blog_view_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'blog'], name='blog_view_daily_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.blog_id} on {self.day}: {self.views}"
+
+
+class BlogUniqueSketch(models.Model):
+    '''HyperLogLog sketch of the distinct readers of a blog -- or of all blogs when blog is null -- on one (UTC) day'''
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name='unique_sketches', null=True, blank=True)
+    day = models.DateField()
+    # dxpcore.utils.hll.HyperLogLog.to_bytes()
+    sketch = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['blog', 'day'], name='unique_blog_sketch_day'),
+            models.UniqueConstraint(fields=['day'], condition=models.Q(blog__isnull=True), name='unique_site_sketch_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.blog_id or 'all blogs'} on {self.day}"
+
+
+class RollupCheckpoint(models.Model):
+    '''How far a rollup job has consumed its input, so a retried run never counts twice'''
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    # input seen by the previous run, consumed by the next one
+    horizon = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+
+
+class StatCounter(models.Model):
+    '''A named running total for the dashboards (see apis.stats)'''
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class BlogViewBucket(models.Model):
+    '''Reads of all blogs in one quarter hour starting at `start` (UTC)'''
+    start = models.DateTimeField(unique=True)
+    views = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.start}: {self.views}"
+
+
+class ImageSource(models.Model):
+    '''An uploaded image (by storage name) whose resized variants are generated by the image worker'''
+    name = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=10, default=ImageStatus.PENDING.value)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='image_source_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class ImageDerivative(models.Model):
+    '''A resized, EXIF-free copy of an ImageSource stored under a content-hashed name'''
+    source = models.ForeignKey(ImageSource, on_delete=models.CASCADE, related_name='derivatives')
+    variant = models.CharField(max_length=20)
+    format = models.CharField(max_length=10)
+    file = models.CharField(max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'variant', 'format'], name='unique_image_derivative'),
+        ]
+
+    def __str__(self):
+        return f"{self.source.name} {self.variant}.{self.format}"
+
+
+class Tombstone(models.Model):
+    '''Records a deleted catalogue or blog row so offline clients can drop it on their next sync'''
+    collection = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['collection', 'deleted_at', 'id'], name='tombstone_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.collection} #{self.object_id} deleted at {self.deleted_at}"
+
 class Notification(models.Model):
     '''Model to store notifications for users'''
     title = models.CharField(max_length=100)
@@ -160,9 +372,42 @@ class Notification(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='notification_created_idx'),
+        ]
+
     def __str__(self):
         return f'Notification: {self.title}'
 
+
+class UserEvent(models.Model):
+    '''An inbox entry for one user (friend requests, ...); broadcasts stay in Notification'''
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox_events')
+    kind = models.CharField(max_length=30, default=InboxEventKind.FRIEND_REQUEST.value)
+    title = models.CharField(max_length=100)
+    message = models.CharField(max_length=255)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='user_event_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.title}"
+
+
+class InboxState(models.Model):
+    '''Read watermark of a user's inbox: everything created up to read_until has been read'''
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='inbox_state')
+    read_until = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} read until {self.read_until}"
+
 @receiver(post_save, sender=ChatRoom)
 def broadcast_chatroom_update(sender, instance, created, **kwargs):
     if created:
@@ -173,6 +418,105 @@ def broadcast_chatroom_update(sender, instance, created, **kwargs):
         )
 
 
+@receiver([post_save, post_delete], sender=FriendRequest)
+def invalidate_people_suggestions(sender, instance, **kwargs):
+    '''A friendship starting or ending changes the suggestions of both ends and their friends'''
+    if instance.accepted:
+        from apis.suggestions import mark_suggestions_stale
+        transaction.on_commit(lambda: mark_suggestions_stale(instance.sender_id, instance.receiver_id))
+
+
+
+def bump_content_version(sender, **kwargs):
+    '''Catalogue and blog changes invalidate conditional GET validators once committed'''
+    from apis.versions import bump_model_version
+    transaction.on_commit(lambda: bump_model_version(sender))
+
+
+for versioned_model in (Hotel, Political, TouristSite, Blog):
+    post_save.connect(bump_content_version, sender=versioned_model, dispatch_uid=f'bump_version_{versioned_model.__name__}')
+    post_delete.connect(bump_content_version, sender=versioned_model, dispatch_uid=f'bump_version_delete_{versioned_model.__name__}')
+
+
+def bump_blog_publication(sender, **kwargs):
+    '''Blog saves and deletes rebuild the feed pools; view count updates do not'''
+    from apis.feed import bump_publication_version
+    transaction.on_commit(bump_publication_version)
+
+
+post_save.connect(bump_blog_publication, sender=Blog, dispatch_uid='bump_publication_Blog')
+post_delete.connect(bump_blog_publication, sender=Blog, dispatch_uid='bump_publication_delete_Blog')
+
+
+def queue_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    '''New or replaced images get resized variants from the image worker'''
+    from apis.images import IMAGE_FIELDS, queue_instance_images
+    # e.g. the last_login update of every sign-in touches no image
+    if update_fields is not None and not set(update_fields) & set(IMAGE_FIELDS[instance._meta.label_lower]):
+        return
+    queue_instance_images(instance)
+
+
+for image_model in (Hotel, Political, TouristSite, Blog, User):
+    post_save.connect(queue_image_derivatives, sender=image_model, dispatch_uid=f'queue_images_{image_model.__name__}')
+
+
+def update_search_index(sender, instance, **kwargs):
+    '''Keeps the full-text index in step with the catalogue and published blogs'''
+    from apis.search import index_object
+    index_object(instance)
+
+
+def remove_from_search_index(sender, instance, **kwargs):
+    from apis.search import unindex_object
+    unindex_object(instance)
+
+
+for searchable_model in (Hotel, Political, TouristSite, Blog):
+    post_save.connect(update_search_index, sender=searchable_model, dispatch_uid=f'index_{searchable_model.__name__}')
+    post_delete.connect(remove_from_search_index, sender=searchable_model, dispatch_uid=f'unindex_{searchable_model.__name__}')
+
+
+def set_geohash(sender, instance, **kwargs):
+    '''Derives the geohash from the coordinates so nearby queries can use a prefix index'''
+    from dxpcore.utils import geo
+    if geo.valid_point(instance.latitude, instance.longitude):
+        instance.geohash = geo.encode(instance.latitude, instance.longitude, geo.MAX_PRECISION)
+    else:
+        instance.geohash = ''
+
+
+for located_model in (Hotel, Political, TouristSite):
+    pre_save.connect(set_geohash, sender=located_model, dispatch_uid=f'geohash_{located_model.__name__}')
+
+
+def set_blog_summary(sender, instance, **kwargs):
+    '''Derives the excerpt, word count and reading time (minutes) from the content'''
+    from dxpcore.utils.text import summarize
+    instance.excerpt, instance.word_count, instance.reading_time = summarize(instance.content)
+
+
+pre_save.connect(set_blog_summary, sender=Blog, dispatch_uid='blog_summary')
+
+
+def record_tombstone(sender, instance, **kwargs):
+    '''Deleted rows are kept as tombstones for the delta sync endpoint'''
+    from apis.sync import collection_of
+    Tombstone.objects.create(collection=collection_of(sender), object_id=instance.pk)
+
+
+for synced_model in (Hotel, Political, TouristSite, Blog):
+    post_delete.connect(record_tombstone, sender=synced_model, dispatch_uid=f'tombstone_{synced_model.__name__}')
+
+def deliver_inbox_entry(sender, instance, created, **kwargs):
+    '''Pushes new notifications and user events to connected clients once committed'''
+    if created:
+        from apis.inbox import queue_delivery
+        queue_delivery(instance)
+
+for inbox_model in (Notification, UserEvent):
+    post_save.connect(deliver_inbox_entry, sender=inbox_model, dispatch_uid=f'deliver_{inbox_model.__name__}')
+
 class ReportUser(models.Model):
     '''Model to store reports against users'''
     reporter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reports_made')
@@ -181,4 +525,25 @@ class ReportUser(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.reporter.name} reported {self.reported_user.name}"
\ No newline at end of file
+        return f"{self.reporter.name} reported {self.reported_user.name}"
+
+
+def count_created(sender, instance, created, **kwargs):
+    '''Keeps the dashboard counters in step with the content tables'''
+    from apis import stats
+    if created:
+        transaction.on_commit(lambda: stats.adjust_counter(stats.counter_name(sender), 1))
+    if sender is Blog:
+        transaction.on_commit(stats.refresh_blog_categories)
+
+
+def count_deleted(sender, instance, **kwargs):
+    from apis import stats
+    transaction.on_commit(lambda: stats.adjust_counter(stats.counter_name(sender), -1))
+    if sender is Blog:
+        transaction.on_commit(stats.refresh_blog_categories)
+
+
+for counted_model in (Blog, Hotel, Political, TouristSite, User):
+    post_save.connect(count_created, sender=counted_model, dispatch_uid=f'count_{counted_model.__name__}')
+    post_delete.connect(count_deleted, sender=counted_model, dispatch_uid=f'uncount_{counted_model.__name__}')
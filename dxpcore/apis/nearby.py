@@ -0,0 +1,77 @@
+'''
+Nearby and bounding-box queries over the located catalogue models.
+
+Radius queries scan the geohash prefixes covering the circle's bounding
+box (at most geo.MAX_CELLS of them, as fine as that allows) through the
+geohash index. Bounding boxes use the
+(latitude, longitude) index. Only ids and coordinates are read for the
+candidates; exact distances are computed here and just the nearest rows are
+loaded in full.
+'''
+
+from django.db.models import Q
+
+from apis.models import Hotel, Political, TouristSite
+from apis.pagination import prefix_filter
+from dxpcore.utils import geo
+
+LOCATED_KINDS = {
+    'hotel': Hotel,
+    'tourist_site': TouristSite,
+    'political': Political,
+}
+
+
+def radius_candidates(model, latitude, longitude, radius_km):
+    '''Returns [(distance_km, id)] of the rows of model within radius_km'''
+    condition = Q()
+    for cell in geo.covering_cells(latitude, longitude, radius_km):
+        condition |= prefix_filter('geohash', cell)
+    found = []
+    for object_id, lat, lon in model.objects.filter(condition).values_list('id', 'latitude', 'longitude'):
+        distance = geo.distance_km(latitude, longitude, lat, lon)
+        if distance <= radius_km:
+            found.append((distance, object_id))
+    return found
+
+
+def bbox_candidates(model, min_lat, min_lon, max_lat, max_lon):
+    '''Returns [(distance from the box centre in km, id)] of the rows of model inside the box'''
+    condition = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon <= max_lon:
+        condition &= Q(longitude__gte=min_lon, longitude__lte=max_lon)
+        centre_lon = (min_lon + max_lon) / 2
+    else:
+        # the box crosses the antimeridian
+        condition &= Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon)
+        centre_lon = ((min_lon + max_lon + 360) / 2 + 180) % 360 - 180
+    centre_lat = (min_lat + max_lat) / 2
+    return [
+        (geo.distance_km(centre_lat, centre_lon, lat, lon), object_id)
+        for object_id, lat, lon in model.objects.filter(condition).values_list('id', 'latitude', 'longitude')
+    ]
+
+
+def nearest(candidates_by_kind, limit):
+    '''
+    Merges {kind: [(distance, id)]} into the limit nearest objects overall,
+    returned as [(kind, obj, distance_km)] ordered by distance
+    '''
+    ranked = sorted(
+        (distance, kind, object_id)
+        for kind, candidates in candidates_by_kind.items()
+        for distance, object_id in candidates
+    )[:limit]
+    wanted = {}
+    for _distance, kind, object_id in ranked:
+        wanted.setdefault(kind, []).append(object_id)
+    objects = {
+        (kind, obj.id): obj
+        for kind, ids in wanted.items()
+        for obj in LOCATED_KINDS[kind].objects.filter(id__in=ids)
+    }
+    return [
+        (kind, objects[kind, object_id], round(distance, 3))
+        for distance, kind, object_id in ranked
+        if (kind, object_id) in objects
+    ]
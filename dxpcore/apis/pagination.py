@@ -0,0 +1,132 @@
+'''
+Keyset (cursor) pagination helpers shared by the list endpoints.
+
+Pages are addressed by the values of the last row of the previous page
+instead of an OFFSET, so fetching page N costs the same as fetching page 1
+as long as an index covers the ordering.
+'''
+
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class InvalidCursor(ValueError):
+    '''Raised when a client sends a cursor we did not issue'''
+
+
+class KeysetPaginator:
+    '''
+    Paginates a queryset over a unique ordering, e.g. ('name', 'id')
+    or ('-created_at', 'id'). The last field must be unique.
+    '''
+
+    def __init__(self, ordering, page_size=50, max_page_size=200):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    def get_page_size(self, request):
+        '''Returns the requested page size, clamped to max_page_size'''
+        try:
+            size = int(request.query_params.get('page_size', self.page_size))
+        except (TypeError, ValueError):
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, obj):
+        '''Encodes the ordering values of obj into an opaque cursor'''
+        return self.encode_values([getattr(obj, field.lstrip('-')) for field in self.ordering])
+
+    def encode_values(self, values):
+        '''Encodes one value per ordering field into an opaque cursor'''
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model):
+        '''Decodes a cursor back into python values for each ordering field'''
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise InvalidCursor('Invalid cursor')
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except InvalidCursor:
+            raise
+        except Exception:
+            raise InvalidCursor('Invalid cursor')
+
+    def seek_filter(self, values):
+        '''Builds the "rows after this position" filter for the ordering'''
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate(self, request, queryset):
+        '''
+        Returns (rows, next_cursor) for the page addressed by the
+        `cursor` query param. next_cursor is None on the last page.
+        '''
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            queryset = queryset.filter(self.seek_filter(self.decode_cursor(cursor, queryset.model)))
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = self.encode_cursor(rows[-1])
+        return rows, next_cursor
+
+
+def wants_legacy_list(request):
+    '''
+    Old app versions send no pagination params and expect the whole list.
+    They keep getting it while settings.LEGACY_UNPAGINATED_LISTS is on.
+    '''
+    if not getattr(settings, 'LEGACY_UNPAGINATED_LISTS', False):
+        return False
+    return 'cursor' not in request.query_params and 'page_size' not in request.query_params
+
+
+def paginated_response(paginator, request, queryset, serializer_class):
+    '''Serializes one keyset page of queryset as {"next": ..., "results": [...]}'''
+    try:
+        page, next_cursor = paginator.paginate(request, queryset)
+    except InvalidCursor:
+        return Response({'message': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'next': next_cursor,
+        'results': serializer_class(page, many=True).data,
+    }, status=status.HTTP_200_OK)
+
+
+def prefix_filter(field, prefix):
+    '''
+    Prefix match expressed as a range so it can use a plain (or expression)
+    index on every backend, unlike LIKE 'x%' which SQLite only optimises
+    for NOCASE columns.
+    '''
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'})
+
+
+COUNT_CAP = 10000
+
+
+def capped_count(queryset, cap=COUNT_CAP):
+    '''Exact count up to cap, so filtered counts never scan the whole table'''
+    return queryset[:cap].count()
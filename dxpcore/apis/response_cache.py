@@ -0,0 +1,92 @@
+'''
+Server-side cache of rendered responses for public read endpoints.
+
+One cache entry per view and query-string variant holds the rendered bytes
+together with the content versions (see apis.versions) they were built
+from. Because the versions are bumped by post_save/post_delete, an entry
+is fresh exactly as long as none of its models changed; no key scanning
+or explicit deletes are needed.
+
+When an entry is out of date, one request takes a short lock and rebuilds
+it. Concurrent requests get the previous (stale) bytes if there are any.
+Only a variant never built before (or expired after ENTRY_TIMEOUT) has no
+stale bytes; its concurrent requests poll for the rebuild for at most
+WAIT_TIMEOUT, which a list endpoint's build time fits in, before giving up
+and building the response themselves, so a slow rebuild holds a request
+thread for half a second at most.
+'''
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+# how long an entry (fresh or stale) is kept at most
+ENTRY_TIMEOUT = 60 * 60
+# how long a rebuild may hold the lock before someone else may try
+LOCK_TIMEOUT = 10
+# how long a request without stale data waits for someone else's rebuild
+WAIT_TIMEOUT = 0.5
+WAIT_INTERVAL = 0.05
+
+STATS_TIMEOUT = None
+OUTCOMES = ('hit', 'miss', 'stale', 'wait')
+
+# view name -> view class, filled by ResponseCacheMixin subclasses
+cached_views = {}
+
+
+def variant_key(view_name, request):
+    '''Cache key of the response variant for request: path plus sorted query string'''
+    query = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    digest = hashlib.md5(repr((request.path, query)).encode()).hexdigest()
+    return f'response_cache:{view_name}:{digest}'
+
+
+def lock_key(key, version):
+    return f'{key}:lock:{version}'
+
+
+def record(view_name, outcome):
+    '''Counts a hit, miss, stale or wait outcome for view_name'''
+    key = f'response_cache_stats:{view_name}:{outcome}'
+    cache.add(key, 0, STATS_TIMEOUT)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add and incr
+        cache.set(key, 1, STATS_TIMEOUT)
+
+
+def wait_for(key, version):
+    '''Polls for an entry built at version until WAIT_TIMEOUT passes'''
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry and entry['version'] == version:
+            return entry
+    return None
+
+
+def store(key, version, content, content_type):
+    cache.set(key, {'version': version, 'content': content, 'content_type': content_type}, ENTRY_TIMEOUT)
+    cache.delete(lock_key(key, version))
+
+
+def stats():
+    '''Returns {view: {hit, miss, stale, wait, hit_ratio}} for every cached view'''
+    result = {}
+    for view_name in sorted(cached_views):
+        keys = [f'response_cache_stats:{view_name}:{outcome}' for outcome in OUTCOMES]
+        counts = cache.get_many(keys)
+        row = {outcome: counts.get(key, 0) for outcome, key in zip(OUTCOMES, keys)}
+        total = sum(row.values())
+        # stale and waited-for responses were served from the cache too
+        row['hit_ratio'] = round((row['hit'] + row['stale'] + row['wait']) / total, 4) if total else None
+        result[view_name] = row
+    return result
+
+
+def reset_stats():
+    cache.delete_many([f'response_cache_stats:{view}:{outcome}' for view in cached_views for outcome in OUTCOMES])
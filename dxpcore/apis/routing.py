@@ -1,9 +1,10 @@
 from django.urls import re_path
 
-from apis.consumers import ChatRoomsConsumer, NewChatConsumer, UnreadCountConsumer
+from apis.consumers import ChatRoomsConsumer, NewChatConsumer, NotificationsConsumer, UnreadCountConsumer
 
 websocket_urlpatterns = [
     re_path(r'ws/chat/(?P<room_name>\w+)/$', NewChatConsumer.as_asgi()),
     re_path(r'ws/chatrooms/$', ChatRoomsConsumer.as_asgi()),
     re_path(r'ws/unread_count/$', UnreadCountConsumer.as_asgi()),
+    re_path(r'ws/notifications/$', NotificationsConsumer.as_asgi()),
 ]
\ No newline at end of file
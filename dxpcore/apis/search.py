@@ -0,0 +1,217 @@
+'''
+Full-text search over the catalogue (hotels, tourist sites, political
+sites) and published blogs.
+
+Documents live in the SQLite FTS5 table `search_index` (created in
+migration 0025) and are kept in sync by post_save/post_delete receivers in
+apis.models. The rowid of a document encodes its primary key, category and
+kind, so re-indexing or removing one row is a rowid range lookup rather
+than a scan, and facets never touch the stored columns.
+
+A search is a single statement: the MATCH runs once in a CTE that feeds
+both the bm25-ranked page of results and the per kind/category facet counts.
+'''
+
+import re
+
+from django.db import connection
+
+from apis.models import Blog, Hotel, Political, TouristSite
+from dxpcore.utils.constants import BlogCategory, HotelCategory, PoliticalCategory, TourismCategory
+
+# kind -> (model, kind code, category enum)
+KINDS = {
+    'hotel': (Hotel, 1, HotelCategory),
+    'tourist_site': (TouristSite, 2, TourismCategory),
+    'political': (Political, 3, PoliticalCategory),
+    'blog': (Blog, 4, BlogCategory),
+}
+
+# rowid = object id << 8 | category code << 3 | kind code. Facets are then
+# counted from the rowids alone, without reading any stored column. Category
+# codes follow the enum order (0 for values outside the enum), so reordering
+# an enum requires `manage.py rebuildsearchindex`.
+KIND_BITS = 3
+CATEGORY_BITS = 5
+OBJECT_SHIFT = KIND_BITS + CATEGORY_BITS
+
+# bm25 weights of kind, object_id, category, title, location, body
+COLUMN_WEIGHTS = (0.0, 0.0, 0.0, 10.0, 3.0, 1.0)
+
+MAX_TERMS = 8
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def kind_of(model):
+    for kind, (kind_model, _code, _categories) in KINDS.items():
+        if kind_model is model:
+            return kind
+    return None
+
+
+def category_code(kind, category):
+    for code, member in enumerate(KINDS[kind][2], start=1):
+        if member.value == category:
+            return code
+    return 0
+
+
+def category_name(kind, code):
+    members = list(KINDS[kind][2])
+    return members[code - 1].value if 0 < code <= len(members) else None
+
+
+def document_rowid(kind, object_id, category):
+    return object_id << OBJECT_SHIFT | category_code(kind, category) << KIND_BITS | KINDS[kind][1]
+
+
+def document(kind, obj):
+    '''Returns (title, location, body) of obj, or None when it must not be searchable'''
+    if kind == 'blog':
+        if not obj.is_published:
+            return None
+        return obj.title, '', f'{obj.subtitle}\n{obj.content}'
+    location = ' '.join(filter(None, [obj.address, getattr(obj, 'landmark', '')]))
+    return obj.name, location, obj.description or ''
+
+
+def index_object(obj):
+    '''Adds, replaces or (when no longer searchable) removes obj in the index'''
+    index_objects([obj])
+
+
+def index_objects(objects):
+    '''index_object for many objects of one model, in two statements'''
+    objects = list(objects)
+    if not objects:
+        return
+    kind = kind_of(type(objects[0]))
+    rows = []
+    for obj in objects:
+        fields = document(kind, obj)
+        if fields:
+            rows.append([document_rowid(kind, obj.pk, obj.category), kind, obj.pk, obj.category, *fields])
+    with connection.cursor() as cursor:
+        cursor.executemany(DELETE_DOCUMENT, [delete_params(kind, obj.pk) for obj in objects])
+        insert_documents(cursor, rows)
+
+
+def unindex_object(obj):
+    kind = kind_of(type(obj))
+    with connection.cursor() as cursor:
+        cursor.execute(DELETE_DOCUMENT, delete_params(kind, obj.pk))
+
+
+# the category part of the rowid may have changed; all candidates are adjacent
+DELETE_DOCUMENT = 'DELETE FROM search_index WHERE rowid >= %s AND rowid < %s AND (rowid & %s) = %s'
+
+
+def delete_params(kind, object_id):
+    first = object_id << OBJECT_SHIFT
+    return [first, first + (1 << OBJECT_SHIFT), (1 << KIND_BITS) - 1, KINDS[kind][1]]
+
+
+def rebuild_index(chunk_size=2000):
+    '''Re-creates the whole index from the tables and returns the number of documents'''
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM search_index')
+        for kind, (model, _code, _categories) in KINDS.items():
+            queryset = model.objects.filter(is_published=True) if kind == 'blog' else model.objects.all()
+            rows = []
+            for obj in queryset.iterator(chunk_size=chunk_size):
+                rows.append([document_rowid(kind, obj.pk, obj.category), kind, obj.pk, obj.category, *document(kind, obj)])
+                if len(rows) >= chunk_size:
+                    total += insert_documents(cursor, rows)
+                    rows = []
+            total += insert_documents(cursor, rows)
+        # merge the b-tree segments written above into one
+        cursor.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    return total
+
+
+def insert_documents(cursor, rows):
+    if rows:
+        cursor.executemany(
+            'INSERT INTO search_index (rowid, kind, object_id, category, title, location, body) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+    return len(rows)
+
+
+def match_expression(query):
+    '''
+    Turns free text into a safe FTS5 expression: every word is quoted (so
+    FTS syntax in the input is inert) and prefix-matched, all must match.
+    '''
+    terms = TERM_PATTERN.findall(query.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(query, kinds=None, category=None, limit=20, offset=0):
+    '''
+    Returns (results, facets, total) for query.
+
+    results: [{kind, id, category, title, snippet, rank}] best first
+    facets:  {kind: {category: count}} over all matches of the kinds asked
+             for, ignoring the category filter so clients can offer the others
+    total:   number of matches with the category filter applied
+    '''
+    expression = match_expression(query)
+    if not expression:
+        return [], {}, 0
+    kinds = [kind for kind in (kinds or KINDS) if kind in KINDS]
+    kind_codes = [KINDS[kind][1] for kind in kinds]
+    kind_mask = (1 << KIND_BITS) - 1
+    facet_mask = (1 << OBJECT_SHIFT) - 1
+    kind_filter = f"(doc & {kind_mask}) IN ({', '.join(['%s'] * len(kind_codes))})"
+    category_filter = ''
+    category_codes = []
+    if category:
+        # only kinds that have the category; code 0 would match every
+        # document whose category is outside its enum
+        category_kinds = [kind for kind in kinds if category_code(kind, category)]
+        category_codes = [document_rowid(kind, 0, category) for kind in category_kinds]
+        if category_codes:
+            category_filter = f"AND (doc & {facet_mask}) IN ({', '.join(['%s'] * len(category_codes))})"
+        else:
+            category_filter = 'AND 0'
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    sql = f'''
+        WITH hits AS MATERIALIZED (
+            SELECT rowid AS doc, bm25(search_index, {weights}) AS rank
+            FROM search_index WHERE search_index MATCH %s
+        ),
+        page AS (
+            SELECT doc, rank FROM hits WHERE {kind_filter} {category_filter}
+            ORDER BY rank LIMIT %s OFFSET %s
+        )
+        SELECT page.doc, page.rank, search_index.object_id, search_index.category, search_index.title,
+               snippet(search_index, 5, '<b>', '</b>', '…', 16)
+        FROM page JOIN search_index ON search_index.rowid = page.doc
+        WHERE search_index MATCH %s
+        UNION ALL
+        SELECT doc & {facet_mask}, NULL, COUNT(*), NULL, NULL, NULL FROM hits WHERE {kind_filter} GROUP BY 1
+    '''
+    params = [expression, *kind_codes, *category_codes, limit, offset, expression, *kind_codes]
+    codes = {code: kind for kind, (_model, code, _categories) in KINDS.items()}
+    results, facets = [], {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for doc, rank, value, row_category, title, snippet in cursor.fetchall():
+            kind = codes[doc & kind_mask]
+            if rank is not None:
+                results.append({
+                    'kind': kind, 'id': value, 'category': row_category,
+                    'title': title, 'snippet': snippet, 'rank': rank,
+                })
+            else:
+                name = category_name(kind, doc >> KIND_BITS)
+                facets.setdefault(kind, {})[name] = facets.get(kind, {}).get(name, 0) + value
+    results.sort(key=lambda result: result['rank'])
+    if category:
+        total = sum(facets.get(kind, {}).get(category, 0) for kind in category_kinds)
+    else:
+        total = sum(sum(counts.values()) for counts in facets.values())
+    return results, facets, total
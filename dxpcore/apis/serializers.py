@@ -1,15 +1,101 @@
+import copy
+
 from django.contrib.auth import authenticate
+from django.db import models
 from rest_framework import serializers
 
 from accounts.models import User
+from apis.images import variant_map
+from apis.uploads import UploadError, attach_upload
 
 from .models import Blog, BlogView, Hotel, Notification, Political, ReportUser, TouristSite
 
 
-class UserSerializer(serializers.ModelSerializer):
+class ImageVariantsListSerializer(serializers.ListSerializer):
+    '''
+    Resolves the image variants of all items in one query before serializing
+    them, and loads the child's related_fields for the whole list at once
+    (a no-op when the queryset already selected them).
+    '''
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        related_fields = getattr(self.child, 'related_fields', ())
+        if related_fields:
+            models.prefetch_related_objects(items, *related_fields)
+        self.child.variants = variant_map(
+            name for item in items for name in self.child.image_names(item).values()
+        )
+        return [self.child.to_representation(item) for item in items]
+
+
+class ImageVariantsMixin:
+    '''
+    Adds `image_variants`: {field: {variant: {width, height, webp, jpeg}}} for
+    the fields in image_variant_fields. Images still being processed map to {}.
+    '''
+    image_variant_fields = ()
+    variants = None
+
+    def image_names(self, instance):
+        '''Returns {key: storage name} of the images to resolve for instance'''
+        names = {}
+        for field in self.image_variant_fields:
+            image = getattr(instance, field)
+            if image:
+                names[field] = image.name
+        return names
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        names = self.image_names(instance)
+        variants = self.variants if self.variants is not None else variant_map(names.values())
+        data['image_variants'] = {key: variants.get(name, {}) for key, name in names.items()}
+        return data
+
+
+class DirectUploadMixin:
+    '''
+    Lets image fields take the token of a direct upload (see apis.uploads)
+    instead of a file; the field is then set to the uploaded object.
+    '''
+
+    def to_internal_value(self, data):
+        uploads = {}
+        for name, field in self.fields.items():
+            value = data.get(name) if isinstance(field, serializers.FileField) else None
+            if isinstance(value, str) and value:
+                try:
+                    uploads[name] = attach_upload(value, self.Meta.model, field.source)
+                except UploadError as error:
+                    raise serializers.ValidationError({name: [str(error)]})
+        if uploads:
+            data = copy.copy(data)
+            for name in uploads:
+                data.pop(name)
+        validated = super().to_internal_value(data)
+        for name, key in uploads.items():
+            validated[self.fields[name].source] = key
+        return validated
+
+
+class UserSerializer(DirectUploadMixin, ImageVariantsMixin, serializers.ModelSerializer):
+    image_variant_fields = ('avatar',)
+
     class Meta:
         model = User
         exclude = ['password', 'groups', 'user_permissions']
+        list_serializer_class = ImageVariantsListSerializer
+
+
+class UserListSerializer(serializers.ModelSerializer):
+    '''Lightweight user representation for the admin user listing'''
+    class Meta:
+        model = User
+        fields = [
+            'id', 'name', 'email', 'phone', 'avatar', 'is_active', 'is_staff', 'is_superuser',
+            'email_verified', 'phone_verified', 'created_at',
+        ]
 
 class CreateUserSerializer(serializers.ModelSerializer):
     '''serializer for creating a user from admin panel'''
@@ -79,11 +165,14 @@ class RegisterUserSerializer(serializers.ModelSerializer):
         return user
 
 
-class HotelSerializer(serializers.ModelSerializer):
+class HotelSerializer(DirectUploadMixin, ImageVariantsMixin, serializers.ModelSerializer):
     '''Hotel Serializer'''
+    image_variant_fields = ('image', 'second_image', 'third_image')
+
     class Meta:
         model = Hotel
         fields = '__all__'
+        list_serializer_class = ImageVariantsListSerializer
 
 class NotificationSerializer(serializers.ModelSerializer):
     '''Notification Serializer'''
@@ -92,26 +181,53 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PoliticalSerializer(serializers.ModelSerializer):
+class PoliticalSerializer(DirectUploadMixin, ImageVariantsMixin, serializers.ModelSerializer):
     '''Political Serializer'''
+    image_variant_fields = ('image', 'second_image', 'third_image')
+
     class Meta:
         model = Political
         fields = '__all__'
+        list_serializer_class = ImageVariantsListSerializer
 
 
-class TouristSiteSerialiser(serializers.ModelSerializer):
+class TouristSiteSerialiser(DirectUploadMixin, ImageVariantsMixin, serializers.ModelSerializer):
     '''Tourist Attraction Site Serializers'''
+    image_variant_fields = ('image', 'second_image', 'third_image')
+
     class Meta:
         model = TouristSite
         fields = '__all__'
+        list_serializer_class = ImageVariantsListSerializer
 
-class BlogSerializer(serializers.ModelSerializer):
+class BlogSerializer(DirectUploadMixin, ImageVariantsMixin, serializers.ModelSerializer):
     '''Blog Serializer'''
     writer_name = serializers.CharField(source='writer.name', read_only=True)
     writer_image = serializers.ReadOnlyField()
+    image_variant_fields = ('feature_image',)
+    # writer_name, writer_image and image_names() read the writer
+    related_fields = ('writer',)
+
     class Meta:
         model = Blog
         fields = '__all__'
+        list_serializer_class = ImageVariantsListSerializer
+
+    def image_names(self, instance):
+        names = super().image_names(instance)
+        if instance.writer_id and instance.writer.avatar:
+            names['writer_image'] = instance.writer.avatar.name
+        return names
+
+
+class BlogSummarySerializer(BlogSerializer):
+    '''Blog list item: the precomputed excerpt instead of the content (blogs/<id>/ has it in full)'''
+
+    class Meta(BlogSerializer.Meta):
+        fields = (
+            'id', 'title', 'subtitle', 'excerpt', 'word_count', 'reading_time', 'category', 'feature_image',
+            'writer', 'writer_name', 'writer_image', 'is_published', 'view_count', 'created_at', 'updated_at',
+        )
 
 
 class BlogViewSerializer(serializers.ModelSerializer):
@@ -0,0 +1,187 @@
+'''
+Pre-aggregated statistics behind the web dashboard.
+
+Counters (StatCounter) hold the row totals of the content tables, blogs
+per category and all blog views ever flushed. Receivers in apis.models
+adjust them as rows are created or deleted, the blog view flush adds the
+views, and `manage.py refreshstats` rebuilds them from the tables.
+
+View buckets (BlogViewBucket) hold the reads of all blogs per quarter hour
+(UTC), added by the blog view flush. Every time zone's offset is a whole
+number of quarter hours, so views_per_day() can split any date range into
+local days exactly, daylight saving included, from a few hundred rows.
+
+Distinct readers come from the HyperLogLog sketches (BlogUniqueSketch) the
+flush keeps per blog and UTC day; a range is the merge of its days. A
+local range is answered from the UTC days it overlaps.
+'''
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from accounts.models import User
+from apis.models import Blog, BlogUniqueSketch, BlogView, BlogViewBucket, Hotel, Political, StatCounter, TouristSite
+from dxpcore.utils.hll import HyperLogLog
+
+COUNTED_MODELS = {
+    'blogs': Blog,
+    'hotels': Hotel,
+    'tourist_sites': TouristSite,
+    'political_sites': Political,
+    'users': User,
+}
+VIEWS_COUNTER = 'blog_views'
+CATEGORY_PREFIX = 'blog_category:'
+
+BUCKET = timedelta(minutes=15)
+DEFAULT_RANGE_DAYS = 28
+MAX_RANGE_DAYS = 366
+
+
+def counter_name(model):
+    for name, counted_model in COUNTED_MODELS.items():
+        if counted_model is model:
+            return name
+    return None
+
+
+def adjust_counter(name, delta):
+    '''Adds delta to a counter; a counter that is missing is rebuilt from the tables instead'''
+    if delta and not StatCounter.objects.filter(name=name).update(value=F('value') + delta):
+        refresh_counters()
+
+
+def refresh_blog_categories():
+    '''
+    Recounts blogs per category (one GROUP BY over the blogs). Runs after
+    every blog save, often concurrently, so the counters are upserted in
+    place rather than deleted and re-inserted, which would race on the
+    unique name; categories left without blogs drop to zero.
+    '''
+    per_category = dict(Blog.objects.values_list('category').annotate(count=Count('id')).order_by())
+    names = {f'{CATEGORY_PREFIX}{category}': count for category, count in per_category.items()}
+    with transaction.atomic():
+        StatCounter.objects.bulk_create(
+            [StatCounter(name=name, value=count) for name, count in names.items()],
+            update_conflicts=True, unique_fields=['name'], update_fields=['value'],
+        )
+        StatCounter.objects.filter(name__startswith=CATEGORY_PREFIX).exclude(name__in=names).update(value=0)
+
+
+def refresh_counters():
+    '''Rebuilds every counter from the tables'''
+    values = {name: model.objects.count() for name, model in COUNTED_MODELS.items()}
+    values[VIEWS_COUNTER] = Blog.objects.aggregate(views=Sum('view_count'))['views'] or 0
+    with transaction.atomic():
+        for name, value in values.items():
+            StatCounter.objects.update_or_create(name=name, defaults={'value': value})
+        refresh_blog_categories()
+
+
+def counters():
+    '''Returns {name: value} of every counter, building them on first use'''
+    values = dict(StatCounter.objects.values_list('name', 'value'))
+    if any(name not in values for name in (*COUNTED_MODELS, VIEWS_COUNTER)):
+        refresh_counters()
+        values = dict(StatCounter.objects.values_list('name', 'value'))
+    return values
+
+
+def blogs_per_category(values):
+    '''{category: count} out of counters() values'''
+    return {
+        name[len(CATEGORY_PREFIX):]: value for name, value in values.items()
+        if name.startswith(CATEGORY_PREFIX) and value > 0
+    }
+
+
+def bucket_start(moment):
+    '''Start of the quarter hour (UTC) that contains moment'''
+    moment = moment.astimezone(dt_timezone.utc)
+    return moment.replace(minute=moment.minute - moment.minute % 15, second=0, microsecond=0)
+
+
+def add_view_buckets(views):
+    '''Adds {bucket start: views} to BlogViewBucket'''
+    if not views:
+        return
+    existing = set(BlogViewBucket.objects.filter(start__in=views).values_list('start', flat=True))
+    BlogViewBucket.objects.bulk_create([
+        BlogViewBucket(start=start, views=count) for start, count in views.items() if start not in existing
+    ])
+    increments = defaultdict(list)
+    for start, count in views.items():
+        if start in existing:
+            increments[count].append(start)
+    for count, starts in increments.items():
+        BlogViewBucket.objects.filter(start__in=starts).update(views=F('views') + count)
+
+
+def rebuild_view_buckets(chunk_size=5000):
+    '''Recomputes the buckets from the raw views still kept'''
+    views = defaultdict(int)
+    for created_at in BlogView.objects.values_list('created_at', flat=True).iterator(chunk_size=chunk_size):
+        views[bucket_start(created_at)] += 1
+    with transaction.atomic():
+        BlogViewBucket.objects.all().delete()
+        add_view_buckets(views)
+
+
+def parse_range(params):
+    '''
+    Returns (start date, end date, ZoneInfo) from the start, end
+    (YYYY-MM-DD, inclusive) and tz (IANA name) query params. The default
+    is the last DEFAULT_RANGE_DAYS days in settings.TIME_ZONE.
+    Raises ValueError for anything invalid.
+    '''
+    try:
+        tz = ZoneInfo(params.get('tz') or settings.TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError, OSError):
+        # OSError: a tzdata directory such as "America" is not a zone
+        raise ValueError(f"Unknown time zone: {params.get('tz')}")
+    end = date.fromisoformat(params['end']) if params.get('end') else datetime.now(tz).date()
+    start = date.fromisoformat(params['start']) if params.get('start') else end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise ValueError('start must not be after end')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'The range can span at most {MAX_RANGE_DAYS} days')
+    return start, end, tz
+
+
+def views_per_day(start, end, tz):
+    '''Returns [(local date, views)] for every day from start to end (inclusive) in tz'''
+    first = datetime.combine(start, time.min, tzinfo=tz)
+    last = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz)
+    totals = {start + timedelta(days=offset): 0 for offset in range((end - start).days + 1)}
+    buckets = BlogViewBucket.objects.filter(start__gte=first, start__lt=last).values_list('start', 'views')
+    for bucket, views in buckets:
+        totals[bucket.astimezone(tz).date()] += views
+    return list(totals.items())
+
+
+def utc_days(start, end, tz):
+    '''Returns the first and last UTC day overlapping the local days start to end in tz'''
+    first = datetime.combine(start, time.min, tzinfo=tz)
+    last = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz) - timedelta(microseconds=1)
+    return first.astimezone(dt_timezone.utc).date(), last.astimezone(dt_timezone.utc).date()
+
+
+def reader_sketches(first_day, last_day, blog_id=None):
+    '''Yields (day, HyperLogLog) of a blog (of all blogs when None) from first_day to last_day'''
+    sketches = BlogUniqueSketch.objects.filter(blog_id=blog_id, day__range=(first_day, last_day)).order_by('day')
+    for day, data in sketches.values_list('day', 'sketch').iterator():
+        yield day, HyperLogLog.from_bytes(data)
+
+
+def unique_readers(first_day, last_day, blog_id=None):
+    '''Estimated distinct readers of a blog (of all blogs when None) from first_day to last_day'''
+    total = HyperLogLog()
+    for _day, sketch in reader_sketches(first_day, last_day, blog_id):
+        total.merge(sketch)
+    return total.count()
@@ -0,0 +1,138 @@
+'''
+People suggestions ("people you may know").
+
+Candidates are friends-of-friends ranked by the number of mutual friends,
+precomputed per user into PeopleSuggestion. A friendship change only marks
+the affected users stale, and a user read for the first time is queued the
+same way; `manage.py refreshpeoplesuggestions` recomputes stale users in
+the background while reads keep serving the rows already there. A refresh
+holds the lock on the user's PeopleSuggestionState row, so refreshes of one
+user never overlap. When a user has too few friends-of-friends the list is
+topped up with a random sample that walks the primary key index instead of
+ORDER BY RANDOM().
+'''
+
+import random
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Q
+
+from accounts.models import User
+from apis.models import FriendRequest, PeopleSuggestion, PeopleSuggestionState
+
+# how many ranked candidates are kept per user
+MAX_SUGGESTIONS = 200
+
+
+def friend_ids(user_ids):
+    '''Returns the ids of everyone who is friends with any of user_ids'''
+    user_ids = set(user_ids)
+    pairs = FriendRequest.objects.filter(
+        Q(sender_id__in=user_ids) | Q(receiver_id__in=user_ids), accepted=True
+    ).values_list('sender_id', 'receiver_id')
+    friends = set()
+    for sender_id, receiver_id in pairs:
+        if sender_id in user_ids:
+            friends.add(receiver_id)
+        if receiver_id in user_ids:
+            friends.add(sender_id)
+    return friends
+
+
+def refresh_suggestions(user_id, only_stale=False):
+    '''
+    Recomputes the ranked friends-of-friends candidates for a user. With
+    only_stale, a user refreshed meanwhile by another worker is skipped.
+    Returns whether it refreshed.
+    '''
+    with transaction.atomic():
+        state, _ = PeopleSuggestionState.objects.select_for_update().get_or_create(
+            user_id=user_id, defaults={'stale': True}
+        )
+        if only_stale and not state.stale:
+            return False
+
+        friends = friend_ids([user_id])
+        mutual = Counter()
+        if friends:
+            # each distinct friendship between one of my friends and someone else
+            # is one mutual friend for that someone else
+            edges = {
+                frozenset(pair) for pair in FriendRequest.objects.filter(
+                    Q(sender_id__in=friends) | Q(receiver_id__in=friends), accepted=True
+                ).values_list('sender_id', 'receiver_id')
+            }
+            for edge in edges:
+                for friend in edge & friends:
+                    for candidate in edge - {friend}:
+                        mutual[candidate] += 1
+        for excluded in friends | {user_id}:
+            mutual.pop(excluded, None)
+
+        PeopleSuggestion.objects.filter(user_id=user_id).delete()
+        PeopleSuggestion.objects.bulk_create([
+            PeopleSuggestion(user_id=user_id, candidate_id=candidate, mutual_friends=count)
+            for candidate, count in mutual.most_common(MAX_SUGGESTIONS)
+        ])
+        state.stale = False
+        state.save(update_fields=['stale', 'refreshed_at'])
+    return True
+
+
+def refresh_stale_suggestions(batch_size=100):
+    '''Refreshes up to batch_size stale users, longest waiting first, and returns how many'''
+    user_ids = list(
+        PeopleSuggestionState.objects.filter(stale=True).order_by('refreshed_at').values_list('user_id', flat=True)[:batch_size]
+    )
+    return sum(refresh_suggestions(user_id, only_stale=True) for user_id in user_ids)
+
+
+def mark_suggestions_stale(*user_ids):
+    '''Marks the given users and their friends for recomputation'''
+    affected = set(user_ids) | friend_ids(user_ids)
+    PeopleSuggestionState.objects.filter(user_id__in=affected).update(stale=True)
+
+
+def suggestable_people(user):
+    '''Users that may be suggested to user, with exclusions applied in SQL'''
+    sent = FriendRequest.objects.filter(sender=user).values('receiver_id')
+    received = FriendRequest.objects.filter(receiver=user).values('sender_id')
+    return (
+        User.objects.filter(deleted=False, is_staff=False)
+        .exclude(id=user.id)
+        .exclude(id__in=sent)
+        .exclude(id__in=received)
+    )
+
+
+def random_people(queryset, limit):
+    '''
+    Random sample of up to limit rows: seek to a random primary key and
+    read forward (wrapping around), so only limit index entries are read.
+    '''
+    bounds = User.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    start = random.randint(bounds['low'], bounds['high'])
+    people = list(queryset.filter(id__gte=start).order_by('id')[:limit])
+    if len(people) < limit:
+        people += list(queryset.filter(id__lt=start).order_by('id')[:limit - len(people)])
+    return people
+
+
+def suggest_people(user, limit=50):
+    '''Returns up to limit users to suggest, best-ranked first, as last computed'''
+    # first read: queue the user for the worker and make do with the random sample
+    PeopleSuggestionState.objects.get_or_create(user=user, defaults={'stale': True})
+
+    candidates = suggestable_people(user)
+    people = list(
+        candidates.filter(suggested_to__user=user)
+        .annotate(mutual_friends=F('suggested_to__mutual_friends'))
+        .order_by('-mutual_friends', 'id')[:limit]
+    )
+    if len(people) < limit:
+        seen = [person.id for person in people]
+        people += random_people(candidates.exclude(id__in=seen), limit - len(people))
+    return people
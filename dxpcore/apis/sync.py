@@ -0,0 +1,256 @@
+'''
+Delta sync of the catalogue and published blogs for offline clients.
+
+A client keeps one opaque mark per collection. A sync returns the rows
+created or updated after the mark (ordered by updated_at, id) and the ids
+deleted after it (from Tombstone rows written by post_delete receivers),
+plus the mark to send next time. Unpublished blogs are reported as deleted.
+
+The returned mark trails the clock by SAFETY_LAG: a row committed late by a
+slow transaction can carry an updated_at older than rows already sent, and
+resending the last few seconds of changes is cheaper than missing one.
+Clients upsert by id, so repeats are harmless.
+
+Tombstones are kept for TOMBSTONE_RETENTION. A mark older than that gets
+`reset: true`: the client should drop the collection and start over from
+the snapshot.
+
+A first-time client downloads the snapshot instead of paging through every
+row: a gzipped JSON file with all collections and their marks, rebuilt
+periodically by `manage.py buildsyncsnapshot` and stored under a name
+derived from a hash of its rows only. A rebuild with no row changes finds
+the file already stored and keeps it, so clients and CDNs keep their copy;
+the marks written in that file are then those of the earlier build, so
+clients take the marks from the manifest, which are always current.
+'''
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from apis.models import Blog, Hotel, Political, Tombstone, TouristSite
+from apis.pagination import InvalidCursor, KeysetPaginator
+from apis.serializers import BlogSerializer, HotelSerializer, PoliticalSerializer, TouristSiteSerialiser
+
+# collection -> (model, serializer); names follow the list endpoints
+COLLECTIONS = {
+    'hotels': (Hotel, HotelSerializer),
+    'tourists': (TouristSite, TouristSiteSerialiser),
+    'political': (Political, PoliticalSerializer),
+    'blogs': (Blog, BlogSerializer),
+}
+
+SAFETY_LAG = timedelta(seconds=30)
+TOMBSTONE_RETENTION = timedelta(days=90)
+PAGE_SIZE = 500
+
+SNAPSHOT_DIR = 'sync'
+SNAPSHOT_MANIFEST = f'{SNAPSHOT_DIR}/manifest.json'
+SNAPSHOT_CACHE_KEY = 'sync_snapshot_manifest'
+
+rows_pager = KeysetPaginator(ordering=('updated_at', 'id'))
+tombstones_pager = KeysetPaginator(ordering=('deleted_at', 'id'))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def collection_of(model):
+    for collection, (collection_model, _serializer) in COLLECTIONS.items():
+        if collection_model is model:
+            return collection
+    return None
+
+
+def queryset_for(collection):
+    model, _serializer = COLLECTIONS[collection]
+    queryset = model.objects.all()
+    if model is Blog:
+        queryset = queryset.select_related('writer')
+    return queryset
+
+
+def encode_mark(rows_position, tombstones_position):
+    '''A mark is the (updated_at, id) and (deleted_at, id) positions reached'''
+    return f'{rows_pager.encode_values(rows_position)}.{tombstones_pager.encode_values(tombstones_position)}'
+
+
+def decode_mark(collection, mark):
+    '''Returns the two positions of mark; an empty mark is the beginning of time'''
+    if not mark:
+        return (EPOCH, 0), (EPOCH, 0)
+    try:
+        rows_cursor, tombstones_cursor = mark.split('.')
+    except ValueError:
+        raise InvalidCursor('Invalid mark')
+    rows_position = rows_pager.decode_cursor(rows_cursor, COLLECTIONS[collection][0])
+    tombstones_position = tombstones_pager.decode_cursor(tombstones_cursor, Tombstone)
+    return tuple(rows_position), tuple(tombstones_position)
+
+
+def initial_mark(now=None):
+    '''Mark of a client that has seen everything up to now (minus the safety lag)'''
+    horizon = (now or timezone.now()) - SAFETY_LAG
+    return encode_mark((horizon, 0), (horizon, 0))
+
+
+def advance(position, page_end, has_more, horizon):
+    '''
+    Next position after a page: the last row when more pages follow,
+    otherwise held back to the horizon so late commits are picked up.
+    '''
+    if has_more:
+        return page_end
+    target = min(page_end, (horizon, 0)) if page_end else (horizon, 0)
+    return max(position, target)
+
+
+def changes(collection, mark, limit=PAGE_SIZE):
+    '''
+    Returns {changed, deleted, mark, has_more, reset} for collection since
+    mark. Raises InvalidCursor for a mark we did not issue.
+    '''
+    model, serializer_class = COLLECTIONS[collection]
+    rows_position, tombstones_position = decode_mark(collection, mark)
+    now = timezone.now()
+    horizon = now - SAFETY_LAG
+    first_sync = not mark
+
+    if not first_sync and min(rows_position[0], tombstones_position[0]) < now - TOMBSTONE_RETENTION:
+        return {'changed': [], 'deleted': [], 'mark': '', 'has_more': False, 'reset': True}
+
+    rows = list(
+        queryset_for(collection).filter(rows_pager.seek_filter(rows_position))
+        .order_by('updated_at', 'id')[:limit + 1]
+    )
+    rows_more = len(rows) > limit
+    rows = rows[:limit]
+
+    tombstones = list(
+        Tombstone.objects.filter(collection=collection)
+        .filter(tombstones_pager.seek_filter(tombstones_position))
+        .order_by('deleted_at', 'id')
+        .values_list('deleted_at', 'id', 'object_id')[:limit + 1]
+    )
+    tombstones_more = len(tombstones) > limit
+    tombstones = tombstones[:limit]
+
+    changed = rows
+    deleted = [object_id for _deleted_at, _id, object_id in tombstones]
+    if model is Blog:
+        changed = [blog for blog in rows if blog.is_published]
+        if not first_sync:
+            deleted += [blog.id for blog in rows if not blog.is_published]
+
+    rows_end = (rows[-1].updated_at, rows[-1].id) if rows else None
+    tombstones_end = tombstones[-1][:2] if tombstones else None
+    next_mark = encode_mark(
+        advance(rows_position, rows_end, rows_more, horizon),
+        advance(tombstones_position, tombstones_end, tombstones_more, horizon),
+    )
+    return {
+        'changed': serializer_class(changed, many=True).data,
+        'deleted': deleted,
+        'mark': next_mark,
+        'has_more': rows_more or tombstones_more,
+        'reset': False,
+    }
+
+
+def prune_tombstones():
+    '''Deletes tombstones older than the retention window and returns how many'''
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - TOMBSTONE_RETENTION).delete()
+    return deleted
+
+
+def build_snapshot(chunk_size=500):
+    '''
+    Writes every collection to a gzipped JSON file named after its content
+    hash, points the manifest at it and returns the manifest.
+    '''
+    generated_at = timezone.now()
+    marks = {collection: initial_mark(generated_at) for collection in COLLECTIONS}
+    encoder = DjangoJSONEncoder()
+    with tempfile.NamedTemporaryFile(suffix='.json.gz', delete=False) as temporary:
+        path = temporary.name
+    try:
+        digest = hashlib.sha256()
+        with gzip.open(path, 'wt', encoding='utf-8') as handle:
+            def write(text, hashed=True):
+                # the build time and marks change on every build; only the rows name the file
+                if hashed:
+                    digest.update(text.encode())
+                handle.write(text)
+
+            write('{"generated_at": ')
+            write(encoder.encode(generated_at), hashed=False)
+            write(', "collections": {')
+            for index, (collection, (model, serializer_class)) in enumerate(COLLECTIONS.items()):
+                write('%s"%s": {"mark": ' % (',' if index else '', collection))
+                write(encoder.encode(marks[collection]), hashed=False)
+                write(', "rows": [')
+                queryset = queryset_for(collection).order_by('id')
+                if model is Blog:
+                    queryset = queryset.filter(is_published=True)
+                first = True
+                batch = []
+                for obj in queryset.iterator(chunk_size=chunk_size):
+                    batch.append(obj)
+                    if len(batch) >= chunk_size:
+                        first = write_rows(write, encoder, serializer_class, batch, first)
+                        batch = []
+                write_rows(write, encoder, serializer_class, batch, first)
+                write(']}')
+            write('}}')
+
+        name = f'{SNAPSHOT_DIR}/snapshot-{digest.hexdigest()[:24]}.json.gz'
+        if not default_storage.exists(name):
+            with open(path, 'rb') as handle:
+                default_storage.save(name, File(handle))
+        size = default_storage.size(name)
+    finally:
+        os.unlink(path)
+
+    previous = snapshot_manifest()
+    manifest = {
+        'file': name, 'url': default_storage.url(name), 'size': size,
+        'generated_at': generated_at.isoformat(), 'marks': marks,
+    }
+    if default_storage.exists(SNAPSHOT_MANIFEST):
+        default_storage.delete(SNAPSHOT_MANIFEST)
+    default_storage.save(SNAPSHOT_MANIFEST, ContentFile(json.dumps(manifest)))
+    cache.set(SNAPSHOT_CACHE_KEY, manifest, None)
+
+    # keep the previous file for clients still downloading it
+    keep = {name.rsplit('/', 1)[-1], (previous or {}).get('file', '').rsplit('/', 1)[-1]}
+    for filename in default_storage.listdir(SNAPSHOT_DIR)[1]:
+        if filename.startswith('snapshot-') and filename not in keep:
+            default_storage.delete(f'{SNAPSHOT_DIR}/{filename}')
+    return manifest
+
+
+def write_rows(write, encoder, serializer_class, batch, first):
+    for data in serializer_class(batch, many=True).data:
+        write(('' if first else ',') + encoder.encode(data))
+        first = False
+    return first
+
+
+def snapshot_manifest():
+    '''Returns the manifest of the current snapshot, or None when none was built yet'''
+    manifest = cache.get(SNAPSHOT_CACHE_KEY)
+    if manifest is None and default_storage.exists(SNAPSHOT_MANIFEST):
+        with default_storage.open(SNAPSHOT_MANIFEST) as handle:
+            manifest = json.load(handle)
+        cache.set(SNAPSHOT_CACHE_KEY, manifest, None)
+    return manifest
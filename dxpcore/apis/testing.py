@@ -0,0 +1,70 @@
+'''
+Seed data for the query budget tests (apis.tests) and the endpoint latency
+benchmark (benchmarks/endpoints.py).
+
+seed_fixtures() fills an empty database with `count` rows of every
+catalogue and content table, readers with friend requests and private
+chats, and image names on everything that has images, so every list
+endpoint has enough rows for an N+1 to stand out.
+'''
+
+from django.core.cache import cache
+
+from accounts.models import User
+from apis.models import Blog, ChatRoom, FriendRequest, Hotel, Message, Notification, Political, TouristSite
+
+SEED_COUNT = 30
+MESSAGES_PER_ROOM = 5
+PASSWORD = 'secret'
+
+
+def seed_fixtures(count=SEED_COUNT):
+    '''
+    Returns (staff, reader). The reader has pending friend requests from the
+    first half of the other users and a private chat with each of the rest.
+    '''
+    staff = User.objects.create_user(email='staff@example.com', password=PASSWORD, phone='0200000000', name='Staff')
+    staff.is_staff = staff.is_superuser = True
+    staff.save()
+    users = [
+        User.objects.create_user(
+            email=f'user{number}@example.com', password=PASSWORD, phone=f'02{number:08d}', name=f'User {number}',
+        )
+        for number in range(1, count + 1)
+    ]
+    for user in users[1::2]:
+        user.avatar = f'avatars/user{user.id}.jpg'
+        user.save()
+    reader = users[0]
+
+    for number in range(count):
+        Hotel.objects.create(
+            name=f'Hotel {number}', address='Accra', phone='0300000000', image=f'hotels/hotel{number}.jpg',
+            latitude=5.6 + number / 1000, longitude=-0.18,
+        )
+        TouristSite.objects.create(
+            name=f'Site {number}', address='Cape Coast', image=f'tourist/site{number}.jpg',
+            latitude=5.1 + number / 1000, longitude=-1.24,
+        )
+        Political.objects.create(
+            name=f'Office {number}', address='Accra', image=f'political/office{number}.jpg',
+            latitude=5.55, longitude=-0.2 + number / 1000,
+        )
+        Blog.objects.create(
+            title=f'Blog {number}', content='A day on the coast. ' * 150, is_published=True,
+            feature_image=f'blog/blog{number}.jpg', writer=users[number % 5],
+        )
+        Notification.objects.create(title=f'Notice {number}', message='Hello', created_by=staff)
+
+    half = count // 2
+    for user in users[1:half]:
+        FriendRequest.objects.create(sender=user, receiver=reader)
+    for number, user in enumerate(users[half:]):
+        room = ChatRoom.objects.create(room_id=f'room{number}', name=f'room{number}')
+        room.members.add(reader, user)
+        Message.objects.bulk_create([
+            Message(room=room, sender=user if index % 2 else reader, content=f'Message {index}')
+            for index in range(MESSAGES_PER_ROOM)
+        ])
+    cache.clear()
+    return staff, reader
@@ -1,3 +1,1446 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib
+import json
+import math
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import boto3
+import requests
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from moto import mock_aws
+from PIL import Image
+from rest_framework.test import APIClient
+
+from accounts.models import OTP
+from apis import feed, images, nearby, response_cache, search, stats, sync
+from apis.blog_views import add_daily_views, flush_views, record_view, write_events
+from apis.consumers import ChatRoomsConsumer, NewChatConsumer, NotificationsConsumer, UnreadCountConsumer
+from apis.inbox import BROADCAST_GROUP, DELIVERY_CHUNK, user_group
+from apis.models import (Blog, BlogView, BlogViewDaily, FriendRequest, Hotel, ImageSource, Notification,
+                         PeopleSuggestion, PeopleSuggestionState, Political, RollupCheckpoint, StatCounter, TouristSite,
+                         UserEvent)
+from apis.pagination import InvalidCursor
+from apis.routing import websocket_urlpatterns
+from apis.stats import refresh_counters, unique_readers
+from apis.suggestions import refresh_stale_suggestions, refresh_suggestions
+from apis.testing import PASSWORD, seed_fixtures
+from apis.versions import bump_model_version, model_versions, version_key
+from dxpcore.utils import geo
+from dxpcore.utils.constants import HotelCategory, ImageStatus, PoliticalCategory, TourismCategory
+from notifications.presence import online_user_ids, presence_key, user_connected
+
+User = get_user_model()
+
+
+def jpeg_bytes():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), 'red').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+S3_STORAGES = {
+    'default': {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': 'media',
+            'region_name': 'us-east-1',
+            'custom_domain': 'cdn.example.com',
+            'querystring_auth': False,
+            'file_overwrite': False,
+            'object_parameters': {'CacheControl': 'public, max-age=31536000, immutable'},
+        },
+    },
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class UploadTestCase(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user(email='staff@example.com', password='secret', phone='0200000001', name='Staff')
+        self.staff.is_staff = True
+        self.staff.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def reserve(self, target, content_type='image/jpeg', client=None):
+        return (client or self.client).post(
+            '/api-v1/uploads/', {'target': target, 'content_type': content_type}, format='json'
+        )
+
+
+class LocalUploadTests(UploadTestCase):
+    '''MEDIA_STORAGE=local: the local endpoint stands in for the bucket'''
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, slot, content_type='image/jpeg'):
+        return APIClient().post(
+            slot['url'],
+            {**slot['fields'], 'file': SimpleUploadedFile('photo.jpg', jpeg_bytes(), content_type)},
+            format='multipart',
+        )
+
+    def test_uploaded_file_is_attached_by_token(self):
+        slot = self.reserve('hotel.image').json()
+        self.assertEqual(self.upload(slot).status_code, 204)
+        response = self.client.post(
+            '/api-v1/hotels/', {'name': 'Labadi', 'address': 'Accra', 'phone': '0300000000', 'image': slot['token']},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        hotel = Hotel.objects.get()
+        self.assertEqual(hotel.image.name, slot['key'])
+        self.assertTrue(hotel.image.name.startswith('hotels/'))
+        self.assertTrue(default_storage.exists(hotel.image.name))
+
+    def test_token_only_fits_its_field_and_needs_the_file(self):
+        hotel = Hotel.objects.create(name='Labadi', address='Accra', phone='0300000000')
+        slot = self.reserve('hotel.image').json()
+        response = self.client.post('/api-v1/hotels/', {'id': hotel.id, 'image': slot['token']}, format='json')
+        self.assertEqual(response.json(), {'image': ['The file has not been uploaded']})
+        self.upload(slot)
+        response = self.client.post('/api-v1/hotels/', {'id': hotel.id, 'second_image': slot['token']}, format='json')
+        self.assertEqual(response.json(), {'second_image': ['The upload was made for another field']})
+        response = self.client.post('/api-v1/hotels/', {'id': hotel.id, 'image': 'forged'}, format='json')
+        self.assertEqual(response.json(), {'image': ['Invalid upload token']})
+
+    def test_local_endpoint_checks_type_and_single_use(self):
+        slot = self.reserve('hotel.image').json()
+        self.assertEqual(self.upload(slot, content_type='text/html').status_code, 400)
+        self.assertEqual(self.upload(slot).status_code, 204)
+        self.assertEqual(self.upload(slot).status_code, 400)
+
+    def test_only_staff_upload_catalogue_images(self):
+        reader = User.objects.create_user(email='reader@example.com', password='secret', phone='0200000002', name='Reader')
+        client = APIClient()
+        client.force_authenticate(reader)
+        self.assertEqual(self.reserve('hotel.image', client=client).status_code, 401)
+        self.assertEqual(self.reserve('user.avatar', client=client).status_code, 201)
+        self.assertEqual(self.reserve('user.avatar', 'image/svg+xml', client=client).status_code, 400)
+        self.assertEqual(self.reserve('hotel.password').status_code, 400)
+
+
+@mock_aws
+@override_settings(MEDIA_STORAGE='s3', STORAGES=S3_STORAGES)
+class S3UploadTests(UploadTestCase):
+    '''MEDIA_STORAGE=s3 against moto's in-process S3'''
+
+    def setUp(self):
+        super().setUp()
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket='media')
+
+    def test_presigned_upload_goes_straight_to_the_bucket(self):
+        slot = self.reserve('blog.feature_image').json()
+        self.assertEqual(slot['fields']['key'], slot['key'])
+        response = requests.post(slot['url'], data=slot['fields'], files={'file': ('photo.jpg', jpeg_bytes(), 'image/jpeg')})
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.post(
+            '/api-v1/blogs/', {'title': 'Cape Coast', 'content': 'Castle', 'feature_image': slot['token']}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Blog.objects.get().feature_image.name, slot['key'])
+        self.assertEqual(response.json()['data']['feature_image'], f"https://cdn.example.com/{slot['key']}")
+        stored = self.s3.head_object(Bucket='media', Key=slot['key'])
+        self.assertEqual(stored['CacheControl'], 'public, max-age=31536000, immutable')
+
+    def test_local_endpoint_is_off(self):
+        self.assertEqual(APIClient().post('/api-v1/uploads/local/', {}, format='multipart').status_code, 404)
+
+
+class ImageDerivativeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def store_photo(self, size=(400, 200), orientation=6):
+        '''A JPEG red on the left half and blue on the right, with camera EXIF'''
+        image = Image.new('RGB', size, 'blue')
+        image.paste('red', (0, 0, size[0] // 2, size[1]))
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        exif[images.ORIENTATION_TAG] = orientation
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        return default_storage.save('hotels/photo.jpg', ContentFile(buffer.getvalue()))
+
+    def process(self, name):
+        images.queue_images([name])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(images.process_images(), 1)
+        return ImageSource.objects.get(name=name)
+
+    def test_variants_are_upright_stripped_and_never_upscaled(self):
+        source = self.process(self.store_photo())
+        self.assertEqual((source.status, source.width, source.height), (ImageStatus.READY.value, 200, 400))
+        sizes = {(row.variant, row.format): (row.width, row.height) for row in source.derivatives.all()}
+        # 400px on the long edge: no medium (800) or large (1600) copies
+        self.assertEqual(sizes, {
+            ('small', 'webp'): (160, 320), ('small', 'jpeg'): (160, 320),
+            ('thumb', 'webp'): (48, 96), ('thumb', 'jpeg'): (48, 96),
+        })
+        for derivative in source.derivatives.all():
+            with default_storage.open(derivative.file, 'rb') as handle:
+                image = Image.open(handle)
+                image.load()
+            self.assertEqual(dict(image.getexif()), {})
+            self.assertNotIn('exif', image.info)
+            # orientation 6 turns the red left half to the top
+            red, green, blue = image.convert('RGB').getpixel((image.width // 2, image.height // 4))
+            self.assertGreater(red, 200)
+            self.assertLess(blue, 60)
+
+    def test_tiny_images_still_get_a_thumb(self):
+        source = self.process(self.store_photo(size=(40, 30), orientation=1))
+        sizes = {(row.variant, row.format): (row.width, row.height) for row in source.derivatives.all()}
+        self.assertEqual(sizes, {('thumb', 'webp'): (40, 30), ('thumb', 'jpeg'): (40, 30)})
+
+    def test_saves_that_touch_no_image_queue_nothing(self):
+        user = User.objects.create_user(email='avatar@example.com', password=PASSWORD, phone='0200000000', name='Avatar')
+        user.avatar = 'avatars/me.jpg'
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['avatar'])
+        self.assertTrue(ImageSource.objects.filter(name='avatars/me.jpg').exists())
+
+    def test_committed_variants_bump_the_models_using_the_image(self):
+        name = self.store_photo()
+        Hotel.objects.create(name='Labadi', address='Accra', phone='0300000000', second_image=name)
+        cache.set_many({version_key(Hotel): 1.0, version_key(Blog): 1.0})
+        self.process(name)
+        self.assertGreater(cache.get(version_key(Hotel)), 1.0)
+        self.assertEqual(cache.get(version_key(Blog)), 1.0)
+
+
+class UsersListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='admin@example.com', password=PASSWORD, phone='0200000000', name='Admin')
+        cls.staff.is_staff = True
+        cls.staff.save()
+        for number, name in enumerate(['ama', 'Kofi', 'kwame', 'Abena', 'Yaw', 'Esi', 'kwesi']):
+            User.objects.create_user(
+                email=f'{name.lower()}@example.com', password=PASSWORD, phone=f'024{number:07d}', name=name,
+            )
+        User.objects.filter(name='Esi').update(deleted=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def names(self, **params):
+        return [user['name'] for user in self.client.get('/api-v1/users/', params).json()['results']]
+
+    def test_keyset_pages_cover_every_user_once(self):
+        names, cursor = [], None
+        while True:
+            page = self.client.get('/api-v1/users/', {'page_size': 3, **({'cursor': cursor} if cursor else {})}).json()
+            self.assertLessEqual(len(page['results']), 3)
+            names += [user['name'] for user in page['results']]
+            cursor = page['next']
+            if not cursor:
+                break
+        expected = list(User.objects.filter(deleted=False).order_by('name', 'id').values_list('name', flat=True))
+        self.assertEqual(names, expected)
+        self.assertEqual(page['count'], len(expected))
+        self.assertEqual(self.client.get('/api-v1/users/', {'cursor': 'nope'}).status_code, 400)
+
+    def test_prefix_search(self):
+        self.assertEqual(sorted(self.names(search='kw')), ['kwame', 'kwesi'])
+        self.assertEqual(self.names(search='KOFI@'), ['Kofi'])
+        self.assertEqual(self.names(search='0240000001'), ['Kofi'])
+        self.assertEqual(self.names(search='es'), [])
+        self.assertEqual(self.client.get('/api-v1/users/', {'search': 'kw'}).json()['count'], 2)
+
+    def test_count_is_flagged_once_it_hits_the_cap(self):
+        self.assertTrue(self.client.get('/api-v1/users/').json()['count_is_exact'])
+        with mock.patch('apis.views.accounts.COUNT_CAP', 3):
+            page = self.client.get('/api-v1/users/').json()
+        self.assertEqual(page['count'], 3)
+        self.assertFalse(page['count_is_exact'])
+
+
+class CatalogueListTests(TestCase):
+    ENDPOINTS = {
+        '/api-v1/hotels/': (Hotel, {'phone': '0300000000'}, HotelCategory.FAMILY),
+        '/api-v1/political/': (Political, {}, PoliticalCategory.AGENCY),
+        '/api-v1/tourists/': (TouristSite, {}, TourismCategory.NATURE),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        moment = timezone.now()
+        for model, fields, category in cls.ENDPOINTS.values():
+            for number in range(9):
+                site = model.objects.create(
+                    name=f'Site {number}', address='Accra', **fields,
+                    **({'category': category.value} if number % 3 == 0 else {}),
+                )
+                # pairs of rows share created_at, so the id tie-break matters
+                model.objects.filter(id=site.id).update(created_at=moment - timedelta(minutes=number // 2))
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, path, **params):
+        ids, cursor = [], None
+        while True:
+            page = APIClient().get(path, {**params, 'page_size': 4, **({'cursor': cursor} if cursor else {})}).json()
+            self.assertLessEqual(len(page['results']), 4)
+            ids += [row['id'] for row in page['results']]
+            cursor = page['next']
+            if not cursor:
+                return ids
+
+    def test_cursor_pages_cover_every_row_once_in_order(self):
+        for path, (model, _fields, category) in self.ENDPOINTS.items():
+            with self.subTest(path=path):
+                expected = list(model.objects.order_by('-created_at', 'id').values_list('id', flat=True))
+                self.assertEqual(self.walk(path), expected)
+                expected = list(
+                    model.objects.filter(category=category.value).order_by('-created_at', 'id').values_list('id', flat=True)
+                )
+                self.assertEqual(self.walk(path, category=category.value), expected)
+                self.assertEqual(APIClient().get(path, {'cursor': 'nope'}).status_code, 400)
+
+    def test_legacy_clients_get_the_whole_list(self):
+        for path, (model, _fields, category) in self.ENDPOINTS.items():
+            with self.subTest(path=path):
+                with override_settings(LEGACY_UNPAGINATED_LISTS=True):
+                    cache.clear()
+                    rows = APIClient().get(path).json()
+                    self.assertIsInstance(rows, list)
+                    self.assertEqual(len(rows), model.objects.count())
+                    rows = APIClient().get(path, {'category': category.value}).json()
+                    self.assertEqual(len(rows), 3)
+                    # any pagination param opts in to pages
+                    self.assertEqual(len(APIClient().get(path, {'page_size': 4}).json()['results']), 4)
+                with override_settings(LEGACY_UNPAGINATED_LISTS=False):
+                    cache.clear()
+                    self.assertEqual(len(APIClient().get(path).json()['results']), model.objects.count())
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Labadi', address='Accra', phone='0300000000')
+        self.client = APIClient()
+
+    def get(self, path='/api-v1/hotels/?page_size=20', **headers):
+        return self.client.get(path, **headers)
+
+    def test_etag_revalidates_until_a_save(self):
+        response = self.get()
+        self.assertEqual(response['Cache-Control'], 'public, max-age=0, must-revalidate')
+        etag = response['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # a different URL has its own validator
+        self.assertEqual(self.get('/api-v1/hotels/?page_size=5', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hotel.name = 'Labadi Beach'
+            self.hotel.save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        cache.set(version_key(Hotel), time.time() - 3600, None)
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hotel.delete()
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_last_modified_rounds_up_to_the_next_second(self):
+        second = int(time.time()) - 3600
+        cache.set(version_key(Hotel), second + 0.2, None)
+        response = self.get()
+        self.assertEqual(response['Last-Modified'], http_date(second + 1))
+        # a copy fetched earlier in the same second predates the change
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(second)).status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(second + 1)).status_code, 304)
+
+    def test_no_last_modified_within_the_changed_second(self):
+        second = int(time.time()) - 3600
+        cache.set(version_key(Hotel), second + 0.2, None)
+        with mock.patch('apis.mixins.time.time', return_value=second + 0.5):
+            response = self.get()
+            self.assertNotIn('Last-Modified', response)
+            self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(second + 1)).status_code, 200)
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_writes_without_signals_must_bump(self):
+        etag = self.get()['ETag']
+        Hotel.objects.filter(id=self.hotel.id).update(name='Renamed')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        bump_model_version(Hotel)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['name'], 'Renamed')
+
+    def test_lost_version_never_answers_not_modified(self):
+        etag = self.get()['ETag']
+        cache.delete(version_key(Hotel))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_blog_view_flush_invalidates_blog_lists(self):
+        blog = Blog.objects.create(title='Elmina', content='Castle', is_published=True)
+        etag = self.get('/api-v1/blogs/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            write_events([(blog.id, None, '10.0.0.1', time.time())])
+        self.assertEqual(self.get('/api-v1/blogs/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+    PATH = '/api-v1/hotels/'
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Labadi', address='Accra', phone='0300000000')
+        self.staff = User.objects.create_user(email='staff@example.com', password=PASSWORD, phone='0200000000', name='Staff')
+        self.staff.is_staff = True
+        self.staff.save()
+
+    def variant(self):
+        '''(cache key, current version) of the unparameterised hotel list'''
+        key = response_cache.variant_key('HotelListAPI', SimpleNamespace(path=self.PATH, query_params=QueryDict('')))
+        return key, '-'.join(f'{stamp:.6f}' for stamp in model_versions(Hotel))
+
+    def stats(self):
+        return response_cache.stats()['HotelListAPI']
+
+    def test_miss_then_hit_until_invalidated(self):
+        first = APIClient().get(self.PATH).content
+        with self.assertNumQueries(0):
+            self.assertEqual(APIClient().get(self.PATH).content, first)
+        self.assertEqual((self.stats()['miss'], self.stats()['hit']), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hotel.name = 'Labadi Beach'
+            self.hotel.save()
+        self.assertIn(b'Labadi Beach', APIClient().get(self.PATH).content)
+        self.assertEqual(self.stats()['miss'], 2)
+
+    def test_stale_bytes_while_someone_rebuilds(self):
+        APIClient().get(self.PATH)
+        bump_model_version(Hotel)
+        key, version = self.variant()
+        cache.add(response_cache.lock_key(key, version), 1)
+        self.assertNotIn(b'Renamed', APIClient().get(self.PATH).content)
+        self.assertEqual(self.stats()['stale'], 1)
+
+    def test_cold_variant_waits_for_the_rebuild(self):
+        key, version = self.variant()
+        cache.add(response_cache.lock_key(key, version), 1)
+        rebuild = threading.Timer(0.1, response_cache.store, (key, version, b'["rebuilt"]', 'application/json'))
+        rebuild.start()
+        self.addCleanup(rebuild.cancel)
+        self.assertEqual(APIClient().get(self.PATH).json(), ['rebuilt'])
+        self.assertEqual(self.stats()['wait'], 1)
+
+    @mock.patch('apis.response_cache.WAIT_TIMEOUT', 0.1)
+    def test_gives_up_waiting_and_builds(self):
+        key, version = self.variant()
+        cache.add(response_cache.lock_key(key, version), 1)
+        started = time.monotonic()
+        self.assertEqual(APIClient().get(self.PATH).json()[0]['name'], 'Labadi')
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual((self.stats()['wait'], self.stats()['miss']), (0, 1))
+
+    def test_cachestats(self):
+        client = APIClient()
+        client.get(self.PATH)
+        client.get(self.PATH)
+        self.assertEqual(client.get('/api-v1/cachestats/').status_code, 401)
+        client.force_authenticate(User.objects.create_user(email='guest@example.com', password=PASSWORD, phone='0200000001', name='Guest'))
+        self.assertEqual(client.get('/api-v1/cachestats/').status_code, 403)
+        client.force_authenticate(self.staff)
+        row = client.get('/api-v1/cachestats/').json()['HotelListAPI']
+        self.assertEqual(row, {'hit': 1, 'miss': 1, 'stale': 0, 'wait': 0, 'hit_ratio': 0.5})
+        client.delete('/api-v1/cachestats/')
+        self.assertEqual(client.get('/api-v1/cachestats/').json()['HotelListAPI']['hit_ratio'], None)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.family = Hotel.objects.create(
+            name='Accra Family Lodge', address='Osu', phone='0300000000', category=HotelCategory.FAMILY.value,
+            description='Pool and garden',
+        )
+        self.standard = Hotel.objects.create(name='Labadi', address='Accra', phone='0300000001')
+        self.legacy = Hotel.objects.create(name='Old Accra Inn', address='Jamestown', phone='0300000002', category='Legacy')
+        self.site = TouristSite.objects.create(
+            name='Accra Arts Centre', address='High Street', phone='0300000003', category=TourismCategory.CULTURAL.value,
+        )
+        self.blog = Blog.objects.create(title='Weekend in Accra', content='Food', category='OLD BLOG', is_published=True)
+        Blog.objects.create(title='Accra draft', content='Unpublished', is_published=False)
+
+    def found(self, **kwargs):
+        results, facets, total = search.search('accra', **kwargs)
+        return {(result['kind'], result['id']) for result in results}, facets, total
+
+    def test_rowids_pack_id_category_and_kind(self):
+        rowid = search.document_rowid('tourist_site', 1234, TourismCategory.NATURE.value)
+        self.assertEqual(rowid >> search.OBJECT_SHIFT, 1234)
+        self.assertEqual(search.category_name('tourist_site', rowid >> search.KIND_BITS & 31), 'Nature')
+        self.assertEqual(rowid & 7, 2)
+        self.assertEqual(search.document_rowid('hotel', 5, 'Legacy') & 255, 1)
+        # every object's documents fall inside its delete range
+        first, end, mask, code = search.delete_params('tourist_site', 1234)
+        self.assertTrue(first <= rowid < end and rowid & mask == code)
+
+    def test_prefix_match_ranks_titles_and_counts_facets(self):
+        found, facets, total = self.found()
+        self.assertEqual(found, {
+            ('hotel', self.family.id), ('hotel', self.standard.id), ('hotel', self.legacy.id),
+            ('tourist_site', self.site.id), ('blog', self.blog.id),
+        })
+        self.assertEqual(total, 5)
+        self.assertEqual(facets['hotel'], {'Family': 1, 'Standard': 1, None: 1})
+        results, _facets, _total = search.search('acc gard')
+        self.assertEqual([result['id'] for result in results], [self.family.id])
+        # a title match outranks an address match
+        results, _facets, _total = search.search('accra', kinds=['hotel'])
+        self.assertEqual(results[-1]['id'], self.standard.id)
+        self.assertEqual(search.search('"); DROP TABLE search_index; --')[2], 0)
+
+    def test_category_filter_only_matches_kinds_that_have_it(self):
+        found, facets, total = self.found(category=HotelCategory.FAMILY.value)
+        self.assertEqual((found, total), ({('hotel', self.family.id)}, 1))
+        # facets still cover every category of the kinds asked for
+        self.assertEqual(facets['blog'], {None: 1})
+        found, facets, total = self.found(category='Nowhere')
+        self.assertEqual((found, total), (set(), 0))
+        self.assertEqual(sum(facets['hotel'].values()), 3)
+        found, _facets, total = self.found(kinds=['blog'], category=HotelCategory.FAMILY.value)
+        self.assertEqual((found, total), (set(), 0))
+
+    def test_index_follows_saves_and_deletes(self):
+        self.family.category = HotelCategory.BOOTIQUE.value
+        self.family.save()
+        self.assertEqual(self.found(category=HotelCategory.BOOTIQUE.value)[2], 1)
+        self.assertEqual(self.found(category=HotelCategory.FAMILY.value)[2], 0)
+        self.blog.is_published = False
+        self.blog.save()
+        self.legacy.delete()
+        self.assertEqual(self.found()[2], 3)
+
+    def test_migration_fills_the_index_like_a_rebuild(self):
+        def rowids():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT rowid, kind, object_id, category, title FROM search_index ORDER BY rowid')
+                return cursor.fetchall()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'search_index'")
+            self.assertIn('fts5', cursor.fetchone()[0])
+        self.assertEqual(search.rebuild_index(), 5)
+        rebuilt = rowids()
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM search_index')
+        migration = importlib.import_module('apis.migrations.0025_search_index')
+        migration.populate_search_index(django_apps, SimpleNamespace(connection=connection))
+        self.assertEqual(rowids(), rebuilt)
+
+
+def destination(latitude, longitude, bearing, distance_km):
+    '''The point distance_km from (latitude, longitude) along bearing (degrees)'''
+    phi, lam, theta = math.radians(latitude), math.radians(longitude), math.radians(bearing)
+    delta = distance_km / geo.EARTH_RADIUS_KM
+    phi2 = math.asin(math.sin(phi) * math.cos(delta) + math.cos(phi) * math.sin(delta) * math.cos(theta))
+    lam2 = lam + math.atan2(math.sin(theta) * math.sin(delta) * math.cos(phi), math.cos(delta) - math.sin(phi) * math.sin(phi2))
+    return math.degrees(phi2), (math.degrees(lam2) + 540) % 360 - 180
+
+
+class GeoCoverageTests(TestCase):
+    '''Geohash coverage checked against a brute-force distance filter'''
+
+    # (latitude, longitude, radius_km): Accra, geohash cell corners at several
+    # precisions, both sides of the antimeridian and near a pole
+    CIRCLES = [
+        (5.6037, -0.187, 5),
+        (0.0, 0.0, 1),
+        (0.0, 0.0, 40),
+        (45.0, 45.0, 0.3),
+        (22.5, -135.0, 12),
+        (-16.5, 179.98, 30),
+        (65.0, -179.995, 3),
+        (89.5, 10.0, 80),
+    ]
+
+    def sample_points(self, latitude, longitude, radius_km, cells):
+        '''Random points around the circle plus points on the edges of the chosen cells'''
+        rng = random.Random(f'{latitude},{longitude},{radius_km}')
+        points = [
+            destination(latitude, longitude, rng.uniform(0, 360), radius_km * rng.uniform(0, 1.2)) for _ in range(300)
+        ]
+        points += [destination(latitude, longitude, bearing, radius_km * 0.999) for bearing in range(0, 360, 5)]
+        precision = len(cells[0])
+        lat_bits = 5 * precision // 2
+        cell_lat, cell_lon = 180.0 / 2 ** lat_bits, 360.0 / 2 ** (5 * precision - lat_bits)
+        for bearing in range(0, 360, 15):
+            lat, lon = destination(latitude, longitude, bearing, radius_km * rng.uniform(0, 1))
+            edge_lat = max(min(round(lat / cell_lat) * cell_lat, 90.0), -90.0)
+            edge_lon = (round(lon / cell_lon) * cell_lon + 180) % 360 - 180
+            points += [(edge_lat, lon), (lat, edge_lon), (edge_lat, edge_lon)]
+        return points
+
+    def test_cells_cover_every_point_within_the_radius(self):
+        for latitude, longitude, radius_km in self.CIRCLES:
+            cells = geo.covering_cells(latitude, longitude, radius_km)
+            self.assertLessEqual(len(cells), geo.MAX_CELLS)
+            min_lat, min_lon, max_lat, max_lon = geo.radius_bbox(latitude, longitude, radius_km)
+            for lat, lon in self.sample_points(latitude, longitude, radius_km, cells):
+                if geo.distance_km(latitude, longitude, lat, lon) > radius_km:
+                    continue
+                with self.subTest(centre=(latitude, longitude, radius_km), point=(lat, lon)):
+                    self.assertTrue(min_lat <= lat <= max_lat)
+                    if min_lon <= max_lon:
+                        self.assertTrue(min_lon <= lon <= max_lon)
+                    else:
+                        self.assertTrue(lon >= min_lon or lon <= max_lon)
+                    point_hash = geo.encode(lat, lon, geo.MAX_PRECISION)
+                    self.assertTrue(any(point_hash.startswith(cell) for cell in cells))
+
+    def test_antimeridian_box_is_split(self):
+        cells = geo.cells_for_bbox(-17.0, 179.5, -16.0, -179.5)
+        for lon in (179.5, 179.99, -180.0, -179.99, -179.5):
+            with self.subTest(longitude=lon):
+                self.assertTrue(any(geo.encode(-16.5, lon, geo.MAX_PRECISION).startswith(cell) for cell in cells))
+        # nothing from the far side of the globe
+        self.assertFalse(any(geo.encode(-16.5, 0.0, geo.MAX_PRECISION).startswith(cell) for cell in cells))
+
+    def test_radius_query_matches_brute_force(self):
+        for latitude, longitude, radius_km in self.CIRCLES[-3:]:
+            Hotel.objects.all().delete()
+            cells = geo.covering_cells(latitude, longitude, radius_km)
+            for index, (lat, lon) in enumerate(self.sample_points(latitude, longitude, radius_km, cells)):
+                Hotel.objects.create(name=f'Hotel {index}', address='', phone='0', latitude=lat, longitude=lon)
+            expected = {
+                hotel.id for hotel in Hotel.objects.all()
+                if geo.distance_km(latitude, longitude, hotel.latitude, hotel.longitude) <= radius_km
+            }
+            found = {object_id for _distance, object_id in nearby.radius_candidates(Hotel, latitude, longitude, radius_km)}
+            with self.subTest(centre=(latitude, longitude, radius_km)):
+                self.assertTrue(expected)
+                self.assertEqual(found, expected)
+
+
+class BulkCatalogueTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Labadi', address='Accra', phone='0300000000')
+        staff = User.objects.create_user(email='staff@example.com', password=PASSWORD, phone='0200000000', name='Staff')
+        staff.is_staff = True
+        staff.save()
+        self.client = APIClient()
+        self.client.force_authenticate(staff)
+
+    def upload(self, body, content_type='text/csv'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api-v1/bulk/hotel/', data=body.encode(), content_type=content_type)
+
+    def export(self, file_format):
+        response = self.client.get(f'/api-v1/bulk/hotel/?file_format={file_format}')
+        return b''.join(response.streaming_content).decode()
+
+    def test_rows_with_an_id_update_and_the_rest_create(self):
+        cache.set(version_key(Hotel), 1.0)
+        response = self.upload(
+            'id,name,address,phone,latitude,longitude\n'
+            f'{self.hotel.id},Labadi Beach,,,5.56,-0.15\n'
+            ',Kempinski,Ridge,0300000001,,\n'
+        )
+        self.assertEqual(response.json(), {'created': 1, 'updated': 1, 'failed': 0, 'errors': []})
+        self.hotel.refresh_from_db()
+        # empty cells leave the field as it was
+        self.assertEqual((self.hotel.name, self.hotel.address), ('Labadi Beach', 'Accra'))
+        self.assertEqual(self.hotel.geohash, geo.encode(5.56, -0.15, geo.MAX_PRECISION))
+        self.assertEqual(Hotel.objects.get(name='Kempinski').geohash, '')
+        self.assertGreater(cache.get(version_key(Hotel)), 1.0)
+
+    def test_invalid_rows_are_reported_by_line(self):
+        response = self.upload('\n'.join([
+            json.dumps({'name': 'Movenpick', 'address': 'Accra', 'phone': '0300000002'}),
+            json.dumps({'id': 999999, 'name': 'Ghost'}),
+            json.dumps({'address': 'No name', 'phone': '0300000003'}),
+            json.dumps({'id': self.hotel.id, 'latitude': 120}),
+        ]), content_type='application/x-ndjson')
+        report = response.json()
+        self.assertEqual((report['created'], report['updated'], report['failed']), (1, 0, 3))
+        self.assertEqual([error['line'] for error in report['errors']], [2, 3, 4])
+        self.assertIn('id', report['errors'][0]['errors'])
+        self.assertIn('name', report['errors'][1]['errors'])
+        self.assertIn('latitude', report['errors'][2]['errors'])
+        self.assertTrue(Hotel.objects.filter(name='Movenpick').exists())
+        response = self.upload('{"name": "Broken"\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    def test_imported_rows_are_in_the_search_index(self):
+        report = self.upload(f'id,name,address,phone\n{self.hotel.id},Oceanview,,\n,Golden Tulip,Airport,0300000001\n').json()
+        self.assertEqual((report['created'], report['updated']), (1, 1))
+        self.assertEqual([result['title'] for result in search.search('golden')[0]], ['Golden Tulip'])
+        self.assertEqual([result['id'] for result in search.search('oceanview')[0]], [self.hotel.id])
+        self.assertEqual(search.search('labadi')[2], 0)
+
+    def test_export_round_trip(self):
+        self.upload('name,address,phone,latitude,longitude\nKempinski,Ridge,0300000001,5.56,-0.2\n')
+        before = self.export('ndjson')
+        self.assertEqual([json.loads(line)['name'] for line in before.splitlines()], ['Labadi', 'Kempinski'])
+        report = self.upload(self.export('csv')).json()
+        self.assertEqual((report['created'], report['updated'], report['failed']), (0, 2, 0))
+        exported = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        for row in exported:
+            row.pop('updated_at')
+        expected = [json.loads(line) for line in before.splitlines()]
+        for row in expected:
+            row.pop('updated_at')
+        self.assertEqual(exported, expected)
+
+
+class SyncTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.hotel = Hotel.objects.create(name='Labadi', address='Accra', phone='0300000000')
+        # everything so far committed well before the safety lag
+        Hotel.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+
+    def later(self, seconds):
+        return mock.patch('apis.sync.timezone.now', return_value=timezone.now() + timedelta(seconds=seconds))
+
+    def ids(self, result):
+        return [row['id'] for row in result['changed']]
+
+    def test_mark_trails_the_clock_by_the_safety_lag(self):
+        first = sync.changes('hotels', '')
+        self.assertEqual(self.ids(first), [self.hotel.id])
+        fresh = Hotel.objects.create(name='Kempinski', address='Ridge', phone='0300000001')
+        second = sync.changes('hotels', first['mark'])
+        self.assertEqual(self.ids(second), [fresh.id])
+        # still inside the lag: sent again in case an older commit lands late
+        self.assertEqual(self.ids(sync.changes('hotels', second['mark'])), [fresh.id])
+        with self.later(sync.SAFETY_LAG.total_seconds() + 1):
+            third = sync.changes('hotels', second['mark'])
+            self.assertEqual(self.ids(third), [fresh.id])
+            self.assertEqual(self.ids(sync.changes('hotels', third['mark'])), [])
+
+    def test_advance(self):
+        horizon = timezone.now()
+        start, end = (horizon - timedelta(minutes=2), 3), (horizon + timedelta(seconds=5), 9)
+        self.assertEqual(sync.advance(start, end, True, horizon), end)
+        self.assertEqual(sync.advance(start, end, False, horizon), (horizon, 0))
+        self.assertEqual(sync.advance(start, None, False, horizon), (horizon, 0))
+        # never moves back
+        self.assertEqual(sync.advance(end, None, False, horizon), end)
+
+    def test_deletes_come_from_tombstones(self):
+        mark = sync.changes('hotels', '')['mark']
+        hotel_id = self.hotel.id
+        self.hotel.delete()
+        result = sync.changes('hotels', mark)
+        self.assertEqual((result['changed'], result['deleted']), ([], [hotel_id]))
+        self.assertEqual(sync.changes('political', sync.changes('political', '')['mark'])['deleted'], [])
+
+    def test_unpublished_blogs_are_reported_as_deleted(self):
+        blog = Blog.objects.create(title='Accra', content='Food', is_published=True)
+        draft = Blog.objects.create(title='Draft', content='Soon')
+        first = sync.changes('blogs', '')
+        self.assertEqual((self.ids(first), first['deleted']), ([blog.id], []))
+        blog.is_published = False
+        blog.save()
+        result = sync.changes('blogs', first['mark'])
+        self.assertEqual(result['changed'], [])
+        self.assertIn(blog.id, result['deleted'])
+        self.assertNotIn(blog.id, self.ids(result))
+        self.assertIn(draft.id, result['deleted'])
+
+    def test_marks_older_than_the_retention_reset(self):
+        old = sync.initial_mark(timezone.now() - sync.TOMBSTONE_RETENTION - timedelta(days=1))
+        self.assertEqual(sync.changes('hotels', old), {
+            'changed': [], 'deleted': [], 'mark': '', 'has_more': False, 'reset': True,
+        })
+        self.assertFalse(sync.changes('hotels', sync.initial_mark())['reset'])
+        with self.assertRaises(InvalidCursor):
+            sync.changes('hotels', 'garbage')
+
+    def test_snapshot_is_only_rewritten_when_rows_change(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            first = sync.build_snapshot()
+            with self.later(60):
+                second = sync.build_snapshot()
+            self.assertEqual(second['file'], first['file'])
+            self.assertGreater(second['generated_at'], first['generated_at'])
+            self.assertNotEqual(second['marks'], first['marks'])
+            self.hotel.name = 'Labadi Beach'
+            self.hotel.save()
+            third = sync.build_snapshot()
+            self.assertNotEqual(third['file'], first['file'])
+            with default_storage.open(third['file']) as handle:
+                snapshot = json.loads(gzip.decompress(handle.read()))
+            self.assertEqual([row['name'] for row in snapshot['collections']['hotels']['rows']], ['Labadi Beach'])
+            self.assertEqual(sync.snapshot_manifest(), third)
+
+
+class PeopleSuggestionTests(TestCase):
+
+    def setUp(self):
+        self.users = {
+            name: User.objects.create_user(email=f'{name}@example.com', password=PASSWORD, phone=f'02{number:08d}', name=name)
+            for number, name in enumerate(['ama', 'kofi', 'esi', 'yaw', 'abena', 'kojo'])
+        }
+        for sender, receiver in [('ama', 'kofi'), ('ama', 'esi'), ('kofi', 'yaw'), ('esi', 'yaw'), ('kofi', 'abena')]:
+            FriendRequest.objects.create(sender=self.users[sender], receiver=self.users[receiver], accepted=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.users['ama'])
+
+    def people(self):
+        return [(person['name'], person['mutual_friends']) for person in self.client.get('/api-v1/people/').json()['people']]
+
+    def test_first_read_queues_the_refresh(self):
+        self.assertEqual(sorted(name for name, _mutual in self.people()), ['abena', 'kojo', 'yaw'])
+        self.assertTrue(PeopleSuggestionState.objects.get(user=self.users['ama']).stale)
+        self.assertFalse(PeopleSuggestion.objects.exists())
+
+        self.assertEqual(refresh_stale_suggestions(), 1)
+        self.assertEqual(self.people(), [('yaw', 2), ('abena', 1), ('kojo', 0)])
+        self.assertEqual(refresh_stale_suggestions(), 0)
+
+    def test_stale_rows_are_served_until_the_worker_runs(self):
+        refresh_suggestions(self.users['ama'].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            FriendRequest.objects.create(sender=self.users['esi'], receiver=self.users['kojo'], accepted=True)
+        self.assertTrue(PeopleSuggestionState.objects.get(user=self.users['ama']).stale)
+        self.assertEqual(self.people()[:2], [('yaw', 2), ('abena', 1)])
+
+        call_command('refreshpeoplesuggestions', stdout=StringIO())
+        self.assertEqual(self.people(), [('yaw', 2), ('abena', 1), ('kojo', 1)])
+
+    def test_refresh_skips_users_already_refreshed(self):
+        user_id = self.users['ama'].id
+        self.assertTrue(refresh_suggestions(user_id))
+        self.assertFalse(refresh_suggestions(user_id, only_stale=True))
+        self.assertTrue(refresh_suggestions(user_id))
+        self.assertEqual(PeopleSuggestion.objects.filter(user_id=user_id).count(), 2)
+
+
+class BlogFeedTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.blogs = [Blog.objects.create(title=f'Blog {index}', content='Text', is_published=True) for index in range(7)]
+        Blog.objects.create(title='Draft', content='Soon')
+        self.published = {blog.id for blog in self.blogs}
+
+    def page(self, **params):
+        response = APIClient().get('/api-v1/blogs/', {'page_size': 3, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def scroll(self, **params):
+        body = self.page(**params)
+        ids = [blog['id'] for blog in body['results']]
+        while body['next']:
+            body = self.page(**params, cursor=body['next'])
+            ids += [blog['id'] for blog in body['results']]
+        return ids
+
+    def test_seeded_order_is_stable_and_complete(self):
+        first = self.scroll(seed=42)
+        self.assertEqual(sorted(first), sorted(self.published))
+        self.assertEqual(self.scroll(seed=42), first)
+        self.assertEqual(first, sorted(self.published, key=lambda blog_id: feed.position(42, blog_id)))
+        self.assertNotEqual(self.scroll(seed=7), first)
+
+    def test_publishing_while_scrolling_never_repeats(self):
+        body = self.page(seed=42)
+        seen = [blog['id'] for blog in body['results']]
+        with self.captureOnCommitCallbacks(execute=True):
+            Blog.objects.create(title='Fresh', content='New', is_published=True)
+        while body['next']:
+            body = self.page(cursor=body['next'])
+            seen += [blog['id'] for blog in body['results']]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertTrue(self.published <= set(seen))
+
+    def test_view_flushes_keep_the_pool_and_ranking(self):
+        self.scroll(feed='trending')
+        with self.captureOnCommitCallbacks(execute=True):
+            write_events([(self.blogs[0].id, None, '10.0.0.1', time.time())])
+        # a view flush bumps the Blog version but rebuilds neither
+        with self.assertNumQueries(0):
+            feed.published_pool()
+            feed.trending_ranking()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blogs[1].delete()
+        self.assertNotIn(self.blogs[1].id, feed.published_pool())
+
+    def test_trending_ranks_recent_views_first(self):
+        now = timezone.now()
+        hot, warm, old = self.blogs[0], self.blogs[1], self.blogs[2]
+        BlogView.objects.bulk_create(
+            [BlogView(blog=hot, created_at=now) for _ in range(3)]
+            + [BlogView(blog=warm, created_at=now - timedelta(days=1)) for _ in range(3)]
+            + [BlogView(blog=old, created_at=now - feed.TRENDING_WINDOW - timedelta(hours=1)) for _ in range(50)]
+        )
+        ids = self.scroll(feed='trending')
+        self.assertEqual(ids[:2], [hot.id, warm.id])
+        # the rest follow newest first
+        self.assertEqual(ids[2:], [blog.id for blog in reversed(self.blogs) if blog not in (hot, warm)])
+
+    def test_malformed_cursors_are_rejected(self):
+        cursors = {
+            'random': [
+                ['random', 1, ['a', 'b']], ['random', 1, [1]], ['random', 1, [1.5, 2]], ['random', 1, [True, 2]],
+                ['random', '1', [1, 2]], ['trending', '1.0', 0], {'feed': 'random'},
+            ],
+            'trending': [['trending', 5, 0], ['trending', '1.0', 'x'], ['trending', '1.0', -3], ['trending', '1.0', True]],
+        }
+        for feed_name, values in ((name, values) for name, cases in cursors.items() for values in cases):
+            with self.subTest(values=values):
+                response = APIClient().get('/api-v1/blogs/', {'feed': feed_name, 'cursor': feed.encode_cursor(values)})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(APIClient().get('/api-v1/blogs/', {'cursor': '%%%'}).status_code, 400)
+
+    def test_legacy_list(self):
+        body = APIClient().get('/api-v1/blogs/').json()
+        self.assertIsInstance(body, list)
+        self.assertEqual({blog['id'] for blog in body}, self.published)
+        self.assertIn('content', body[0])
+        with override_settings(LEGACY_UNPAGINATED_LISTS=False):
+            body = APIClient().get('/api-v1/blogs/').json()
+        self.assertEqual(({blog['id'] for blog in body['results']}, body['next']), (self.published, None))
+        self.assertNotIn('content', body['results'][0])
+
+
+class BlogDetailTests(TestCase):
+
+    def setUp(self):
+        self.blog = Blog.objects.create(
+            title='Kakum', content='<p>Walk the canopy &amp; ' + 'see the forest ' * 150 + '</p>', is_published=True
+        )
+
+    def test_summary_is_derived_from_the_content(self):
+        self.assertEqual(self.blog.word_count, 454)
+        self.assertEqual(self.blog.reading_time, 3)
+        self.assertTrue(self.blog.excerpt.startswith('Walk the canopy & see'))
+        self.assertTrue(self.blog.excerpt.endswith('…'))
+        self.assertLessEqual(len(self.blog.excerpt), 280)
+
+    def test_feed_has_excerpts_and_detail_has_content(self):
+        item = APIClient().get('/api-v1/blogs/', {'feed': 'random'}).json()['results'][0]
+        self.assertNotIn('content', item)
+        self.assertEqual(item['excerpt'], self.blog.excerpt)
+        response = APIClient().get(f'/api-v1/blogs/{self.blog.id}/')
+        self.assertEqual(response.json()['content'], self.blog.content)
+
+    def test_detail_revalidates(self):
+        client = APIClient()
+        etag = client.get(f'/api-v1/blogs/{self.blog.id}/')['ETag']
+        self.assertEqual(client.get(f'/api-v1/blogs/{self.blog.id}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.blog.content = 'Rewritten'
+        self.blog.save()
+        self.assertEqual(client.get(f'/api-v1/blogs/{self.blog.id}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unpublished_blog_is_hidden_from_readers(self):
+        Blog.objects.filter(id=self.blog.id).update(is_published=False)
+        self.assertEqual(APIClient().get(f'/api-v1/blogs/{self.blog.id}/').status_code, 404)
+
+
+class UniqueReaderTests(TestCase):
+
+    def test_sketches_merge_across_days_and_blogs(self):
+        first = Blog.objects.create(title='Elmina', content='Castle')
+        second = Blog.objects.create(title='Mole', content='Park')
+        day = datetime(2026, 3, 2, 12, tzinfo=dt_timezone.utc).timestamp()
+        write_events(
+            [(first.id, None, f'10.0.{i // 200}.{i % 200}', day) for i in range(1000)]
+            + [(second.id, None, f'10.0.{i // 200}.{i % 200}', day + 86400) for i in range(500, 1500)]
+        )
+        self.assertAlmostEqual(unique_readers(date(2026, 3, 2), date(2026, 3, 3)), 1500, delta=1500 * 0.05)
+        self.assertAlmostEqual(unique_readers(date(2026, 3, 3), date(2026, 3, 3), second.id), 1000, delta=1000 * 0.05)
+        self.assertEqual(unique_readers(date(2026, 3, 3), date(2026, 3, 3), first.id), 0)
+
+
+class BlogViewBufferTests(TestCase):
+
+    def setUp(self):
+        self.buffer = caches['buffers']
+        self.buffer.clear()
+        self.addCleanup(self.buffer.clear)
+        self.blog = Blog.objects.create(title='Kakum', content='Canopy', is_published=True)
+
+    def flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return flush_views()
+
+    def test_a_flush_takes_the_views_the_previous_run_saw(self):
+        for _ in range(3):
+            record_view(self.blog.id, ip_address='10.0.0.1')
+        # numbers taken by now may not be written yet; the next run gets them
+        self.assertEqual(self.flush(), (0, 0))
+        record_view(self.blog.id)
+        self.assertEqual(self.flush(), (3, 0))
+        self.assertEqual(self.flush(), (1, 0))
+        self.assertEqual(self.flush(), (0, 0))
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.view_count, 4)
+        self.assertEqual(BlogView.objects.count(), 4)
+        self.assertEqual(BlogViewDaily.objects.get(blog=self.blog).views, 4)
+        self.assertEqual(self.buffer.get_many([f'blog_views:event:{number}' for number in range(1, 5)]), {})
+
+    def test_a_failed_flush_is_redone_without_counting_twice(self):
+        for _ in range(5):
+            record_view(self.blog.id)
+        self.flush()
+        with mock.patch('apis.blog_views.add_unique_readers', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                flush_views(chunk_size=2)
+        self.assertEqual(BlogView.objects.count(), 0)
+        self.assertEqual(RollupCheckpoint.objects.get().position, 0)
+        self.assertEqual(self.flush(), (5, 0))
+        self.assertEqual(self.flush(), (0, 0))
+        self.blog.refresh_from_db()
+        self.assertEqual((self.blog.view_count, BlogView.objects.count()), (5, 5))
+
+    def test_evicted_views_are_reported_and_a_restarted_counter_starts_over(self):
+        for _ in range(3):
+            record_view(self.blog.id)
+        self.flush()
+        self.buffer.delete('blog_views:event:2')
+        self.assertEqual(self.flush(), (2, 1))
+        self.buffer.clear()
+        record_view(self.blog.id)
+        # the counter is below the checkpoint: start over from it
+        self.assertEqual(self.flush(), (0, 0))
+        self.assertEqual(self.flush(), (1, 0))
+
+    def test_add_daily_views_creates_and_increments(self):
+        other = Blog.objects.create(title='Mole', content='Park', is_published=True)
+        monday, tuesday = date(2026, 3, 2), date(2026, 3, 3)
+        add_daily_views({(self.blog.id, monday): 2})
+        add_daily_views({(self.blog.id, monday): 3, (self.blog.id, tuesday): 1, (other.id, monday): 3})
+        add_daily_views({})
+        self.assertEqual(
+            sorted(BlogViewDaily.objects.values_list('blog_id', 'day', 'views')),
+            sorted([(self.blog.id, monday, 5), (self.blog.id, tuesday, 1), (other.id, monday, 3)]),
+        )
+
+
+class DashboardStatsTests(TestCase):
+
+    def test_parse_range(self):
+        accra = ZoneInfo('Africa/Accra')
+        start, end, tz = stats.parse_range({})
+        self.assertEqual((end - start).days, stats.DEFAULT_RANGE_DAYS - 1)
+        self.assertEqual(tz, ZoneInfo(settings.TIME_ZONE))
+        self.assertEqual(
+            stats.parse_range({'start': '2026-03-01', 'end': '2026-03-31', 'tz': 'Africa/Accra'}),
+            (date(2026, 3, 1), date(2026, 3, 31), accra),
+        )
+        self.assertEqual(stats.parse_range({'end': '2026-03-31'})[0], date(2026, 3, 4))
+        for params in (
+            {'tz': 'Mars/Olympus'}, {'tz': '../etc/passwd'}, {'tz': 'America'}, {'start': '2026-03-02', 'end': '2026-03-01'},
+            {'start': '2025-01-01', 'end': '2026-01-02'}, {'start': '01/03/2026'},
+        ):
+            with self.subTest(params=params), self.assertRaises(ValueError):
+                stats.parse_range(params)
+
+    def test_invalid_time_zones_are_bad_requests(self):
+        staff = User.objects.create_user(email='staff@example.com', password=PASSWORD, phone='0200000000', name='Staff')
+        staff.is_staff = True
+        staff.save()
+        blog = Blog.objects.create(title='Kakum', content='Canopy', is_published=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        for path in ('/api-v1/webdashboard/', f'/api-v1/blogs/{blog.id}/stats/'):
+            for tz in ('America', 'Mars/Olympus'):
+                with self.subTest(path=path, tz=tz):
+                    self.assertEqual(client.get(path, {'tz': tz}).status_code, 400)
+
+    def test_bucket_start(self):
+        utc = dt_timezone.utc
+        self.assertEqual(stats.bucket_start(datetime(2026, 3, 2, 12, 7, 31, tzinfo=utc)), datetime(2026, 3, 2, 12, 0, tzinfo=utc))
+        self.assertEqual(stats.bucket_start(datetime(2026, 3, 2, 12, 15, tzinfo=utc)), datetime(2026, 3, 2, 12, 15, tzinfo=utc))
+        # 14:50 in Kathmandu (+05:45) is 09:05 UTC
+        kathmandu = datetime(2026, 3, 2, 14, 50, tzinfo=ZoneInfo('Asia/Kathmandu'))
+        self.assertEqual(stats.bucket_start(kathmandu), datetime(2026, 3, 2, 9, 0, tzinfo=utc))
+
+    def add_views(self, tz, *local_times):
+        stats.add_view_buckets(Counter(stats.bucket_start(moment.replace(tzinfo=ZoneInfo(tz))) for moment in local_times))
+
+    def test_views_per_day_across_daylight_saving(self):
+        # New York moves from -05:00 to -04:00 at 02:00 on 8 March 2026, a 23 hour day
+        self.add_views(
+            'America/New_York',
+            datetime(2026, 3, 7, 23, 45), datetime(2026, 3, 8, 0, 0), datetime(2026, 3, 8, 1, 59),
+            datetime(2026, 3, 8, 3, 0), datetime(2026, 3, 8, 23, 45), datetime(2026, 3, 9, 0, 0),
+        )
+        new_york = ZoneInfo('America/New_York')
+        self.assertEqual(stats.views_per_day(date(2026, 3, 7), date(2026, 3, 9), new_york), [
+            (date(2026, 3, 7), 1), (date(2026, 3, 8), 4), (date(2026, 3, 9), 1),
+        ])
+        # the same buckets split on UTC days
+        self.assertEqual(stats.views_per_day(date(2026, 3, 8), date(2026, 3, 9), dt_timezone.utc), [
+            (date(2026, 3, 8), 4), (date(2026, 3, 9), 2),
+        ])
+        # and back in autumn (a 25 hour day)
+        self.add_views('America/New_York', datetime(2026, 11, 1, 0, 30), datetime(2026, 11, 1, 23, 59))
+        self.assertEqual(stats.views_per_day(date(2026, 11, 1), date(2026, 11, 1), new_york), [(date(2026, 11, 1), 2)])
+
+    def test_quarter_hour_offsets_split_exactly(self):
+        self.add_views('Asia/Kathmandu', datetime(2026, 3, 1, 23, 59), datetime(2026, 3, 2, 0, 0), datetime(2026, 3, 2, 0, 14))
+        self.assertEqual(stats.views_per_day(date(2026, 3, 1), date(2026, 3, 2), ZoneInfo('Asia/Kathmandu')), [
+            (date(2026, 3, 1), 1), (date(2026, 3, 2), 2),
+        ])
+
+    def test_blog_categories_are_upserted(self):
+        StatCounter.objects.create(name=f'{stats.CATEGORY_PREFIX}TRAVEL BLOG', value=99)
+        travel = Blog.objects.create(title='Elmina', content='Castle', category='TRAVEL BLOG')
+        Blog.objects.create(title='Mole', content='Park', category='FUN FACT')
+        stats.refresh_blog_categories()
+        stats.refresh_blog_categories()
+        self.assertEqual(stats.blogs_per_category(stats.counters()), {'TRAVEL BLOG': 1, 'FUN FACT': 1})
+        travel.category = 'FUN FACT'
+        with self.captureOnCommitCallbacks(execute=True):
+            travel.save()
+        self.assertEqual(stats.blogs_per_category(stats.counters()), {'FUN FACT': 2})
+        self.assertEqual(StatCounter.objects.get(name=f'{stats.CATEGORY_PREFIX}TRAVEL BLOG').value, 0)
+
+
+class InboxTests(TestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create_user(email='reader@example.com', password=PASSWORD, phone='0200000001', name='Reader')
+        self.friend = User.objects.create_user(email='friend@example.com', password=PASSWORD, phone='0200000002', name='Friend')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_broadcasts_and_events_are_merged_newest_first(self):
+        for number in range(3):
+            Notification.objects.create(title=f'Notice {number}', message='Hello')
+        friend = APIClient()
+        friend.force_authenticate(self.friend)
+        friend.post('/api-v1/sendfriendrequest/', {'receiver_id': self.reader.id})
+        Notification.objects.create(title='Notice 3', message='Hello')
+
+        titles, cursor = [], None
+        while True:
+            page = self.client.get('/api-v1/inbox/', {'page_size': 2, **({'cursor': cursor} if cursor else {})}).json()
+            titles += [entry['title'] for entry in page['results']]
+            cursor = page['next']
+            if not cursor:
+                break
+        self.assertEqual(titles, ['Notice 3', 'New Friend Request', 'Notice 2', 'Notice 1', 'Notice 0'])
+        self.assertEqual(page['unread'], 5)
+        # the friend's inbox has the broadcasts only
+        self.assertEqual(friend.get('/api-v1/inbox/unread/').json()['unread'], 4)
+
+    def test_read_watermark(self):
+        first = Notification.objects.create(title='First', message='Hello')
+        Notification.objects.create(title='Second', message='Hello')
+        UserEvent.objects.create(user=self.friend, title='Not mine', message='Hello')
+        self.assertEqual(self.client.get('/api-v1/inbox/unread/').json()['unread'], 2)
+
+        response = self.client.post('/api-v1/inbox/', {'until': first.created_at.isoformat()})
+        self.assertEqual(response.json()['unread'], 1)
+        entries = self.client.get('/api-v1/inbox/').json()['results']
+        self.assertEqual([(entry['title'], entry['read']) for entry in entries], [('Second', False), ('First', True)])
+        # the watermark never moves back
+        self.client.post('/api-v1/inbox/')
+        self.client.post('/api-v1/inbox/', {'until': first.created_at.isoformat()})
+        self.assertEqual(self.client.get('/api-v1/inbox/unread/').json()['unread'], 0)
+
+    def test_broadcasts_before_joining_are_read(self):
+        Notification.objects.create(title='Old', message='Hello')
+        newcomer = User.objects.create_user(email='new@example.com', password=PASSWORD, phone='0200000003', name='New')
+        self.client.force_authenticate(newcomer)
+        page = self.client.get('/api-v1/inbox/').json()
+        self.assertEqual(page['unread'], 0)
+        self.assertTrue(page['results'][0]['read'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api-v1/inbox/', {'cursor': 'nope'}).status_code, 400)
+
+    def test_entries_are_delivered_in_batches_on_commit(self):
+        layer = get_channel_layer()
+        async_to_sync(layer.group_add)(BROADCAST_GROUP, 'broadcasts')
+        async_to_sync(layer.group_add)(user_group(self.reader.id), 'reader')
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for number in range(DELIVERY_CHUNK + 1):
+                    Notification.objects.create(title=f'Notice {number}', message='Hello')
+                with self.assertRaises(ValueError), transaction.atomic():
+                    UserEvent.objects.create(user=self.reader, title='Rolled back', message='Hello')
+                    raise ValueError
+                with transaction.atomic():
+                    UserEvent.objects.create(user=self.reader, title='Kept', message='Hello')
+                UserEvent.objects.create(user=self.reader, title='Yours', message='Hello')
+            with self.assertRaises(ValueError), transaction.atomic():
+                UserEvent.objects.create(user=self.reader, title='Rolled back too', message='Hello')
+                raise ValueError
+        first = async_to_sync(layer.receive)('broadcasts')['entries']
+        second = async_to_sync(layer.receive)('broadcasts')['entries']
+        self.assertEqual((len(first), len(second)), (DELIVERY_CHUNK, 1))
+        self.assertEqual(second[0]['title'], f'Notice {DELIVERY_CHUNK}')
+        titles = []
+        for _ in range(2):
+            titles += [entry['title'] for entry in async_to_sync(layer.receive)('reader')['entries']]
+        self.assertEqual(sorted(titles), ['Kept', 'Yours'])
+        # nothing else is waiting
+        with self.assertRaises(asyncio.TimeoutError):
+            async_to_sync(asyncio.wait_for)(layer.receive('reader'), 0.1)
+        async_to_sync(layer.flush)()
+
+    def test_a_channel_layer_that_is_down_never_fails_the_write(self):
+        layer = mock.Mock(group_send=mock.AsyncMock(side_effect=ConnectionError('redis is down')))
+        friend = APIClient()
+        friend.force_authenticate(self.friend)
+        with mock.patch('apis.inbox.get_channel_layer', return_value=layer), self.assertLogs('django', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(title='Broadcast', message='Hello')
+                response = friend.post('/api-v1/sendfriendrequest/', {'receiver_id': self.reader.id})
+        self.assertLess(response.status_code, 300)
+        # both entries were batched into one delivery, which gave up at its first send
+        self.assertEqual(layer.group_send.await_count, 1)
+        self.assertEqual(self.client.get('/api-v1/inbox/unread/').json()['unread'], 2)
+
+
+class PresenceTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # presence counters live in the cache, which outlives the test
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(email='online@example.com', password=PASSWORD, phone='0200000009', name='Online')
+
+    def test_rejected_connection_leaves_the_counter_alone(self):
+        user_connected(self.user.id)
+
+        async def connect_with_a_bad_token():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/notifications/?token=nope')
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        self.assertFalse(asyncio.run(connect_with_a_bad_token()))
+        self.assertEqual(online_user_ids([self.user.id]), {self.user.id})
+
+    def test_only_counted_connections_disconnect_once(self):
+        consumer = NotificationsConsumer()
+        consumer.user = self.user
+
+        async def connect_and_disconnect_twice():
+            await consumer.mark_online()
+            await consumer.mark_offline()
+            await consumer.mark_offline()
+
+        user_connected(self.user.id)
+        asyncio.run(connect_and_disconnect_twice())
+        self.assertEqual(online_user_ids([self.user.id]), {self.user.id})
+
+    @mock.patch('apis.consumers.HEARTBEAT_INTERVAL', 0.01)
+    def test_heartbeat_restores_an_expired_counter(self):
+        consumer = NotificationsConsumer()
+        consumer.user = self.user
+
+        async def expire_while_open():
+            await consumer.mark_online()
+            cache.delete(presence_key(self.user.id))
+            await asyncio.sleep(0.1)
+            online = await database_sync_to_async(online_user_ids)([self.user.id])
+            await consumer.mark_offline()
+            return online
+
+        self.assertEqual(asyncio.run(expire_while_open()), {self.user.id})
+        self.assertEqual(online_user_ids([self.user.id]), set())
+
+
+class QueryBudgetTests(TestCase):
+    '''
+    Queries per request over seed_fixtures() (30 rows of everything). An
+    N+1 shows up as a budget blown by about 30; raise a budget only when
+    the extra query does not grow with the data. The response cache is
+    cleared before each request, so the budgets are those of a cold cache.
+    '''
+
+    # (client, path, query params, queries)
+    GET_BUDGETS = [
+        ('anonymous', '/api-v1/', {}, 0),
+        ('anonymous', '/api-v1/dashboard/', {}, 4),
+        ('staff', '/api-v1/webdashboard/', {}, 3),
+        ('staff', '/api-v1/cachestats/', {}, 0),
+        ('staff', '/api-v1/users/', {}, 2),
+        ('reader', '/api-v1/userprofile/', {}, 0),
+        ('reader', '/api-v1/userpreferences/', {}, 0),
+        ('anonymous', '/api-v1/hotels/', {}, 2),
+        ('anonymous', '/api-v1/hotels/', {'page_size': 20}, 2),
+        ('anonymous', '/api-v1/political/', {}, 2),
+        ('anonymous', '/api-v1/tourists/', {}, 2),
+        ('anonymous', '/api-v1/sync/', {}, 12),
+        ('staff', '/api-v1/bulk/hotel/', {}, 1),
+        ('staff', '/api-v1/blogs/', {}, 2),
+        ('anonymous', '/api-v1/blogs/', {}, 3),
+        ('anonymous', '/api-v1/blogs/', {'feed': 'random'}, 3),
+        ('anonymous', '/api-v1/blogs/', {'feed': 'trending'}, 4),
+        ('anonymous', '/api-v1/blogs/{blog}/', {}, 3),
+        ('staff', '/api-v1/blogs/{blog}/stats/', {}, 3),
+        ('staff', '/api-v1/notifications/', {}, 1),
+        ('reader', '/api-v1/inbox/', {}, 5),
+        ('reader', '/api-v1/inbox/unread/', {}, 3),
+        ('reader', '/api-v1/people/', {}, 8),
+        ('reader', '/api-v1/friendrequests/', {}, 1),
+        ('anonymous', '/api-v1/search/', {'q': 'hotel'}, 3),
+        ('anonymous', '/api-v1/nearby/', {'lat': 5.6, 'lon': -0.18, 'radius': 50}, 7),
+        ('anonymous', '/api-v1/verifyotp/', {'email': 'user2@example.com'}, 4),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff, cls.reader = seed_fixtures()
+        # the receivers update the counters on commit, which never comes in a TestCase
+        refresh_counters()
+        cls.blog = Blog.objects.order_by('id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.clients = {'anonymous': APIClient(), 'staff': APIClient(), 'reader': APIClient()}
+        self.clients['staff'].force_authenticate(self.staff)
+        self.clients['reader'].force_authenticate(self.reader)
+
+    def request(self, client, method, path, data=None, budget=0, **extra):
+        cache.clear()
+        # work deferred to on_commit (search index, counters, pushes) counts too
+        with self.assertNumQueries(budget), self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.clients[client], method)(path, data, **extra)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertLess(response.status_code, 400, content[:500])
+        return response
+
+    def test_get_budgets(self):
+        for client, path, params, budget in self.GET_BUDGETS:
+            path = path.format(blog=self.blog.id)
+            with self.subTest(path=path, params=params):
+                self.request(client, 'get', path, params, budget)
+
+    def test_account_budgets(self):
+        self.request('anonymous', 'post', '/api-v1/login/', {'email': 'user3@example.com', 'password': PASSWORD}, 10)
+        self.request('anonymous', 'post', '/api-v1/register/', {
+            'email': 'new@example.com', 'password': PASSWORD, 'phone': '0599999999', 'name': 'New',
+        }, 8)
+        self.request('reader', 'put', '/api-v1/userprofile/', {'name': 'Reader'}, 1)
+        self.request('reader', 'put', '/api-v1/userpreferences/', {'name': 'Reader'}, 1)
+        self.request('staff', 'put', '/api-v1/users/', {'id': self.reader.id, 'name': 'Reader'}, 2)
+        self.request('reader', 'post', '/api-v1/changepassword/', {
+            'old_password': PASSWORD, 'new_password': 'changed', 'confirm_password': 'changed',
+        }, 1)
+        OTP.objects.create(email='user2@example.com', otp='1234')
+        self.request('anonymous', 'post', '/api-v1/verifyotp/', {'email': 'user2@example.com', 'otp': '1234'}, 5)
+        self.request('anonymous', 'post', '/api-v1/resetpassword/', {
+            'email': 'user2@example.com', 'new_password': 'changed', 'confirm_password': 'changed',
+        }, 4)
+
+    def test_logout_budget(self):
+        token = self.clients['anonymous'].post(
+            '/api-v1/login/', {'email': 'user3@example.com', 'password': PASSWORD}
+        ).json()['token']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.clients['token'] = client
+        self.request('token', 'post', '/api-v1/logout/', {}, 4)
+
+    def test_social_budgets(self):
+        other = User.objects.get(email='user30@example.com')
+        self.request('reader', 'post', '/api-v1/sendfriendrequest/', {'receiver_id': other.id}, 5)
+        received = FriendRequest.objects.filter(receiver=self.reader).order_by('id')
+        self.request('reader', 'post', '/api-v1/acceptfriendrequest/', {'request_id': received[0].id}, 13)
+        self.request('reader', 'post', '/api-v1/rejectfriendrequest/', {'request_id': received[1].id}, 2)
+        self.request('reader', 'post', '/api-v1/blockuser/', {'chatroom_id': 'room0'}, 4)
+        self.request('reader', 'post', '/api-v1/reportuser/', {'reported_user_id': other.id, 'reason': 'Spam'}, 0)
+        self.request('anonymous', 'post', '/api-v1/accountdeletion/', {}, 0)
+
+    def test_content_budgets(self):
+        self.request('staff', 'post', '/api-v1/blogs/', {'title': 'New', 'content': 'Words'}, 8, format='json')
+        self.request('staff', 'post', '/api-v1/blogs/', {'id': self.blog.id, 'title': 'Edited'}, 11, format='json')
+        self.request('reader', 'post', '/api-v1/readblog/', {'blog': self.blog.id}, 1)
+        self.request('staff', 'post', '/api-v1/hotels/', {'name': 'New', 'address': 'Accra', 'phone': '0300000000'}, 4)
+        site = {'name': 'New', 'address': 'Accra', 'phone': '0300000000', 'landmark': 'Circle', 'description': 'Fort'}
+        self.request('staff', 'post', '/api-v1/political/', {**site, 'custodian': 'State'}, 4)
+        self.request('staff', 'post', '/api-v1/tourists/', site, 4)
+        self.request('staff', 'post', '/api-v1/notifications/', {'title': 'New', 'message': 'Hello'}, 5)
+        rows = ''.join(f'Imported {number},Accra,0300000000\n' for number in range(100))
+        self.request(
+            'staff', 'post', '/api-v1/bulk/hotel/', f'name,address,phone\n{rows}', 7, content_type='text/csv'
+        )
+        self.request('staff', 'post', '/api-v1/uploads/', {'target': 'hotel.image', 'content_type': 'image/jpeg'}, 0)
+
+    def test_consumer_budgets(self):
+        rooms = ChatRoomsConsumer()
+        rooms.user = self.reader
+        with self.assertNumQueries(4):
+            chatrooms = ChatRoomsConsumer.__dict__['get_chatrooms'].func(rooms)
+        self.assertEqual(len(chatrooms), 15)
+        self.assertEqual({room['unread'] for room in chatrooms}, {2})
+
+        chat = NewChatConsumer()
+        chat.user, chat.room_name = self.reader, 'room0'
+        with self.assertNumQueries(2):
+            NewChatConsumer.__dict__['get_chat_history'].func(chat)
+        with self.assertNumQueries(2):
+            NewChatConsumer.__dict__['get_member_ids'].func(chat)
+
+        unread = UnreadCountConsumer()
+        unread.user = self.reader
+        with self.assertNumQueries(1):
+            self.assertEqual(UnreadCountConsumer.__dict__['get_total_unread_count'].func(unread), 30)
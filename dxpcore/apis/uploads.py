@@ -0,0 +1,144 @@
+'''
+Direct-to-storage image uploads.
+
+A client asks for an upload slot (POST uploads/) and sends the file straight
+to the media storage: as an S3 presigned POST when MEDIA_STORAGE is s3, or to
+the local upload endpoint otherwise, so the client flow is the same in
+development. Upload bytes never pass through a Django worker in production.
+
+Every slot comes with a signed token. Sending the token as the value of the
+image field in the usual create/update request (see DirectUploadMixin)
+attaches the uploaded object to the row, and the image pipeline takes over.
+
+The file is not decoded here: an object that is not an image ends up as a
+failed ImageSource and gets no derivatives. Objects uploaded but never
+attached are best expired by a bucket lifecycle rule.
+'''
+
+import posixpath
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from apis.images import IMAGE_FIELDS
+
+# accepted content types -> file extension
+CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+
+# seconds a slot accepts the upload, and a token can be attached
+UPLOAD_EXPIRY = 15 * 60
+TOKEN_MAX_AGE = 24 * 60 * 60
+TOKEN_SALT = 'apis.uploads'
+
+
+class UploadError(ValueError):
+    '''Raised for an upload request or token we cannot accept'''
+
+
+def upload_targets():
+    '''Returns {'<model>.<field>': (model, field name)} of every uploadable image field'''
+    targets = {}
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        for field in fields:
+            targets[f'{model._meta.model_name}.{field}'] = (model, field)
+    return targets
+
+
+def can_upload(user, target):
+    '''Users may upload their avatar; everything else is staff content'''
+    if target == 'user.avatar':
+        return user.is_authenticated
+    return user.is_authenticated and (user.is_staff or user.is_superuser)
+
+
+def uses_local_storage():
+    return settings.MEDIA_STORAGE == 'local'
+
+
+def create_upload(target, content_type):
+    '''
+    Reserves a storage name for a new image of target and returns how to
+    upload it: {method, url, fields, key, token, max_size, expires_in}. The
+    file goes in a multipart POST to url with fields, as the last part.
+    '''
+    if target not in upload_targets():
+        raise UploadError(f'Unknown upload target: {target}')
+    if content_type not in CONTENT_TYPES:
+        raise UploadError(f"Unsupported content type, expected one of {', '.join(CONTENT_TYPES)}")
+    model, field_name = upload_targets()[target]
+    field = model._meta.get_field(field_name)
+    key = field.generate_filename(None, f'{uuid.uuid4().hex}.{CONTENT_TYPES[content_type]}')
+    token = signing.dumps({'target': target, 'key': key, 'type': content_type}, salt=TOKEN_SALT)
+    if uses_local_storage():
+        url, fields = reverse('apis:upload-local'), {'token': token}
+    else:
+        url, fields = presigned_post(key, content_type)
+    return {
+        'method': 'POST',
+        'url': url,
+        'fields': fields,
+        'key': key,
+        'token': token,
+        'max_size': settings.MAX_UPLOAD_SIZE,
+        'expires_in': UPLOAD_EXPIRY,
+    }
+
+
+def presigned_post(key, content_type):
+    '''Returns (url, fields) of an S3 presigned POST limited to one key, type and size'''
+    client = default_storage.connection.meta.client
+    name = posixpath.join(default_storage.location, key) if default_storage.location else key
+    post = client.generate_presigned_post(
+        default_storage.bucket_name,
+        name,
+        Fields={'Content-Type': content_type, 'Cache-Control': settings.MEDIA_CACHE_CONTROL},
+        Conditions=[
+            {'Content-Type': content_type},
+            {'Cache-Control': settings.MEDIA_CACHE_CONTROL},
+            ['content-length-range', 1, settings.MAX_UPLOAD_SIZE],
+        ],
+        ExpiresIn=UPLOAD_EXPIRY,
+    )
+    return post['url'], post['fields']
+
+
+def read_token(token, max_age=TOKEN_MAX_AGE):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise UploadError('The upload has expired')
+    except signing.BadSignature:
+        raise UploadError('Invalid upload token')
+
+
+def attach_upload(token, model, field_name):
+    '''Returns the storage name of the uploaded file token stands for, checking it was uploaded for this field'''
+    upload = read_token(token)
+    if upload['target'] != f'{model._meta.model_name}.{field_name}':
+        raise UploadError('The upload was made for another field')
+    if not default_storage.exists(upload['key']):
+        raise UploadError('The file has not been uploaded')
+    return upload['key']
+
+
+def save_local_upload(token, file):
+    '''Stores a file sent to the local upload endpoint under the name its token reserved'''
+    upload = read_token(token, max_age=UPLOAD_EXPIRY)
+    if not 0 < file.size <= settings.MAX_UPLOAD_SIZE:
+        raise UploadError(f'The file must be between 1 and {settings.MAX_UPLOAD_SIZE} bytes')
+    if file.content_type != upload['type']:
+        raise UploadError(f"Expected a file of type {upload['type']}")
+    if default_storage.exists(upload['key']):
+        raise UploadError('The file has already been uploaded')
+    default_storage.save(upload['key'], file)
+    return upload['key']
@@ -13,6 +13,7 @@ urlpatterns = [
 urlpatterns += [
     path('dashboard/', views.DashboardDataAPI.as_view(), name='dashboard'),
     path('webdashboard/', views.WebDashboardDataAPI.as_view(), name='webdashboard'),
+    path('cachestats/', views.ResponseCacheStatsAPI.as_view(), name='cachestats'),
 ]
 
 # accounts
@@ -44,15 +45,35 @@ urlpatterns += [
     path('tourists/', views.TouristSiteListAPI.as_view(), name='tourists'),
 ]
 
+# direct image uploads
+urlpatterns += [
+    path('uploads/', views.UploadAPIView.as_view(), name='uploads'),
+    path('uploads/local/', views.LocalUploadAPIView.as_view(), name='upload-local'),
+]
+
+# offline sync
+urlpatterns += [
+    path('sync/', views.SyncAPIView.as_view(), name='sync'),
+]
+
+# bulk import/export of catalogue content
+urlpatterns += [
+    path('bulk/<str:kind>/', views.BulkCatalogueAPIView.as_view(), name='bulk'),
+]
+
 # blog posts
 urlpatterns += [
     path('blogs/', views.BlogsListAPI.as_view(), name='blogs'),
+    path('blogs/<int:blog_id>/', views.BlogDetailAPI.as_view(), name='blog'),
+    path('blogs/<int:blog_id>/stats/', views.BlogStatsAPI.as_view(), name='blog-stats'),
     path('readblog/', views.ViewBlogAPI.as_view(), name='readblog'),
 ]
 
 # notifications
 urlpatterns += [
     path('notifications/', views.NotificationsListAPI.as_view(), name='notifications'),
+    path('inbox/', views.InboxAPIView.as_view(), name='inbox'),
+    path('inbox/unread/', views.InboxUnreadAPIView.as_view(), name='inbox-unread'),
 ]
 
 # chats, friend requests
@@ -64,4 +85,9 @@ urlpatterns += [
     path('rejectfriendrequest/', views.RejectFriendRequestAPIView.as_view(), name='rejectfriendrequest'),
     path('blockuser/', views.BlockUserAPIView.as_view(), name='blockuser'),
     path('reportuser/', views.ReportUserAPIView.as_view(), name='reportuser'),
-]
\ No newline at end of file
+]
+# search
+urlpatterns += [
+    path('search/', views.SearchAPIView.as_view(), name='search'),
+    path('nearby/', views.NearbyAPIView.as_view(), name='nearby'),
+]
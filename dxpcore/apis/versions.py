@@ -0,0 +1,63 @@
+'''
+Per-model content versions.
+
+Every save or delete of a tracked model stamps a new version (the commit
+time) in the cache. Views use it as a cheap validator for conditional GETs
+without touching the table. A version missing from the cache (evicted,
+cold start) is re-stamped with the current time, which only ever makes
+clients refetch once; it can never produce a false "not modified".
+
+The post_save / post_delete receivers in apis.models bump Hotel, Political,
+TouristSite and Blog. Any other write that changes what their responses
+show must call bump_model_version() itself once it commits, or clients
+keep getting 304s for the old content:
+
+- QuerySet.update(), bulk_create(), bulk_update() and raw SQL on those
+  tables (apis.bulk imports, manage.py geocodesites, the blog view flush
+  in apis.blog_views that updates Blog.view_count);
+- data kept in other tables that the serializers embed, such as the image
+  variants written by the image worker (apis.images).
+
+The versions must live in a cache shared by every process that serves or
+writes (Redis in production). The development LocMemCache is per process,
+so run a single process there or a write in one process is not seen by
+another process, which keeps answering 304.
+'''
+
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+VERSION_TIMEOUT = None  # never expire on purpose
+
+
+def version_key(model):
+    return f'content_version:{model._meta.label_lower}'
+
+
+def model_version(model) -> float:
+    '''Returns the unix time at which model's content last changed'''
+    now = time.time()
+    cache.add(version_key(model), now, VERSION_TIMEOUT)
+    return cache.get(version_key(model), now)
+
+
+def model_versions(*models) -> list:
+    '''Returns the versions of several models with a single cache round-trip'''
+    keys = [version_key(model) for model in models]
+    found = cache.get_many(keys)
+    missing = [model for model, key in zip(models, keys) if key not in found]
+    for model in missing:
+        found[version_key(model)] = model_version(model)
+    return [found[key] for key in keys]
+
+
+def bump_model_version(model) -> None:
+    '''Marks model's content as changed now'''
+    cache.set(version_key(model), time.time(), VERSION_TIMEOUT)
+
+
+def last_modified(*models) -> datetime:
+    '''Latest change time across models, as an aware datetime'''
+    return datetime.fromtimestamp(max(model_versions(*models)), tz=timezone.utc)
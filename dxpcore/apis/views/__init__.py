@@ -4,4 +4,9 @@ from .hotels import *
 from .political import *
 from .tourism import *
 from .blogs import *
-from .notifications import *
\ No newline at end of file
+from .notifications import *
+from .search import *
+from .nearby import *
+from .bulk import *
+from .sync import *
+from .uploads import *
\ No newline at end of file
@@ -7,12 +7,18 @@ from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.db.models import Q
+from django.db.models.functions import Lower
 
 from accounts.models import OTP, User
+from apis import inbox
+from apis.mixins import ConditionalGetMixin
 from apis.models import ChatRoom, FriendRequest
+from apis.pagination import COUNT_CAP, InvalidCursor, KeysetPaginator, capped_count, prefix_filter
 from apis.serializers import (ChangePasswordSerializer, CreateUserSerializer, LoginSerializer, RegisterUserSerializer, ResetPasswordSerializer,
-                              UserSerializer)
-from notifications.utils import send_push_notification
+                              UserListSerializer, UserSerializer)
+from apis.suggestions import suggest_people
+from dxpcore.utils.constants import InboxEventKind
+from notifications.utils import queue_push_notification
 
 
 class LoginAPI(APIView):
@@ -87,7 +93,8 @@ class LogoutAPIView(APIView):
 
     def post(self, request, *args, **kwargs):
         '''Logout user'''
-        request.user.auth_token.delete()
+        # knox: the AuthToken this request was authenticated with
+        request.auth.delete()
         return Response({
             "status": "success",
             "message": "User logged out successfully",
@@ -99,10 +106,51 @@ class UsersListAPIView(APIView):
     permission_classes = (permissions.IsAdminUser,)
     serializer_class = UserSerializer
 
+    paginator = KeysetPaginator(ordering=('name', 'id'), page_size=50, max_page_size=200)
+    # query param -> model field for the boolean filters
+    boolean_filters = {
+        'is_staff': 'is_staff',
+        'is_active': 'is_active',
+        'verified': 'email_verified',
+    }
+
     def get(self, request, *args, **kwargs):
-        '''List all users. To be used by admins only'''
-        users = User.objects.filter(deleted=False).order_by('name')
-        return Response(self.serializer_class(users, many=True).data)
+        '''
+        List users a page at a time. To be used by admins only.
+        Query params: cursor, page_size, search (name/email/phone prefix),
+        is_staff, is_active, verified (true/false).
+        '''
+        users = User.objects.filter(deleted=False)
+
+        search = request.query_params.get('search', '').strip()
+        if search:
+            users = users.annotate(name_lower=Lower('name'), email_lower=Lower('email')).filter(
+                prefix_filter('name_lower', search.lower())
+                | prefix_filter('email_lower', search.lower())
+                | prefix_filter('phone', search)
+            )
+
+        for param, field in self.boolean_filters.items():
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            if value.lower() not in ('true', 'false', '1', '0'):
+                return Response({'message': f'{param} must be true or false'}, status=status.HTTP_400_BAD_REQUEST)
+            users = users.filter(**{field: value.lower() in ('true', '1')})
+
+        try:
+            page, next_cursor = self.paginator.paginate(request, users)
+        except InvalidCursor:
+            return Response({'message': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # exact up to COUNT_CAP; at the cap it only means "at least this many"
+        count = capped_count(users, COUNT_CAP)
+        return Response({
+            'count': count,
+            'count_is_exact': count < COUNT_CAP,
+            'next': next_cursor,
+            'results': UserListSerializer(page, many=True).data,
+        })
     
     def post(self, request, *args, **kwargs):
         '''Create a new user. To be used by admins only'''
@@ -157,13 +205,24 @@ class UsersListAPIView(APIView):
         culprit.save()
         return Response({'message': 'User deleted successfully'})
     
-class UserProfileAPIView(APIView):
+class UserProfileAPIView(ConditionalGetMixin, APIView):
     '''Get user profile'''
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = UserSerializer
+    cache_control = 'private, max-age=0, must-revalidate'
+
+    def get_last_modified(self, request):
+        return request.user.updated_at
+
+    def get_etag_parts(self, request):
+        # last_login is saved on its own and does not bump updated_at
+        return [request.user.id, request.user.last_login]
 
     def get(self, request, *args, **kwargs):
         '''Get user profile for the logged in user'''
+        not_modified = self.not_modified(request)
+        if not_modified:
+            return not_modified
         user = request.user
         return Response(self.serializer_class(user).data)
     
@@ -315,13 +374,24 @@ class ResetPasswordAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
-class UserPreferenceAPIView(APIView):
+class UserPreferenceAPIView(ConditionalGetMixin, APIView):
     '''API endpoint to get and update a user's preferences'''
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = UserSerializer
+    cache_control = 'private, max-age=0, must-revalidate'
+
+    def get_last_modified(self, request):
+        return request.user.updated_at
+
+    def get_etag_parts(self, request):
+        # last_login is saved on its own and does not bump updated_at
+        return [request.user.id, request.user.last_login]
 
     def get(self, request, *args, **kwargs):
         '''Get user preferences for the logged in user'''
+        not_modified = self.not_modified(request)
+        if not_modified:
+            return not_modified
         user = request.user
         return Response(self.serializer_class(user).data)
 
@@ -344,11 +414,11 @@ class FriendRequestsAPIView(APIView):
         friend_requests = FriendRequest.objects.filter(
             Q(sender=user) | Q(receiver=user), accepted=False
             
-        ).order_by('-created_at')
+        ).select_related('sender', 'receiver').order_by('-created_at')
         return Response({
             'friend_requests': [{
                 'id': fr.id,
-                'status': 'sent' if fr.sender == user else 'received',
+                'status': 'sent' if fr.sender_id == user.id else 'received',
                 'sender_id': fr.sender.id,
                 'sender_name': fr.sender.name,
                 'receiver_name': fr.receiver.name,
@@ -381,9 +451,13 @@ class SendFriendRequestAPIView(APIView):
             return Response({'message': 'Friend request already sent'}, status=status.HTTP_200_OK)
         
         # Create a new friend request
-        FriendRequest.objects.create(sender=sender, receiver=receiver)
+        friend_request = FriendRequest.objects.create(sender=sender, receiver=receiver)
         # send push notification to the receiver
-        send_push_notification(receiver, "New Friend Request", f"You have received a friend request from {sender.name}")
+        queue_push_notification(receiver, "New Friend Request", f"You have received a friend request from {sender.name}")
+        inbox.add_event(
+            receiver, InboxEventKind.FRIEND_REQUEST, "New Friend Request", f"You have received a friend request from {sender.name}",
+            request_id=friend_request.id, user_id=sender.id,
+        )
         return Response({'message': 'Friend request sent successfully'}, status=status.HTTP_201_CREATED)
     
 class AcceptFriendRequestAPIView(APIView):
@@ -412,7 +486,11 @@ class AcceptFriendRequestAPIView(APIView):
         room[0].save()
         friend_request.save()
         # send push notification to the sender
-        send_push_notification(friend_request.sender, "Friend Request Accepted", f"{user.name} has accepted your friend request")
+        queue_push_notification(friend_request.sender, "Friend Request Accepted", f"{user.name} has accepted your friend request")
+        inbox.add_event(
+            friend_request.sender, InboxEventKind.FRIEND_ACCEPTED, "Friend Request Accepted", f"{user.name} has accepted your friend request",
+            request_id=friend_request.id, user_id=user.id, room_id=room[0].room_id,
+        )
         return Response({'message': 'Friend request accepted successfully'}, status=status.HTTP_200_OK)
     
 class RejectFriendRequestAPIView(APIView):
@@ -439,16 +517,16 @@ class PeopleListAPIView(APIView):
 
     def get(self, request, *args, **kwargs):
         user = request.user
-        people = User.objects.filter(deleted=False).exclude(id=user.id).exclude(is_staff=True).order_by('?')[:50]
-        user_requests = FriendRequest.objects.filter(sender=user).values_list('receiver', flat=True)
+        people = suggest_people(user, limit=50)
         return Response({
             'people': [{
                 'id': p.id,
                 'name': p.name,
                 'avatar': p.avatar.url if p.avatar else '',
                 'email': p.email,
-                'phone': p.phone
-            } for p in people if p.id not in user_requests],
+                'phone': p.phone,
+                'mutual_friends': getattr(p, 'mutual_friends', 0),
+            } for p in people],
         }, status=status.HTTP_200_OK)
     
 
@@ -1,27 +1,70 @@
+from datetime import timedelta
+
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from apis.models import Blog
-from apis.serializers import BlogSerializer, BlogViewSerializer
+from apis import stats
+from apis.blog_views import record_view
+from apis.feed import FEEDS, MAX_PAGE_SIZE, PAGE_SIZE, feed_page, fetch_in_order, random_sample, trending_ranking
+from apis.mixins import ConditionalGetMixin
+from apis.models import Blog, BlogViewDaily
+from apis.pagination import wants_legacy_list
+from apis.serializers import BlogSerializer, BlogSummarySerializer, BlogViewSerializer
+from dxpcore.utils.hll import HyperLogLog
 
 
-class BlogsListAPI(APIView):
+class BlogsListAPI(ConditionalGetMixin, APIView):
     '''Blog List API endpoint'''
     permission_classes = (permissions.AllowAny,)
+    versioned_models = (Blog,)
+    # staff and readers get different lists from the same URL
+    cache_control = 'private, max-age=0, must-revalidate'
+
+    def get_etag_parts(self, request):
+        user = request.user
+        parts = [user.is_authenticated and (user.is_staff or user.is_superuser)]
+        if request.query_params.get('feed') == 'trending':
+            # the ranking also moves with views, not only with blog changes
+            parts.append(trending_ranking()[0])
+        return parts
 
     def get(self, request, *args, **kwargs):
-        '''Get all/random blogs. Everyone can view the blogs'''
+        '''
+        Get all/random blogs. Everyone can view the blogs.
+        Readers get a feed of summaries (excerpt, no content; the full blog
+        is at blogs/<id>/). Query params: feed (random or
+        trending), seed (random feed, returned with the first page), cursor,
+        page_size. Without any of them, 20 random blogs in full (older apps).
+        '''
+        not_modified = self.not_modified(request)
+        if not_modified:
+            return not_modified
         user = request.user
         # check if user is authenticated and is staff or superuser
         if user.is_authenticated and (user.is_staff or user.is_superuser):
             # staff users can view all blogs.
-            blogs = Blog.objects.all().order_by('-created_at')
-        else:
-            # fetch 20 random blogs for non-staff users.
-            blogs = Blog.objects.filter(is_published=True).order_by('?')[:20]
-        serializer = BlogSerializer(blogs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            blogs = Blog.objects.select_related('writer').order_by('-created_at')
+            serializer = BlogSerializer(blogs, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        feed = request.query_params.get('feed')
+        if feed is None and wants_legacy_list(request):
+            # 20 random blogs for non-staff users.
+            serializer = BlogSerializer(fetch_in_order(random_sample(20)), many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        if feed not in (None, *FEEDS):
+            return Response({'message': f"feed must be one of {', '.join(FEEDS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            seed = int(request.query_params['seed']) if 'seed' in request.query_params else None
+            page_size = max(1, min(int(request.query_params.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE))
+            blogs, next_cursor, seed = feed_page(feed or 'random', request.query_params.get('cursor'), seed, page_size)
+        except ValueError:
+            return Response({'message': 'Invalid seed, cursor or page_size'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'next': next_cursor,
+            'seed': seed,
+            'results': BlogSummarySerializer(blogs, many=True).data,
+        }, status=status.HTTP_200_OK)
 
     def post(self, request, *args, **kwargs):
         '''Create a new blog. Only staff users can create a blog'''
@@ -37,7 +80,7 @@ class BlogsListAPI(APIView):
         blog = None
         # if blog_id is present, update it. else create a new blog.
         if blog_id:
-            blog = Blog.objects.filter(id=blog_id).first()
+            blog = Blog.objects.filter(id=blog_id).select_related('writer').first()
             if blog:
                 serializer = BlogSerializer(blog, data=request.data, partial=True)
         if serializer.is_valid():
@@ -63,6 +106,75 @@ class BlogsListAPI(APIView):
         return Response({'message': 'Blog not found'}, status=status.HTTP_404_NOT_FOUND)
     
 
+class BlogDetailAPI(ConditionalGetMixin, APIView):
+    '''Blog Detail API endpoint'''
+    permission_classes = (permissions.AllowAny,)
+
+    def get_last_modified(self, request):
+        return self.state['updated_at']
+
+    def get_etag_parts(self, request):
+        # view_count moves without touching updated_at
+        return [self.state['view_count'], self.state['is_published']]
+
+    def get(self, request, blog_id, *args, **kwargs):
+        '''
+        Get one blog in full. Everyone can view published blogs, staff
+        also unpublished ones. Revalidate with If-None-Match or
+        If-Modified-Since to skip the content when it has not changed.
+        '''
+        user = request.user
+        is_staff = user.is_authenticated and (user.is_staff or user.is_superuser)
+        blogs = Blog.objects.all() if is_staff else Blog.objects.filter(is_published=True)
+        self.state = blogs.filter(id=blog_id).values('updated_at', 'view_count', 'is_published').first()
+        if self.state is None:
+            return Response({'message': 'Blog not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not self.state['is_published']:
+            self.cache_control = 'private, max-age=0, must-revalidate'
+        not_modified = self.not_modified(request)
+        if not_modified:
+            return not_modified
+        blog = Blog.objects.select_related('writer').get(id=blog_id)
+        return Response(BlogSerializer(blog).data, status=status.HTTP_200_OK)
+
+
+class BlogStatsAPI(APIView):
+    '''Blog Stats API endpoint'''
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, blog_id, *args, **kwargs):
+        '''
+        Views and estimated distinct readers of one blog per day and over
+        the range. Query params: start, end (YYYY-MM-DD, the last 28 days by
+        default) and tz; the days reported are the UTC days they overlap.
+        '''
+        try:
+            start, end, tz = stats.parse_range(request.query_params)
+        except ValueError as error:
+            return Response({'message': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        blog = Blog.objects.filter(id=blog_id).only('id', 'view_count').first()
+        if not blog:
+            return Response({'message': 'Blog not found'}, status=status.HTTP_404_NOT_FOUND)
+        first, last = stats.utc_days(start, end, tz)
+        views = dict(BlogViewDaily.objects.filter(blog=blog, day__range=(first, last)).values_list('day', 'views'))
+        readers, total = {}, HyperLogLog()
+        for day, sketch in stats.reader_sketches(first, last, blog.id):
+            readers[day] = sketch.count()
+            total.merge(sketch)
+        days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+        return Response({
+            'blog': blog.id,
+            'total_views': blog.view_count,
+            'views': sum(views.values()),
+            'unique_readers': total.count(),
+            'days': [
+                {'date': day.isoformat(), 'views': views.get(day, 0), 'unique_readers': readers.get(day, 0)}
+                for day in days
+            ],
+            'range': {'start': first.isoformat(), 'end': last.isoformat(), 'tz': 'UTC'},
+        }, status=status.HTTP_200_OK)
+
+
 class ViewBlogAPI(APIView):
     '''View Blog API endpoint'''
     permission_classes = (permissions.IsAuthenticated,)
@@ -71,9 +183,11 @@ class ViewBlogAPI(APIView):
         '''View a blog by id. Everyone can view the blogs'''
         serializer = BlogViewSerializer(data=request.data)
         if serializer.is_valid():
-            if request.user.is_authenticated:
-                serializer.save(user=request.user, ip_address=request.META.get('REMOTE_ADDR'))
-            else:
-                serializer.save(ip_address=request.META.get('REMOTE_ADDR'))
+            # buffered, written in bulk by `manage.py flushblogviews`
+            record_view(
+                serializer.validated_data['blog'].id,
+                request.user.id if request.user.is_authenticated else None,
+                request.META.get('REMOTE_ADDR'),
+            )
             return Response({'message': 'Blog viewed successfully'}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,46 @@
+from django.http import StreamingHttpResponse
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apis.bulk import CATALOGUE, FORMATS, ImportFormatError, decode_lines, export_lines, import_rows, read_rows
+
+
+class BulkCatalogueAPIView(APIView):
+    '''Bulk import and export of hotels, tourist sites and political sites. Staff only'''
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get_format(self, request):
+        # `format` is taken by DRF's renderer override
+        format_name = request.query_params.get('file_format')
+        if not format_name:
+            content_type = request.content_type.split(';')[0].strip()
+            format_name = {value: key for key, value in FORMATS.items()}.get(content_type, 'csv')
+        return format_name
+
+    def get(self, request, kind, *args, **kwargs):
+        '''Export every row of kind. Query params: file_format (csv or ndjson)'''
+        format_name = self.get_format(request)
+        if kind not in CATALOGUE or format_name not in FORMATS:
+            return Response({'message': 'Unknown kind or file format'}, status=status.HTTP_404_NOT_FOUND)
+        response = StreamingHttpResponse(export_lines(kind, format_name), content_type=FORMATS[format_name])
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{format_name}"'
+        return response
+
+    def post(self, request, kind, *args, **kwargs):
+        '''
+        Create or update rows of kind from the request body (CSV with a header
+        row, or NDJSON). Rows with an id update that object, rows without one
+        are created. The body is read as a stream and saved in chunks.
+        Query params: file_format (defaults from the Content-Type)
+        '''
+        format_name = self.get_format(request)
+        if kind not in CATALOGUE or format_name not in FORMATS:
+            return Response({'message': 'Unknown kind or file format'}, status=status.HTTP_404_NOT_FOUND)
+        # iterate the underlying request so the body is never loaded whole
+        lines = decode_lines(iter(request._request.readline, b''))
+        try:
+            report = import_rows(kind, read_rows(lines, format_name))
+        except (ImportFormatError, UnicodeDecodeError) as error:
+            return Response({'message': f'Could not read the upload: {error}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
@@ -1,11 +1,14 @@
 import random
+
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from accounts.models import User
-from apis.models import Blog, BlogView, Hotel, Political, TouristSite
+from apis import response_cache, stats
+from apis.mixins import ResponseCacheMixin
+from apis.models import Blog, Hotel, TouristSite
 from apis.serializers import BlogSerializer, HotelSerializer, TouristSiteSerialiser
+from dxpcore.utils.constants import BlogCategory
 
 
 class PingAPI(APIView):
@@ -15,16 +18,20 @@ class PingAPI(APIView):
         return Response({'message': 'pong'}, status=status.HTTP_200_OK)
     
 
-class DashboardDataAPI(APIView):
+class DashboardDataAPI(ResponseCacheMixin, APIView):
     '''This view is used to get the dashboard data'''
 
     permission_classes = (permissions.AllowAny,)
+    versioned_models = (Hotel, TouristSite)
 
     def get(self, request):
         '''
         This method is used to get the dashboard data
         for the mobile app dashboard
         '''
+        cached = self.cached_response(request)
+        if cached:
+            return cached
         hotels = Hotel.objects.all().order_by('-created_at')[:5]
         # suggested blogs
         blogs = Blog.objects.all().order_by('-created_at')[:5]
@@ -38,6 +45,21 @@ class DashboardDataAPI(APIView):
         return Response(data, status=status.HTTP_200_OK)
 
 
+class ResponseCacheStatsAPI(APIView):
+    '''This view exports the hit and miss counts of the response cache'''
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        '''Hit, miss, stale and wait counts and the hit ratio per cached view'''
+        return Response(response_cache.stats(), status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        '''Resets the counters'''
+        response_cache.reset_stats()
+        return Response({'message': 'Cache statistics reset'}, status=status.HTTP_200_OK)
+
+
 class WebDashboardDataAPI(APIView):
     '''This view is used to get the dashboard data for the web dashboard'''
 
@@ -46,26 +68,23 @@ class WebDashboardDataAPI(APIView):
     def get(self, request):
         '''
         This method is used to get the dashboard data
-        for the web dashboard
+        for the web dashboard, read from the precomputed stats (apis.stats).
+        The view charts cover the days from start to end (YYYY-MM-DD,
+        inclusive; the last 28 days by default) in the tz time zone
+        (IANA name; settings.TIME_ZONE by default)
         '''
+        try:
+            start, end, tz = stats.parse_range(request.query_params)
+        except ValueError as error:
+            return Response({'message': str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # blogs count
-        blogs_count = Blog.objects.count()
-        # hotels count
-        hotels_count = Hotel.objects.count()
-        # tourist sites count
-        tourist_sites_count = TouristSite.objects.count()
-        # political sites count
-        political_sites_count = Political.objects.count()
-
-        # blogs by category
-        blogs_by_category = {}
-        blogs = Blog.objects.all()
-        for blog in blogs:
-            category = blog.category
-            if category not in blogs_by_category:
-                blogs_by_category[category] = []
-            blogs_by_category[category].append(blog)
+        values = stats.counters()
+        per_day = stats.views_per_day(start, end, tz)
+
+        # blogs by category, in the order of BlogCategory
+        per_category = stats.blogs_per_category(values)
+        order = [category.value for category in BlogCategory]
+        categories = sorted(per_category, key=lambda c: (order.index(c) if c in order else len(order), c))
 
         # roybgiv colors
         colors = ['#FF0000', '#FF7F00', '#FFFF00', '#00FF00', '#0000FF', '#4B0082', '#9400D3']
@@ -74,18 +93,22 @@ class WebDashboardDataAPI(APIView):
         blogs_by_category_list = [
             {
                 'category': category,
-                'value': len(blogs),
+                'value': per_category[category],
                 'color': colors[i % len(colors)]
             }
-            for i, (category, blogs) in enumerate(blogs_by_category.items())
+            for i, category in enumerate(categories)
         ]
 
+        views_per_weekday = {}
+        for day, views in per_day:
+            views_per_weekday[day.isoweekday()] = views_per_weekday.get(day.isoweekday(), 0) + views
+        total_views = sum(views_per_weekday.values())
         views_by_day = [
                 {
                     'day': days[i - 1],
-                    'percentage': BlogView.objects.filter(created_at__week_day=i-1).count() / BlogView.objects.count() * 100 if BlogView.objects.count() > 0 else 0,
-                    'status': 'Has Views' if BlogView.objects.filter(created_at__week_day=i-1).count() > 0 else 'No Views',
-                    'views': BlogView.objects.filter(created_at__week_day=i-1).count()
+                    'percentage': views_per_weekday.get(i, 0) / total_views * 100 if total_views > 0 else 0,
+                    'status': 'Has Views' if views_per_weekday.get(i, 0) > 0 else 'No Views',
+                    'views': views_per_weekday.get(i, 0)
                 }
                 for i in range(1, 8)
             ]
@@ -109,12 +132,12 @@ class WebDashboardDataAPI(APIView):
 
         data = {
             # top cards
-            'content_upload': blogs_count + hotels_count + tourist_sites_count + political_sites_count,
-            'blog_posts': Blog.objects.count(),
-            'views': BlogView.objects.count(),
-            'users': User.objects.count(),
+            'content_upload': sum(values[name] for name in ('blogs', 'hotels', 'tourist_sites', 'political_sites')),
+            'blog_posts': values['blogs'],
+            'views': values[stats.VIEWS_COUNTER],
+            'users': values['users'],
 
-            # blog views by days [mon, tue, wed, thu, fri, sat, sun]
+            # blog views by days [mon, tue, wed, thu, fri, sat, sun] over the range
             'views_by_day': views_by_day,
 
             'min_max_views': min_max_views,
@@ -123,5 +146,11 @@ class WebDashboardDataAPI(APIView):
             # blogs by category
             'blogs_by_category': blogs_by_category_list,
 
+            # blog views per local day over the range
+            'views_over_time': [{'date': day.isoformat(), 'views': views} for day, views in per_day],
+            'range': {'start': start.isoformat(), 'end': end.isoformat(), 'tz': tz.key},
+            # estimated distinct readers of all blogs over the range
+            'unique_readers': stats.unique_readers(*stats.utc_days(start, end, tz)),
+
         }
         return Response(data, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -2,19 +2,35 @@ from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apis.mixins import ConditionalGetMixin, ResponseCacheMixin
 from apis.models import Hotel
+from apis.pagination import KeysetPaginator, paginated_response, wants_legacy_list
 from apis.serializers import HotelSerializer
 
 
-class HotelListAPI(APIView):
+class HotelListAPI(ResponseCacheMixin, ConditionalGetMixin, APIView):
     '''Hotel List API endpoint'''
     permission_classes = (permissions.AllowAny,)
 
+    versioned_models = (Hotel,)
+    paginator = KeysetPaginator(ordering=('-created_at', 'id'), page_size=20, max_page_size=100)
+
     def get(self, request, *args, **kwargs):
-        '''Get all hotels. Everyone can view the hotels'''
-        hotels = Hotel.objects.all().order_by('-created_at', 'name')
-        serializer = HotelSerializer(hotels, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        '''Get all hotels. Everyone can view the hotels. Query params: cursor, page_size, category'''
+        not_modified = self.not_modified(request)
+        if not_modified:
+            return not_modified
+        cached = self.cached_response(request)
+        if cached:
+            return cached
+        hotels = Hotel.objects.all()
+        category = request.query_params.get('category')
+        if category:
+            hotels = hotels.filter(category=category)
+        if wants_legacy_list(request):
+            serializer = HotelSerializer(hotels.order_by('-created_at', 'name'), many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginated_response(self.paginator, request, hotels, HotelSerializer)
 
     def post(self, request, *args, **kwargs):
         '''Create a new hotel. Only staff can create a hotel'''
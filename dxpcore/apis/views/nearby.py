@@ -0,0 +1,72 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apis.nearby import LOCATED_KINDS, bbox_candidates, nearest, radius_candidates
+from apis.serializers import HotelSerializer, PoliticalSerializer, TouristSiteSerialiser
+
+
+class NearbyAPIView(APIView):
+    '''Hotels, tourist sites and political sites near a point or inside a map viewport'''
+    permission_classes = (permissions.AllowAny,)
+
+    serializers = {
+        'hotel': HotelSerializer,
+        'tourist_site': TouristSiteSerialiser,
+        'political': PoliticalSerializer,
+    }
+    default_radius_km = 5.0
+    max_radius_km = 200.0
+    default_limit = 50
+    max_limit = 200
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Nearest first. Query params: either lat, lon and radius (km), or
+        bbox=min_lat,min_lon,max_lat,max_lon; plus kind (repeatable or comma
+        separated: hotel, tourist_site, political) and limit
+        '''
+        kinds = [kind for value in request.query_params.getlist('kind') for kind in value.split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in LOCATED_KINDS]
+        if unknown:
+            return Response({'message': f"Unknown kind: {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+        kinds = kinds or list(LOCATED_KINDS)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.default_limit)), self.max_limit))
+            bbox = request.query_params.get('bbox')
+            if bbox:
+                min_lat, min_lon, max_lat, max_lon = (float(value) for value in bbox.split(','))
+                if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+                    raise ValueError
+                candidates = {
+                    kind: bbox_candidates(LOCATED_KINDS[kind], min_lat, min_lon, max_lat, max_lon) for kind in kinds
+                }
+            else:
+                latitude = float(request.query_params['lat'])
+                longitude = float(request.query_params['lon'])
+                radius = float(request.query_params.get('radius', self.default_radius_km))
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius <= self.max_radius_km):
+                    raise ValueError
+                candidates = {
+                    kind: radius_candidates(LOCATED_KINDS[kind], latitude, longitude, radius) for kind in kinds
+                }
+        except (KeyError, ValueError):
+            return Response(
+                {'message': f'Provide lat, lon and radius (at most {self.max_radius_km:g} km), or bbox=min_lat,min_lon,max_lat,max_lon'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        found = nearest(candidates, limit)
+        # serialize each kind as one list so image variants resolve in one query per kind
+        serialized = {}
+        for kind in kinds:
+            objects = [obj for obj_kind, obj, _distance in found if obj_kind == kind]
+            for data in self.serializers[kind](objects, many=True).data:
+                serialized[kind, data['id']] = data
+        results = []
+        for kind, obj, distance in found:
+            data = serialized[kind, obj.id]
+            data['kind'] = kind
+            data['distance_km'] = distance
+            results.append(data)
+        return Response({'results': results}, status=status.HTTP_200_OK)
@@ -1,8 +1,12 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apis import inbox
 from apis.models import Notification
+from apis.pagination import InvalidCursor
 from apis.serializers import NotificationSerializer
 
 
@@ -57,4 +61,50 @@ class NotificationsListAPI(APIView):
         if notification:
             notification.delete()
             return Response({'message': 'Notification deleted successfully'}, status=status.HTTP_200_OK)
-        return Response({'message': 'Notification not found'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        return Response({'message': 'Notification not found'}, status=status.HTTP_404_NOT_FOUND)
+
+
+class InboxAPIView(APIView):
+    '''The user's notification inbox: broadcasts and personal events, newest first'''
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        '''One page of the inbox with the unread count, {"unread", "read_until", "next", "results"}'''
+        user = request.user
+        watermark = inbox.read_until(user)
+        try:
+            entries, next_cursor = inbox.page(
+                user, request.query_params.get('cursor'), inbox.paginator.get_page_size(request), watermark,
+            )
+        except InvalidCursor:
+            return Response({'message': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'unread': inbox.unread_count(user, watermark),
+            'read_until': watermark,
+            'next': next_cursor,
+            'results': entries,
+        }, status=status.HTTP_200_OK)
+
+    def post(self, request, *args, **kwargs):
+        '''Mark the inbox read up to `until` (the created_at of an entry), or entirely'''
+        until = request.data.get('until')
+        if until:
+            until = parse_datetime(str(until))
+            if until is None:
+                return Response({'message': 'until must be an ISO 8601 date and time'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(until):
+                until = timezone.make_aware(until)
+        watermark = inbox.mark_read(request.user, until)
+        return Response({
+            'unread': inbox.unread_count(request.user, watermark),
+            'read_until': watermark,
+        }, status=status.HTTP_200_OK)
+
+
+class InboxUnreadAPIView(APIView):
+    '''Unread count of the user's inbox, for badges'''
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        '''Get the unread count, capped at inbox.MAX_UNREAD'''
+        return Response({'unread': inbox.unread_count(request.user)}, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -2,19 +2,35 @@ from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apis.mixins import ConditionalGetMixin, ResponseCacheMixin
 from apis.models import Political
+from apis.pagination import KeysetPaginator, paginated_response, wants_legacy_list
 from apis.serializers import PoliticalSerializer
 
 
-class PoliticalListAPI(APIView):
+class PoliticalListAPI(ResponseCacheMixin, ConditionalGetMixin, APIView):
     '''Political List API endpoint'''
     permission_classes = (permissions.AllowAny,)
 
+    versioned_models = (Political,)
+    paginator = KeysetPaginator(ordering=('-created_at', 'id'), page_size=20, max_page_size=100)
+
     def get(self, request, *args, **kwargs):
-        '''Get all political. Everyone can view the political'''
-        political = Political.objects.all().order_by('-created_at', 'name')
-        serializer = PoliticalSerializer(political, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        '''Get all political. Everyone can view the political. Query params: cursor, page_size, category'''
+        not_modified = self.not_modified(request)
+        if not_modified:
+            return not_modified
+        cached = self.cached_response(request)
+        if cached:
+            return cached
+        political = Political.objects.all()
+        category = request.query_params.get('category')
+        if category:
+            political = political.filter(category=category)
+        if wants_legacy_list(request):
+            serializer = PoliticalSerializer(political.order_by('-created_at', 'name'), many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginated_response(self.paginator, request, political, PoliticalSerializer)
 
     def post(self, request, *args, **kwargs):
         '''Create a new Political. Only staff can create a site'''
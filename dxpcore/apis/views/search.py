@@ -0,0 +1,64 @@
+from django.core.files.storage import default_storage
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apis.images import thumbnail_url, variant_map
+from apis.search import KINDS, search as run_search
+
+
+class SearchAPIView(APIView):
+    '''Full-text search over hotels, tourist sites, political sites and blogs'''
+    permission_classes = (permissions.AllowAny,)
+
+    page_size = 20
+    max_page_size = 50
+    image_fields = {'hotel': 'image', 'tourist_site': 'image', 'political': 'image', 'blog': 'feature_image'}
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Search everything. Query params: q (words are prefix-matched),
+        kind (repeatable or comma separated: hotel, tourist_site, political, blog),
+        category, page, page_size
+        '''
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'message': 'Search query (q) is required'}, status=status.HTTP_400_BAD_REQUEST)
+        kinds = [kind for value in request.query_params.getlist('kind') for kind in value.split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in KINDS]
+        if unknown:
+            return Response({'message': f"Unknown kind: {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+            page_size = max(1, min(int(request.query_params.get('page_size', self.page_size)), self.max_page_size))
+        except ValueError:
+            return Response({'message': 'page and page_size must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results, facets, total = run_search(
+            query, kinds=kinds or None, category=request.query_params.get('category'),
+            limit=page_size, offset=(page - 1) * page_size,
+        )
+        self.attach_images(results)
+        return Response({
+            'count': total,
+            'page': page,
+            'facets': facets,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+    def attach_images(self, results):
+        '''Adds image and thumbnail URLs to the results, one query per kind'''
+        ids_by_kind = {}
+        for result in results:
+            ids_by_kind.setdefault(result['kind'], []).append(result['id'])
+        images = {}
+        for kind, ids in ids_by_kind.items():
+            model = KINDS[kind][0]
+            field = self.image_fields[kind]
+            for object_id, name in model.objects.filter(id__in=ids).values_list('id', field):
+                images[kind, object_id] = name
+        variants = variant_map(images.values())
+        for result in results:
+            name = images.get((result['kind'], result['id']))
+            result['image'] = default_storage.url(name) if name else ''
+            result['thumbnail'] = thumbnail_url(variants, name) if name else ''
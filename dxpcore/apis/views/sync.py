@@ -0,0 +1,32 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apis.pagination import InvalidCursor
+from apis.sync import COLLECTIONS, changes, snapshot_manifest
+
+
+class SyncAPIView(APIView):
+    '''Delta sync of hotels, tourist sites, political sites and blogs for offline clients'''
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request, *args, **kwargs):
+        '''
+        Changes since the client's marks. Query params: one per collection
+        (hotels, tourists, political, blogs) holding the mark returned by the
+        previous sync, empty to start from scratch; collections not named are
+        skipped (none named means all, from scratch).
+        Returns per collection {changed, deleted, mark, has_more, reset} and
+        the current full snapshot, which first-time clients should download
+        instead of paging from an empty mark, continuing from its marks.
+        '''
+        requested = [collection for collection in COLLECTIONS if collection in request.query_params]
+        if not requested:
+            requested = list(COLLECTIONS)
+        result = {}
+        for collection in requested:
+            try:
+                result[collection] = changes(collection, request.query_params.get(collection, ''))
+            except InvalidCursor:
+                return Response({'message': f'Invalid mark for {collection}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'collections': result, 'snapshot': snapshot_manifest()}, status=status.HTTP_200_OK)
@@ -2,19 +2,35 @@ from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apis.mixins import ConditionalGetMixin, ResponseCacheMixin
 from apis.models import TouristSite
+from apis.pagination import KeysetPaginator, paginated_response, wants_legacy_list
 from apis.serializers import TouristSiteSerialiser
 
 
-class TouristSiteListAPI(APIView):
+class TouristSiteListAPI(ResponseCacheMixin, ConditionalGetMixin, APIView):
     '''TouristSite List API endpoint'''
     permission_classes = (permissions.AllowAny,)
 
+    versioned_models = (TouristSite,)
+    paginator = KeysetPaginator(ordering=('-created_at', 'id'), page_size=20, max_page_size=100)
+
     def get(self, request, *args, **kwargs):
-        '''Get all sites. Everyone can view the sites'''
-        sites = TouristSite.objects.all().order_by('-created_at', 'name')
-        serializer = TouristSiteSerialiser(sites, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        '''Get all sites. Everyone can view the sites. Query params: cursor, page_size, category'''
+        not_modified = self.not_modified(request)
+        if not_modified:
+            return not_modified
+        cached = self.cached_response(request)
+        if cached:
+            return cached
+        sites = TouristSite.objects.all()
+        category = request.query_params.get('category')
+        if category:
+            sites = sites.filter(category=category)
+        if wants_legacy_list(request):
+            serializer = TouristSiteSerialiser(sites.order_by('-created_at', 'name'), many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginated_response(self.paginator, request, sites, TouristSiteSerialiser)
 
     def post(self, request, *args, **kwargs):
         '''Create a new tourist site. Only staff can create a site'''
@@ -0,0 +1,47 @@
+from rest_framework import permissions, status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apis.uploads import UploadError, can_upload, create_upload, save_local_upload, uses_local_storage
+
+
+class UploadAPIView(APIView):
+    '''Upload slots for sending images straight to the media storage'''
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        '''
+        Reserve an upload. Body: target ('<model>.<field>', e.g. hotel.image,
+        blog.feature_image, user.avatar) and content_type.
+        POST the file as multipart to `url` with `fields` (file last), then
+        send `token` as the value of the field in the create/update request.
+        '''
+        target = request.data.get('target', '')
+        if not can_upload(request.user, target):
+            return Response({'message': 'You are not authorized to upload this image'}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            upload = create_upload(target, request.data.get('content_type', ''))
+        except UploadError as error:
+            return Response({'message': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        upload['url'] = request.build_absolute_uri(upload['url'])
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+
+class LocalUploadAPIView(APIView):
+    '''Upload target when media is stored locally (stands in for the bucket in development)'''
+    permission_classes = (permissions.AllowAny,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request, *args, **kwargs):
+        '''Store the `file` of a slot; the signed `token` field is the credential'''
+        if not uses_local_storage():
+            return Response({'message': 'Uploads go to the media storage'}, status=status.HTTP_404_NOT_FOUND)
+        file = request.FILES.get('file')
+        if not file:
+            return Response({'message': 'File is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            save_local_upload(request.data.get('token', ''), file)
+        except UploadError as error:
+            return Response({'message': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
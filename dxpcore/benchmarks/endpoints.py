@@ -0,0 +1,174 @@
+'''
+Latency benchmark for the API endpoints.
+
+Creates a throwaway test database, fills it with apis.testing.seed_fixtures()
+and times every request in ENDPOINTS through the Django test client (no
+network): a few warm-up calls, then --runs timed calls with the response
+cache cleared before each one, so the numbers are the database and
+serialization cost of a cold cache.
+
+The gate is on query counts, which do not depend on the machine: the script
+exits non-zero when an endpoint issues more queries than recorded in
+endpoints_baseline.json (apis.tests.QueryBudgetTests enforces the same
+budgets in the test suite). Milliseconds vary too much between machines and
+runs to gate on, as in startup.py; they are printed for information, next
+to their ratio to REFERENCE (a request that does no work) from the same run.
+
+    python benchmarks/endpoints.py             # check against the baseline
+    python benchmarks/endpoints.py --update    # record a new baseline
+'''
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).resolve().parent / 'endpoints_baseline.json'
+
+# name -> (client, path, query params); {blog} is the first seeded blog
+ENDPOINTS = {
+    'ping': ('anonymous', '/api-v1/', {}),
+    'dashboard': ('anonymous', '/api-v1/dashboard/', {}),
+    'webdashboard': ('staff', '/api-v1/webdashboard/', {}),
+    'users': ('staff', '/api-v1/users/', {}),
+    'userprofile': ('reader', '/api-v1/userprofile/', {}),
+    'hotels': ('anonymous', '/api-v1/hotels/', {}),
+    'hotels_page': ('anonymous', '/api-v1/hotels/', {'page_size': 20}),
+    'political': ('anonymous', '/api-v1/political/', {}),
+    'tourists': ('anonymous', '/api-v1/tourists/', {}),
+    'sync': ('anonymous', '/api-v1/sync/', {}),
+    'bulk_export': ('staff', '/api-v1/bulk/hotel/', {}),
+    'blogs_staff': ('staff', '/api-v1/blogs/', {}),
+    'blogs_legacy': ('anonymous', '/api-v1/blogs/', {}),
+    'blogs_random': ('anonymous', '/api-v1/blogs/', {'feed': 'random'}),
+    'blogs_trending': ('anonymous', '/api-v1/blogs/', {'feed': 'trending'}),
+    'blog_detail': ('anonymous', '/api-v1/blogs/{blog}/', {}),
+    'blog_stats': ('staff', '/api-v1/blogs/{blog}/stats/', {}),
+    'notifications': ('staff', '/api-v1/notifications/', {}),
+    'inbox': ('reader', '/api-v1/inbox/', {}),
+    'inbox_unread': ('reader', '/api-v1/inbox/unread/', {}),
+    'people': ('reader', '/api-v1/people/', {}),
+    'friendrequests': ('reader', '/api-v1/friendrequests/', {}),
+    'search': ('anonymous', '/api-v1/search/', {'q': 'hotel'}),
+    'nearby': ('anonymous', '/api-v1/nearby/', {'lat': 5.6, 'lon': -0.18, 'radius': 50}),
+}
+WARMUP = 3
+REFERENCE = 'ping'
+
+
+def setup_django():
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dxpcore.settings')
+    os.environ.setdefault('DEPLOYMENT_ENVIRONMENT', 'development')
+    import django
+    django.setup()
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+
+
+def fetch(client, path, params):
+    response = client.get(path, params)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    if response.status_code >= 400:
+        raise RuntimeError(f'GET {path} returned {response.status_code}')
+    return response
+
+
+def measure(client, path, params, runs):
+    '''Median and p95 milliseconds over runs, plus the queries of one request'''
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for _ in range(WARMUP):
+        cache.clear()
+        fetch(client, path, params)
+    timings = []
+    for _ in range(runs):
+        cache.clear()
+        started = time.perf_counter()
+        fetch(client, path, params)
+        timings.append(time.perf_counter() - started)
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        fetch(client, path, params)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 2),
+        'queries': len(queries),
+    }
+
+
+def run(runs, count):
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    from apis.models import Blog
+    from apis.stats import refresh_counters
+    from apis.testing import seed_fixtures
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        staff, reader = seed_fixtures(count)
+        refresh_counters()
+        blog = Blog.objects.order_by('id').first()
+        clients = {'anonymous': APIClient(), 'staff': APIClient(), 'reader': APIClient()}
+        clients['staff'].force_authenticate(staff)
+        clients['reader'].force_authenticate(reader)
+        return {
+            name: measure(clients[client], path.format(blog=blog.id), params, runs)
+            for name, (client, path, params) in ENDPOINTS.items()
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--count', type=int, default=30, help='rows of each table to seed')
+    parser.add_argument('--only', nargs='*', help='names of the endpoints to run (default: all)')
+    parser.add_argument('--update', action='store_true', help='write the measured numbers as the new baseline')
+    args = parser.parse_args()
+
+    if args.only:
+        unknown = set(args.only) - set(ENDPOINTS)
+        if unknown:
+            parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+        for name in set(ENDPOINTS) - set(args.only) - {REFERENCE}:
+            del ENDPOINTS[name]
+
+    setup_django()
+    results = run(args.runs, args.count)
+
+    if args.update:
+        baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+        baseline.update(results)
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2) + '\n')
+        print(f'Baseline written to {BASELINE_FILE}')
+        return 0
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    failed = False
+    reference_ms = results[REFERENCE]['median_ms']
+    for name, result in results.items():
+        line = (
+            f"{name}: {result['queries']} queries, {result['median_ms']} ms "
+            f"(p95 {result['p95_ms']} ms, {result['median_ms'] / reference_ms:.1f}x {REFERENCE})"
+        )
+        expected = baseline.get(name, {}).get('queries')
+        if expected is not None and result['queries'] > expected:
+            line += f' REGRESSED: baseline {expected} queries'
+            failed = True
+        print(line)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
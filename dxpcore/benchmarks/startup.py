@@ -0,0 +1,142 @@
+'''
+Cold-start benchmark for the ASGI and WSGI entry points.
+
+Each run starts a fresh interpreter with `python -X importtime`, imports the
+entry point and loads the URLconf (what the first request pays for), then
+records the top-level packages it imported, the wall time and the slowest
+imports. The check is on what gets imported, not on milliseconds, which
+vary too much between machines and runs to gate on: the script exits
+non-zero when startup imports a package that is not in
+startup_baseline.json, or a module that must stay lazy (see LAZY_MODULES).
+Wall times are printed for information, next to the time of a bare
+django.setup() in the same run, so the ratio can be compared across
+machines.
+
+    python benchmarks/startup.py             # check against the baseline
+    python benchmarks/startup.py --update    # record a new baseline
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).resolve().parent / 'startup_baseline.json'
+
+ENTRY_POINTS = {
+    'asgi': 'dxpcore.asgi',
+    'wsgi': 'dxpcore.wsgi',
+}
+
+# external clients and libraries that must only be loaded on first use
+LAZY_MODULES = ['pyfcm', 'google.oauth2.service_account', 'PIL']
+
+# the reference the entry points are timed against
+REFERENCE_MODULE = 'django'
+
+STARTUP_SCRIPT = '''
+import importlib, json, sys
+importlib.import_module({module!r})
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps(sorted(name for name in {lazy!r} if name in sys.modules)))
+'''
+
+REFERENCE_SCRIPT = '''
+import django
+django.setup()
+print('[]')
+'''
+
+
+def parse_importtime(stderr):
+    '''Returns {module: cumulative microseconds} from -X importtime output'''
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        timings[name.strip()] = int(cumulative_us)
+    return timings
+
+
+def top_level_packages(imports):
+    '''Sorted top-level non-stdlib package names of the modules in an importtime mapping'''
+    names = {name.split('.', 1)[0] for name in imports}
+    return sorted(name for name in names if name not in sys.stdlib_module_names and not name.startswith('_'))
+
+
+def run_once(module):
+    '''Starts a fresh interpreter and returns (wall seconds, importtime, lazy modules loaded)'''
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='dxpcore.settings')
+    env.setdefault('DEPLOYMENT_ENVIRONMENT', 'development')
+    if module == REFERENCE_MODULE:
+        script = REFERENCE_SCRIPT
+    else:
+        script = STARTUP_SCRIPT.format(module=module, lazy=LAZY_MODULES)
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script], cwd=PROJECT_DIR, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if process.returncode != 0:
+        raise RuntimeError(f'importing {module} failed:\n{process.stderr[-2000:]}')
+    return elapsed, parse_importtime(process.stderr), json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def measure(module, runs):
+    '''Median wall time over runs, the packages imported and the slowest imports of the last run'''
+    timings = []
+    for _ in range(runs):
+        elapsed, imports, loaded_lazy = run_once(module)
+        timings.append(elapsed)
+    top = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:15]
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 1),
+        'packages': top_level_packages(imports),
+        'slowest_imports_ms': {name: round(us / 1000, 1) for name, us in top},
+        'lazy_modules_loaded': loaded_lazy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--update', action='store_true', help='write the measured numbers as the new baseline')
+    args = parser.parse_args()
+
+    reference_ms = measure(REFERENCE_MODULE, args.runs)['median_ms']
+    results = {name: measure(module, args.runs) for name, module in ENTRY_POINTS.items()}
+
+    if args.update:
+        BASELINE_FILE.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'Baseline written to {BASELINE_FILE}')
+        return 0
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    failed = False
+    for name, result in results.items():
+        line = f"{name}: {result['median_ms']} ms, {result['median_ms'] / reference_ms:.2f}x a bare django.setup()"
+        expected = baseline.get(name, {}).get('packages')
+        added = sorted(set(result['packages']) - set(expected or ()))
+        if expected is not None and added:
+            line += f" newly imported: {', '.join(added)}"
+            failed = True
+        if result['lazy_modules_loaded']:
+            line += f" eagerly imported: {', '.join(result['lazy_modules_loaded'])}"
+            failed = True
+        print(line)
+        for module, ms in list(result['slowest_imports_ms'].items())[:5]:
+            print(f'    {ms:8.1f} ms  {module}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -94,6 +95,39 @@ else:
     },
 }
 
+# cache config
+if os.getenv('DEPLOYMENT_ENVIRONMENT') == 'development':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        # write buffers are written by the web process and read by
+        # `manage.py flushblogviews`, so they live in files shared by both;
+        # incr is not atomic there, which is fine for one developer
+        'buffers': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('BUFFER_CACHE_DIR', str(Path(tempfile.gettempdir()) / 'dxpcore-buffers')),
+            'OPTIONS': {'MAX_ENTRIES': 1000000},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379/1',
+        },
+        # write buffers (e.g. blog views) waiting to be flushed to the
+        # database; entries here must not be evicted to make room. Redis
+        # applies maxmemory-policy to a whole instance, not per db, so in
+        # production BUFFER_REDIS_URL must point at a separate Redis instance
+        # running with `maxmemory-policy noeviction`; db 2 of the instance
+        # serving the default cache would be evicted along with it.
+        'buffers': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('BUFFER_REDIS_URL', 'redis://127.0.0.1:6379/2'),
+        },
+    }
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -153,6 +187,53 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/assets/'
 MEDIA_ROOT = BASE_DIR / "assets"
 
+# media storage: 'local' keeps uploads in MEDIA_ROOT (served by Django),
+# 's3' keeps them in an S3-compatible bucket (AWS, or MinIO/moto locally via
+# AWS_S3_ENDPOINT_URL). Credentials come from the usual AWS_* variables.
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 'local')
+# stored names never change content (uploads get fresh names, derivatives
+# are content-hashed), so CDNs and clients may cache media for good
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+if MEDIA_STORAGE == 's3':
+    STORAGES['default'] = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.getenv('AWS_STORAGE_BUCKET_NAME'),
+            'endpoint_url': os.getenv('AWS_S3_ENDPOINT_URL') or None,
+            'region_name': os.getenv('AWS_S3_REGION_NAME') or None,
+            'addressing_style': os.getenv('AWS_S3_ADDRESSING_STYLE') or None,
+            'location': os.getenv('AWS_LOCATION', ''),
+            # CDN in front of the bucket, e.g. media.example.com
+            'custom_domain': os.getenv('MEDIA_CDN_DOMAIN') or None,
+            # plain URLs: the bucket (or CDN origin) allows public reads
+            'querystring_auth': False,
+            'file_overwrite': False,
+            'signature_version': 's3v4',
+            'object_parameters': {'CacheControl': MEDIA_CACHE_CONTROL},
+        },
+    }
+
+# direct uploads (apis.uploads): largest accepted file in bytes
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+
+# catalogue list endpoints return everything when the client sends no
+# cursor/page_size (app versions before pagination). Turn off once retired.
+LEGACY_UNPAGINATED_LISTS = os.getenv('LEGACY_UNPAGINATED_LISTS', 'True') == 'True'
+
+# let signed-out app versions register an FCM token by posting a user_id.
+# Anyone can claim any user_id that way, so keep it off unless those
+# versions are still in use.
+FCM_LEGACY_USER_ID_REGISTRATION = os.getenv('FCM_LEGACY_USER_ID_REGISTRATION', 'False') == 'True'
+
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -181,3 +262,8 @@ EMAIL_HOST_PASSWORD = ''
 EMAIL_USE_TLS = True
 EMAIL_USE_SSL = False
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_MAIL')
+
+
+# firebase cloud messaging (the client is created on first use)
+FCM_SERVICE_ACCOUNT_FILE = os.getenv('FCM_SERVICE_ACCOUNT_FILE', str(BASE_DIR / 'notifications' / 'dxpmobile.json'))
+FCM_PROJECT_ID = os.getenv('FCM_PROJECT_ID', 'dxpmobile')
@@ -13,8 +13,10 @@ urlpatterns = [
 
 
 # Let django serve static files in development mode
-if settings.DEBUG:
+# (media only when it is stored locally; otherwise the bucket/CDN serves it)
+if settings.DEBUG and settings.MEDIA_STORAGE == 'local':
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)
+if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL,
                           document_root=settings.STATIC_ROOT)
\ No newline at end of file
@@ -30,4 +30,32 @@ class BlogCategory(Enum):
     '''Type enumeration for Blog model'''
     TRAVEL = "TRAVEL BLOG"
     FUNFACT = "FUN FACT"
-    OTHER = "OTHER BLOG"
\ No newline at end of file
+    OTHER = "OTHER BLOG"
+
+
+class DevicePlatform(Enum):
+    '''Platform enumeration for registered push devices'''
+    ANDROID = 'android'
+    IOS = 'ios'
+    WEB = 'web'
+
+
+class QueueStatus(Enum):
+    '''Delivery status enumeration for queued outbound messages'''
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    DEAD = 'dead'  # gave up retrying, kept for inspection / requeue
+
+
+class ImageStatus(Enum):
+    '''Processing status of an uploaded image's derivatives'''
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+
+
+class InboxEventKind(Enum):
+    '''Kinds of per-user events shown in the notification inbox'''
+    FRIEND_REQUEST = 'friend_request'
+    FRIEND_ACCEPTED = 'friend_accepted'
@@ -0,0 +1,161 @@
+"""
+Geohash and distance helpers.
+
+A geohash interleaves longitude and latitude bits into a base32 string;
+points sharing a prefix share a cell, so "near this point" becomes a few
+prefix range scans over an ordinary index.
+"""
+
+import csv
+import math
+import unicodedata
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+DECODE = {char: index for index, char in enumerate(BASE32)}
+EARTH_RADIUS_KM = 6371.0088
+MAX_PRECISION = 12
+# most prefixes a single area query scans
+MAX_CELLS = 24
+
+
+def encode(latitude: float, longitude: float, precision: int = 9) -> str:
+    """Return the geohash of a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cells_for_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, max_cells: int = MAX_CELLS) -> list:
+    """
+    Geohash prefixes whose union contains the box, at the longest precision
+    that needs at most max_cells of them. A box with min_lon > max_lon
+    crosses the antimeridian.
+    """
+    lon_span = max_lon - min_lon if min_lon <= max_lon else max_lon + 360 - min_lon
+    for precision in range(MAX_PRECISION, 0, -1):
+        lat_bits = 5 * precision // 2
+        cell_lat = 180.0 / 2 ** lat_bits
+        cell_lon = 360.0 / 2 ** (5 * precision - lat_bits)
+        rows = int((max_lat - min_lat) / cell_lat) + 2
+        columns = int(lon_span / cell_lon) + 2
+        if rows * columns <= max_cells or precision == 1:
+            break
+    cells = set()
+    for row in range(rows):
+        latitude = min(min_lat + row * cell_lat, max_lat)
+        for column in range(columns):
+            longitude = min_lon + min(column * cell_lon, lon_span)
+            cells.add(encode(latitude, (longitude + 180) % 360 - 180, precision))
+    return sorted(cells)
+
+
+def radius_bbox(latitude: float, longitude: float, radius_km: float):
+    """Return (min_lat, min_lon, max_lat, max_lon) of a box containing the circle"""
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(latitude - d_lat, -90.0), min(latitude + d_lat, 90.0)
+    if min_lat == -90.0 or max_lat == 90.0:
+        return min_lat, -180.0, max_lat, 180.0
+    # widest longitude extent of the circle (reached away from its centre latitude)
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return min_lat, -180.0, max_lat, 180.0
+    d_lon = math.degrees(math.asin(ratio))
+    min_lon = (longitude - d_lon + 180) % 360 - 180
+    max_lon = (longitude + d_lon + 180) % 360 - 180
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> list:
+    """Geohash prefixes whose union contains every point within radius_km"""
+    return cells_for_bbox(*radius_bbox(latitude, longitude, radius_km))
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def valid_point(latitude, longitude) -> bool:
+    return latitude is not None and longitude is not None and -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+
+class Gazetteer:
+    """
+    Place name -> coordinates lookup loaded from a local file, used to
+    geocode free-text addresses without calling an external service.
+
+    Accepts a GeoNames dump (tab separated, no header: name, asciiname and
+    comma separated alternate names in columns 2-4, latitude/longitude in
+    5-6 and population in 15) or a CSV with a header containing name,
+    latitude, longitude and optionally population.
+    """
+
+    MAX_WORDS = 4
+
+    def __init__(self):
+        self.places = {}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+        return ' '.join(''.join(char if char.isalnum() else ' ' for char in text.lower()).split())
+
+    def add(self, name: str, latitude: float, longitude: float, population: int = 0) -> None:
+        key = self.normalize(name)
+        if key and (key not in self.places or population > self.places[key][2]):
+            self.places[key] = (latitude, longitude, population)
+
+    @classmethod
+    def load(cls, path) -> 'Gazetteer':
+        gazetteer = cls()
+        with open(path, newline='', encoding='utf-8') as handle:
+            if str(path).endswith(('.txt', '.tsv')):
+                for row in csv.reader(handle, delimiter='\t', quoting=csv.QUOTE_NONE):
+                    if len(row) < 15:
+                        continue
+                    latitude, longitude = float(row[4]), float(row[5])
+                    population = int(row[14] or 0)
+                    for name in {row[1], row[2], *filter(None, row[3].split(','))}:
+                        gazetteer.add(name, latitude, longitude, population)
+            else:
+                for row in csv.DictReader(handle):
+                    gazetteer.add(
+                        row['name'], float(row['latitude']), float(row['longitude']), int(row.get('population') or 0)
+                    )
+        return gazetteer
+
+    def lookup(self, text: str):
+        """
+        Return (latitude, longitude) of the most specific place named in
+        text: the longest matching run of words, then the most populous.
+        """
+        words = self.normalize(text or '').split()
+        best = None
+        for size in range(min(self.MAX_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                place = self.places.get(' '.join(words[start:start + size]))
+                if place and (best is None or place[2] > best[2]):
+                    best = place
+            if best:
+                return best[0], best[1]
+        return None
+
+    def __len__(self):
+        return len(self.places)
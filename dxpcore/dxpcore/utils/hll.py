@@ -0,0 +1,71 @@
+"""
+HyperLogLog: distinct counts in fixed memory.
+
+Each value is hashed to 64 bits; the first `precision` bits pick a
+register and the register keeps the longest run of leading zeros seen in
+the remaining bits. Merging two sketches keeps the larger register, so the
+sketch of a union is the merge of the sketches (days, blogs, ...). With the
+default precision of 11 a sketch has 2048 registers and the standard error
+is 1.04 / sqrt(2048), about 2.3%.
+"""
+
+import hashlib
+import math
+import zlib
+
+PRECISION = 11
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+# 2 ** -rank for every rank a register can hold
+POWERS = [2.0 ** -rank for rank in range(66)]
+
+
+class HyperLogLog:
+    """A mergeable distinct-count sketch"""
+
+    def __init__(self, precision: int = PRECISION, registers: bytes | None = None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f'precision must be between {MIN_PRECISION} and {MAX_PRECISION}')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError('registers do not match the precision')
+
+    def add(self, value: str | bytes) -> None:
+        """Count value"""
+        if isinstance(value, str):
+            value = value.encode()
+        hashed = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        """Fold other into this sketch, which then counts the union of both"""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """Return the estimated number of distinct values added"""
+        size = self.size
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(POWERS[register] for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # linear counting is more accurate while many registers are empty
+            return round(size * math.log(size / zeros))
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        """Return the sketch compressed for storage (a sparse sketch takes a few dozen bytes)"""
+        return zlib.compress(bytes([self.precision]) + bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        """Return the sketch stored by to_bytes()"""
+        raw = zlib.decompress(bytes(data))
+        return cls(raw[0], raw[1:])
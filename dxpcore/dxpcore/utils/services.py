@@ -1,9 +1,43 @@
+import threading
+
+
+class LazyClient:
+    """
+    Creates an external client (and imports its library) on first use.
+    Attribute access is forwarded to the client, so callers use the
+    provider as if it were the client itself.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the client, creating it on first call"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def reset(self) -> None:
+        """Drop the client so the next use creates a fresh one"""
+        with self._lock:
+            self._client = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
 
 
 def send_mail(receipient: list, subject: str, message: str) -> None:
     """
-    Send an email
+    Queue an email for delivery.
+    The row is written in the caller's transaction and sent later by
+    `manage.py runnotificationworker`, so requests never wait on SMTP.
     """
-    print("Email Sent To... ", receipient)
-    print("Subject: ", subject)
-    print("Message: ", message)
\ No newline at end of file
+    from notifications.models import QueuedEmail
+
+    QueuedEmail.objects.create(recipients=list(receipient), subject=subject, message=message)
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""
+Plain-text summaries of rich content.
+
+Blog content may hold HTML from the web editor; summarize() strips it and
+returns what list screens show instead of the full text.
+"""
+
+import html
+import math
+import re
+
+from django.utils.html import strip_tags
+
+EXCERPT_LENGTH = 280
+WORDS_PER_MINUTE = 200
+WHITESPACE = re.compile(r'\s+')
+
+
+def plain_text(content: str) -> str:
+    """Return content without HTML tags, entities or repeated whitespace"""
+    return WHITESPACE.sub(' ', html.unescape(strip_tags(content or ''))).strip()
+
+
+def excerpt(text: str, length: int = EXCERPT_LENGTH) -> str:
+    """Return the start of text, cut at a word boundary within length characters"""
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if ' ' in cut and not text[length - 1].isspace():
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip(' ,;:.-') + '…'
+
+
+def summarize(content: str) -> tuple[str, int, int]:
+    """Return (excerpt, word count, reading time in whole minutes) of content"""
+    text = plain_text(content)
+    words = len(text.split())
+    return excerpt(text), words, math.ceil(words / WORDS_PER_MINUTE)
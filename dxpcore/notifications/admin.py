@@ -1,9 +1,44 @@
 from django.contrib import admin
+from django.utils import timezone
 
-from .models import FCMDevice
+from dxpcore.utils.constants import QueueStatus
+
+from .models import FCMDevice, NotificationBroadcast, PushNotification, QueuedEmail
 
 
 @admin.register(FCMDevice)
 class FCMDeviceAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user__name', 'token', 'created_at')
-    search_fields = ('user__name', 'token')
\ No newline at end of file
+    list_display = ('id', 'user__name', 'token', 'platform', 'last_seen', 'created_at')
+    search_fields = ('user__name', 'token')
+    list_filter = ('platform',)
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    search_fields = ('subject', 'recipients')
+    list_filter = ('status',)
+
+
+@admin.register(PushNotification)
+class PushNotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user__name', 'title', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    search_fields = ('user__name', 'title')
+    list_filter = ('status',)
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected push notifications')
+    def requeue(self, request, queryset):
+        queryset.exclude(status=QueueStatus.SENT.value).update(
+            status=QueueStatus.PENDING.value, attempts=0, next_attempt_at=timezone.now()
+        )
+
+
+@admin.register(NotificationBroadcast)
+class NotificationBroadcastAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'notification', 'status', 'devices_total', 'devices_sent', 'devices_failed',
+        'tokens_pruned', 'throughput', 'started_at', 'finished_at',
+    )
+    search_fields = ('notification__title',)
+    list_filter = ('status',)
@@ -0,0 +1,111 @@
+'''
+Fan-out of admin Notifications to every registered FCM device.
+
+Devices are streamed in id order, one chunk at a time, so memory stays flat
+however many tokens exist. Each chunk is sent concurrently by a thread pool;
+every thread keeps its own keep-alive session on the FCM client, so requests
+reuse pooled connections. Progress (a device id checkpoint plus counters) is
+saved after every chunk, which lets an interrupted broadcast resume where it
+stopped and renews the worker's claim on the row.
+'''
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.utils import timezone
+from pyfcm.errors import FCMNotRegisteredError
+
+from dxpcore.utils.constants import QueueStatus
+
+from . import utils
+from .models import FCMDevice, NotificationBroadcast
+from .queue import CLAIM_LEASE, claim_due, record_failure
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHUNK_SIZE = 500
+BROADCAST_CONCURRENCY = 32
+BROADCAST_MAX_ATTEMPTS = 5
+PUSH_TIMEOUT = 10  # seconds per FCM request
+
+SENT, UNREGISTERED, FAILED = 'sent', 'unregistered', 'failed'
+
+
+def send_one(token, title, message, data):
+    '''Sends to a single device and returns SENT, UNREGISTERED or FAILED'''
+    try:
+        utils.push_service.notify(
+            fcm_token=token,
+            notification_title=title,
+            notification_body=message,
+            data_payload=data,
+            timeout=PUSH_TIMEOUT,
+        )
+        return SENT
+    except FCMNotRegisteredError:
+        return UNREGISTERED
+    except Exception as e:
+        logger.debug(f"Broadcast send failed: {e}")
+        return FAILED
+
+
+def run_broadcast(broadcast):
+    '''Sends broadcast to every device after its checkpoint'''
+    notification = broadcast.notification
+    data = {'notification_id': str(notification.id)}
+
+    if not broadcast.started_at:
+        broadcast.started_at = timezone.now()
+        broadcast.devices_total = FCMDevice.objects.count()
+        broadcast.save(update_fields=['started_at', 'devices_total'])
+
+    with ThreadPoolExecutor(max_workers=BROADCAST_CONCURRENCY) as pool:
+        while True:
+            chunk = list(
+                FCMDevice.objects.filter(id__gt=broadcast.last_device_id)
+                .order_by('id')
+                .values_list('id', 'token')[:BROADCAST_CHUNK_SIZE]
+            )
+            if not chunk:
+                break
+
+            tokens = [token for _, token in chunk]
+            results = list(pool.map(
+                lambda token: send_one(token, notification.title, notification.message, data), tokens
+            ))
+
+            unregistered = [token for token, result in zip(tokens, results) if result == UNREGISTERED]
+            if unregistered:
+                FCMDevice.objects.filter(token__in=unregistered).delete()
+
+            broadcast.last_device_id = chunk[-1][0]
+            broadcast.devices_sent += results.count(SENT)
+            broadcast.devices_failed += results.count(FAILED)
+            broadcast.tokens_pruned += len(unregistered)
+            broadcast.next_attempt_at = timezone.now() + CLAIM_LEASE
+            broadcast.save(update_fields=[
+                'last_device_id', 'devices_sent', 'devices_failed', 'tokens_pruned', 'next_attempt_at',
+            ])
+
+    broadcast.status = QueueStatus.SENT.value
+    broadcast.attempts += 1
+    broadcast.finished_at = timezone.now()
+    broadcast.save(update_fields=['status', 'attempts', 'finished_at'])
+    logger.info(
+        f"Broadcast {broadcast.id}: {broadcast.devices_sent} sent, {broadcast.devices_failed} failed, "
+        f"{broadcast.tokens_pruned} pruned at {broadcast.throughput}/s"
+    )
+
+
+def deliver_broadcasts(batch_size: int = 1) -> int:
+    '''Runs due broadcasts to completion and returns how many finished'''
+    broadcasts = claim_due(NotificationBroadcast.objects.select_related('notification'), batch_size)
+    finished = 0
+    for broadcast in broadcasts:
+        try:
+            run_broadcast(broadcast)
+            finished += 1
+        except Exception as e:
+            logger.warning(f"Broadcast {broadcast.id} interrupted: {e}")
+            record_failure(broadcast, e, BROADCAST_MAX_ATTEMPTS, failed_status=QueueStatus.DEAD.value)
+    return finished
@@ -0,0 +1,54 @@
+'''
+Registry of FCM device tokens.
+
+Tokens are upserted on the token alone, so a token that moves to another
+account is reassigned instead of failing on the unique constraint. The app
+registers its token on every launch; registrations that repeat what was
+recorded within DEVICE_TOUCH_INTERVAL are absorbed by the cache and cost no
+database write. Tokens not seen for a while are removed by the
+prunefcmdevices command.
+'''
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import FCMDevice
+
+DEVICE_TOUCH_INTERVAL = timedelta(hours=12)
+DEFAULT_DEVICE_TTL_DAYS = 60
+
+
+def device_cache_key(token):
+    return f'fcm_device:{token}'
+
+
+def register_device(user, token, platform=''):
+    '''Records that token belongs to user. Returns True when the database was written'''
+    key = device_cache_key(token)
+    if cache.get(key) == (user.id, platform):
+        return False
+
+    FCMDevice.objects.update_or_create(
+        token=token,
+        defaults={'user': user, 'platform': platform, 'last_seen': timezone.now()},
+    )
+    cache.set(key, (user.id, platform), DEVICE_TOUCH_INTERVAL.total_seconds())
+    return True
+
+
+def forget_device(token):
+    '''Drops the cached registration so the next launch writes again'''
+    cache.delete(device_cache_key(token))
+
+
+def prune_stale_devices(days=DEFAULT_DEVICE_TTL_DAYS, batch_size=1000):
+    '''Deletes devices not seen for days, in batches. Returns the number deleted'''
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = list(FCMDevice.objects.filter(last_seen__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += FCMDevice.objects.filter(id__in=ids).delete()[0]
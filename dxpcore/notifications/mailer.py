@@ -0,0 +1,63 @@
+'''
+Delivery side of the outbound email queue.
+
+Requests only insert QueuedEmail rows (see dxpcore.utils.services.send_mail);
+the notification worker drains them here over a single SMTP connection per
+batch and retries failures with exponential backoff.
+'''
+
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from dxpcore.utils.constants import QueueStatus
+
+from .models import QueuedEmail
+from .queue import claim_due, record_failure
+
+logger = logging.getLogger(__name__)
+
+EMAIL_MAX_ATTEMPTS = 8
+
+
+def deliver_queued_emails(batch_size: int = 100) -> int:
+    '''Sends due queued emails and returns how many were delivered'''
+    emails = claim_due(QueuedEmail.objects.all(), batch_size)
+    if not emails:
+        return 0
+
+    delivered = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning(f"SMTP connection failed: {e}")
+        for email in emails:
+            record_failure(email, e, EMAIL_MAX_ATTEMPTS)
+        return 0
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=email.recipients,
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as e:
+                logger.warning(f"Sending email {email.id} failed: {e}")
+                record_failure(email, e, EMAIL_MAX_ATTEMPTS)
+                continue
+            email.status = QueueStatus.SENT.value
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.save(update_fields=['status', 'attempts', 'sent_at'])
+            delivered += 1
+    finally:
+        connection.close()
+    return delivered
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from notifications.devices import DEFAULT_DEVICE_TTL_DAYS, prune_stale_devices
+
+
+class Command(BaseCommand):
+    help = 'Delete FCM device tokens that have not been seen for a number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=DEFAULT_DEVICE_TTL_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = prune_stale_devices(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} stale devices"))
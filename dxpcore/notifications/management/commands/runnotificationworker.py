@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.broadcast import deliver_broadcasts
+from notifications.mailer import deliver_queued_emails
+from notifications.push import deliver_push_notifications
+
+QUEUES = ('emails', 'push', 'broadcasts')
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound notifications (emails, push notifications and broadcasts)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queues once and exit')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queues are empty')
+        parser.add_argument(
+            '--queue', action='append', choices=QUEUES, dest='queues',
+            help='Only drain these queues (repeatable). Large broadcasts are best run on a dedicated worker.',
+        )
+
+    def handle(self, *args, **options):
+        queues = options['queues'] or QUEUES
+        while True:
+            processed = self.drain(queues, options['batch_size'])
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
+
+    def drain(self, queues, batch_size):
+        '''Runs one pass over the selected queues and returns the number of items handled'''
+        processed = 0
+        if 'emails' in queues:
+            emails = deliver_queued_emails(batch_size)
+            if emails:
+                self.stdout.write(self.style.SUCCESS(f"Delivered {emails} emails"))
+            processed += emails
+        if 'push' in queues:
+            pushes = deliver_push_notifications(batch_size)
+            if pushes:
+                self.stdout.write(self.style.SUCCESS(f"Delivered {pushes} push notifications"))
+            processed += pushes
+        if 'broadcasts' in queues:
+            broadcasts = deliver_broadcasts()
+            if broadcasts:
+                self.stdout.write(self.style.SUCCESS(f"Finished {broadcasts} broadcasts"))
+            processed += broadcasts
+        return processed
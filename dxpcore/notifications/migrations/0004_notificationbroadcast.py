@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0022_people_suggestions'),
+        ('notifications', '0003_pushnotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationBroadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(default='pending', max_length=10)),
+                ('last_device_id', models.BigIntegerField(default=0)),
+                ('devices_total', models.PositiveIntegerField(default=0)),
+                ('devices_sent', models.PositiveIntegerField(default=0)),
+                ('devices_failed', models.PositiveIntegerField(default=0)),
+                ('tokens_pruned', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('notification', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast', to='apis.notification')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='broadcast_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notificationbroadcast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pushnotification',
+            name='coalesced_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='pushnotification',
+            name='collapse_key',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='pushnotification',
+            index=models.Index(fields=['user', 'collapse_key', 'status'], name='push_notification_collapse_idx'),
+        ),
+    ]
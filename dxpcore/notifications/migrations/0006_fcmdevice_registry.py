@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_pushnotification_collapse_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fcmdevice',
+            name='last_seen',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='fcmdevice',
+            name='platform',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='fcmdevice',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
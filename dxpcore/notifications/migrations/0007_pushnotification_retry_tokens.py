@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_fcmdevice_registry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pushnotification',
+            name='retry_tokens',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
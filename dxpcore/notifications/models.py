@@ -1,12 +1,103 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from dxpcore.utils.constants import QueueStatus
 
 User = get_user_model()
 
 class FCMDevice(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     token = models.CharField(max_length=255, unique=True)
+    platform = models.CharField(max_length=20, blank=True, default='')
+    # refreshed when the app registers the token; stale tokens are swept
+    last_seen = models.DateTimeField(default=timezone.now, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.name} - {self.token[:10]}"
+
+
+class QueuedEmail(models.Model):
+    '''Outbound email waiting to be delivered by the notification worker'''
+    recipients = models.JSONField()
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    status = models.CharField(max_length=10, default=QueueStatus.PENDING.value)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='queued_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class PushNotification(models.Model):
+    '''Push notification waiting to be delivered to a user's devices by the notification worker'''
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='push_notifications')
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+    # pushes sharing a collapse key replace each other on the device and
+    # are folded into one pending row while it waits to be sent
+    collapse_key = models.CharField(max_length=100, blank=True, default='')
+    coalesced_count = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=10, default=QueueStatus.PENDING.value)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    # devices that failed transiently and are still owed this push; empty before the first attempt
+    retry_tokens = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='push_notification_due_idx'),
+            models.Index(fields=['user', 'collapse_key', 'status'], name='push_notification_collapse_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} -> {self.user_id} ({self.status})"
+
+
+class NotificationBroadcast(models.Model):
+    '''Delivery of an admin Notification to every registered device, with progress'''
+    notification = models.OneToOneField('apis.Notification', on_delete=models.CASCADE, related_name='broadcast')
+    status = models.CharField(max_length=10, default=QueueStatus.PENDING.value)
+    # devices are walked in id order; this is the checkpoint to resume from
+    last_device_id = models.BigIntegerField(default=0)
+    devices_total = models.PositiveIntegerField(default=0)
+    devices_sent = models.PositiveIntegerField(default=0)
+    devices_failed = models.PositiveIntegerField(default=0)
+    tokens_pruned = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='broadcast_due_idx'),
+        ]
+
+    @property
+    def throughput(self):
+        '''Devices delivered per second'''
+        if not self.started_at:
+            return 0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.devices_sent / elapsed, 2) if elapsed > 0 else 0
+
+    def __str__(self):
+        return f"Broadcast of {self.notification_id} ({self.status})"
@@ -0,0 +1,52 @@
+'''
+Tracks which users currently have a live websocket connection.
+
+Each consumer increments a per-user counter in the cache on connect and
+decrements it on disconnect. The counter lives for PRESENCE_TTL only and
+every open connection refreshes it each HEARTBEAT_INTERVAL (user_seen), so
+when a worker dies without disconnecting its users drop offline within
+PRESENCE_TTL once their other connections close.
+'''
+
+from django.core.cache import cache
+
+PRESENCE_TTL = 90  # seconds
+HEARTBEAT_INTERVAL = 30  # seconds, well inside PRESENCE_TTL
+
+
+def presence_key(user_id):
+    return f'presence:{user_id}'
+
+
+def user_connected(user_id) -> None:
+    key = presence_key(user_id)
+    cache.add(key, 0, PRESENCE_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # expired between add and incr
+        cache.set(key, 1, PRESENCE_TTL)
+    cache.touch(key, PRESENCE_TTL)
+
+
+def user_seen(user_id) -> None:
+    '''Heartbeat of an open connection: keeps the user online for another PRESENCE_TTL'''
+    key = presence_key(user_id)
+    if not cache.touch(key, PRESENCE_TTL):
+        # expired while the connection was open (a missed heartbeat)
+        cache.add(key, 1, PRESENCE_TTL)
+
+
+def user_disconnected(user_id) -> None:
+    key = presence_key(user_id)
+    try:
+        if cache.decr(key) <= 0:
+            cache.delete(key)
+    except ValueError:
+        pass
+
+
+def online_user_ids(user_ids) -> set:
+    '''Returns the subset of user_ids with at least one live connection'''
+    counts = cache.get_many([presence_key(user_id) for user_id in user_ids])
+    return {user_id for user_id in user_ids if counts.get(presence_key(user_id), 0) > 0}
@@ -0,0 +1,123 @@
+'''
+Delivery side of the push notification queue.
+
+Due PushNotification rows are claimed in batches and grouped per user so
+each user's devices are loaded once per batch. Every device is sent to over
+the FCM client's pooled session; tokens FCM reports as unregistered are
+removed; devices that fail transiently are remembered on the row
+(retry_tokens) and only they are retried, with backoff, so a device that
+got the push does not get it twice. Rows that keep failing are
+dead-lettered. Chat pushes carry their collapse key and the
+user's unread total, read from the database at send time.
+'''
+
+import logging
+from collections import defaultdict
+
+from django.utils import timezone
+from pyfcm.errors import FCMNotRegisteredError
+
+from apis.models import ChatRoom
+from dxpcore.utils.constants import QueueStatus
+
+from . import utils
+from .models import FCMDevice, PushNotification
+from .queue import claim_due, record_failure
+
+logger = logging.getLogger(__name__)
+
+PUSH_MAX_ATTEMPTS = 6
+PUSH_TIMEOUT = 10  # seconds per FCM request
+
+
+def send_to_devices(tokens, title, message, data=None, collapse_key='', badge=None):
+    '''
+    Sends one notification to each token.
+    Returns (sent, unregistered_tokens, {failed token: error}).
+    '''
+    data = {key: str(value) for key, value in (data or {}).items()}
+    android_config = None
+    apns_config = None
+    if collapse_key:
+        # a newer push with the same key replaces the older one on the device
+        android_config = {'collapse_key': collapse_key}
+        apns_config = {'headers': {'apns-collapse-id': collapse_key}}
+    if badge is not None:
+        data['unread'] = str(badge)
+        apns_config = apns_config or {}
+        apns_config['payload'] = {'aps': {'badge': badge}}
+
+    sent = 0
+    unregistered = []
+    failed = {}
+    for token in tokens:
+        try:
+            utils.push_service.notify(
+                fcm_token=token,
+                notification_title=title,
+                notification_body=message,
+                data_payload=data or None,
+                android_config=android_config,
+                apns_config=apns_config,
+                timeout=PUSH_TIMEOUT,
+            )
+            sent += 1
+        except FCMNotRegisteredError:
+            unregistered.append(token)
+        except Exception as e:
+            failed[token] = e
+    return sent, unregistered, failed
+
+
+def deliver_push_notifications(batch_size: int = 100) -> int:
+    '''Sends due queued push notifications and returns how many were delivered'''
+    notifications = claim_due(PushNotification.objects.all(), batch_size)
+    if not notifications:
+        return 0
+
+    by_user = defaultdict(list)
+    for notification in notifications:
+        by_user[notification.user_id].append(notification)
+
+    tokens_by_user = defaultdict(list)
+    for user_id, token in FCMDevice.objects.filter(user_id__in=by_user).values_list('user_id', 'token'):
+        tokens_by_user[user_id].append(token)
+
+    delivered = 0
+    for user_id, user_notifications in by_user.items():
+        for notification in user_notifications:
+            # devices pruned by an earlier notification in this batch are skipped
+            tokens = tokens_by_user[user_id]
+            if notification.retry_tokens:
+                # a retry only goes to the devices that failed last time
+                tokens = [token for token in tokens if token in notification.retry_tokens]
+            badge = None
+            if tokens and notification.data.get('type') == 'chat':
+                badge = ChatRoom.total_unread_messages(user_id)
+            sent, unregistered, failed = send_to_devices(
+                tokens, notification.title, notification.message, notification.data,
+                collapse_key=notification.collapse_key, badge=badge,
+            )
+
+            if unregistered:
+                FCMDevice.objects.filter(token__in=unregistered).delete()
+                tokens_by_user[user_id] = [token for token in tokens_by_user[user_id] if token not in unregistered]
+
+            if failed:
+                error = next(iter(failed.values()))
+                logger.warning(f"Push notification {notification.id} failed on {len(failed)} devices: {error}")
+                notification.retry_tokens = list(failed)
+                record_failure(
+                    notification, error, PUSH_MAX_ATTEMPTS, failed_status=QueueStatus.DEAD.value,
+                    update_fields=['retry_tokens'],
+                )
+                continue
+
+            notification.status = QueueStatus.SENT.value
+            notification.attempts += 1
+            notification.sent_at = timezone.now()
+            notification.last_error = '' if tokens or notification.retry_tokens else 'No devices'
+            notification.retry_tokens = []
+            notification.save(update_fields=['status', 'attempts', 'sent_at', 'last_error', 'retry_tokens'])
+            delivered += 1
+    return delivered
@@ -0,0 +1,55 @@
+'''
+Helpers shared by the database-backed delivery queues.
+
+Rows are claimed by pushing their next_attempt_at forward by a lease inside
+a short transaction (SELECT ... FOR UPDATE SKIP LOCKED where supported), so
+several workers can drain a queue without sending the same row twice and
+without holding a transaction open during network I/O.
+'''
+
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from dxpcore.utils.constants import QueueStatus
+
+# a claimed row becomes visible again if its worker dies before this
+CLAIM_LEASE = timedelta(minutes=5)
+
+RETRY_BASE_DELAY = 30  # seconds
+RETRY_MAX_DELAY = 60 * 60
+
+
+def retry_delay(attempts: int) -> timedelta:
+    '''Exponential backoff with jitter for the given number of failed attempts'''
+    delay = min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_due(queryset, batch_size: int) -> list:
+    '''Claims up to batch_size pending rows that are due and returns them'''
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update(skip_locked=True)
+            .filter(status=QueueStatus.PENDING.value, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if rows:
+            queryset.model.objects.filter(id__in=[row.id for row in rows]).update(
+                next_attempt_at=now + CLAIM_LEASE
+            )
+    return rows
+
+
+def record_failure(row, error, max_attempts: int, failed_status=QueueStatus.FAILED.value, update_fields=()) -> None:
+    '''Schedules a retry for row, or gives up after max_attempts. update_fields are saved along'''
+    row.attempts += 1
+    row.last_error = str(error)[:2000]
+    if row.attempts >= max_attempts:
+        row.status = failed_status
+    else:
+        row.next_attempt_at = timezone.now() + retry_delay(row.attempts)
+    row.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', *update_fields])
@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apis.models import Notification
+
+from .devices import forget_device
+from .models import FCMDevice, NotificationBroadcast
+
+
+@receiver(post_save, sender=Notification)
+def queue_notification_broadcast(sender, instance, created, **kwargs):
+    '''New admin notifications are delivered to every device by the worker'''
+    if created:
+        transaction.on_commit(lambda: NotificationBroadcast.objects.get_or_create(notification=instance))
+
+
+@receiver(post_delete, sender=FCMDevice)
+def forget_deleted_device(sender, instance, **kwargs):
+    '''A pruned token must be written again the next time the app registers it'''
+    forget_device(instance.token)
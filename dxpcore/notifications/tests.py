@@ -1,3 +1,410 @@
-from django.test import TestCase
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from aiosmtpd.controller import Controller
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from google.auth.credentials import Credentials
+from pyfcm import FCMNotification
+from rest_framework.test import APIClient
+
+from dxpcore.utils.constants import QueueStatus
+from dxpcore.utils.services import LazyClient, send_mail
+
+from apis.models import ChatRoom, Message, Notification
+
+from . import broadcast, presence, utils
+from .devices import forget_device, prune_stale_devices, register_device
+from .mailer import EMAIL_MAX_ATTEMPTS, deliver_queued_emails
+from .models import FCMDevice, NotificationBroadcast, PushNotification, QueuedEmail
+from .push import PUSH_MAX_ATTEMPTS, deliver_push_notifications
+
+User = get_user_model()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    '''aiosmtpd handler that keeps every message and SMTP session it sees'''
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+def smtp_settings(port):
+    return override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+        EMAIL_HOST='127.0.0.1',
+        EMAIL_PORT=port,
+        EMAIL_USE_TLS=False,
+        EMAIL_USE_SSL=False,
+        EMAIL_HOST_USER='',
+        EMAIL_HOST_PASSWORD='',
+        DEFAULT_FROM_EMAIL='noreply@dxp.test',
+    )
+
+
+class EmailQueueTests(TestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.port = free_port()
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=self.port)
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+
+    def test_send_mail_only_queues(self):
+        send_mail(['user@dxp.test'], 'OTP', 'Your OTP is 1234')
+        email = QueuedEmail.objects.get()
+        self.assertEqual(email.status, QueueStatus.PENDING.value)
+        self.assertEqual(email.recipients, ['user@dxp.test'])
+        self.assertEqual(self.handler.messages, [])
+
+    def test_worker_delivers_batch_over_one_connection(self):
+        for i in range(5):
+            send_mail([f'user{i}@dxp.test'], 'OTP', f'Your OTP is {i}')
+
+        with smtp_settings(self.port):
+            delivered = deliver_queued_emails()
+
+        self.assertEqual(delivered, 5)
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertEqual(len(self.handler.sessions), 1)
+        self.assertFalse(QueuedEmail.objects.exclude(status=QueueStatus.SENT.value).exists())
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        send_mail(['user@dxp.test'], 'OTP', 'Your OTP is 1234')
+
+        with smtp_settings(free_port()):
+            self.assertEqual(deliver_queued_emails(), 0)
+
+        email = QueuedEmail.objects.get()
+        self.assertEqual(email.status, QueueStatus.PENDING.value)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        # not due yet, so a second pass does not touch it
+        with smtp_settings(self.port):
+            self.assertEqual(deliver_queued_emails(), 0)
+
+        QueuedEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        with smtp_settings(self.port):
+            self.assertEqual(deliver_queued_emails(), 1)
+        self.assertEqual(len(self.handler.messages), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        send_mail(['user@dxp.test'], 'OTP', 'Your OTP is 1234')
+        QueuedEmail.objects.update(attempts=EMAIL_MAX_ATTEMPTS - 1)
+
+        with smtp_settings(free_port()):
+            deliver_queued_emails()
+
+        self.assertEqual(QueuedEmail.objects.get().status, QueueStatus.FAILED.value)
+
+
+class FakeFCMHandler(BaseHTTPRequestHandler):
+    '''
+    Minimal stand-in for the FCM v1 send endpoint. Tokens starting with
+    "dead" are reported unregistered and "flaky" ones fail with a 500.
+    '''
+    requests = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        token = payload['message']['token']
+        self.requests.append(payload['message'])
+        if token.startswith('dead'):
+            self.respond(404, {'error': {'status': 'NOT_FOUND', 'details': [{'errorCode': 'UNREGISTERED'}]}})
+        elif token.startswith('flaky'):
+            self.respond(500, {'error': {'status': 'INTERNAL'}})
+        else:
+            self.respond(200, {'name': f'projects/test/messages/{len(self.requests)}'})
+
+    def respond(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeFCMServer(ThreadingHTTPServer):
+    # keep-alive connections from the FCM client must not block shutdown
+    daemon_threads = True
+
+
+class FakeCredentials(Credentials):
+    def refresh(self, request):
+        self.token = 'test-token'
+
+
+class FakeFCMTestCase(TestCase):
+    '''Points the FCM client at a fake FCM server running in a thread'''
+
+    def setUp(self):
+        FakeFCMHandler.requests = []
+        self.server = FakeFCMServer(('127.0.0.1', 0), FakeFCMHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        service = FCMNotification(credentials=FakeCredentials(), project_id='test')
+        service.fcm_end_point = f'http://127.0.0.1:{self.server.server_port}/v1/projects/test/messages:send'
+        patcher = mock.patch.object(utils, 'push_service', service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(email='user@dxp.test', password='secret', name='User', phone='0240000000')
+
+
+class PushQueueTests(FakeFCMTestCase):
+    def queue(self, title='Hello'):
+        with self.captureOnCommitCallbacks(execute=True):
+            utils.queue_push_notification(self.user, title, 'World')
+
+    def test_push_is_queued_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            utils.queue_push_notification(self.user, 'Hello', 'World')
+            self.assertFalse(PushNotification.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(PushNotification.objects.get().status, QueueStatus.PENDING.value)
+        self.assertEqual(FakeFCMHandler.requests, [])
+
+    def test_worker_sends_to_every_device_and_prunes_unregistered(self):
+        FCMDevice.objects.create(user=self.user, token='phone-token')
+        FCMDevice.objects.create(user=self.user, token='dead-token')
+        self.queue('First')
+        self.queue('Second')
+
+        self.assertEqual(deliver_push_notifications(), 2)
+
+        tokens = [message['token'] for message in FakeFCMHandler.requests]
+        # the dead token is only tried once, then pruned for the rest of the batch
+        self.assertEqual(tokens.count('phone-token'), 2)
+        self.assertEqual(tokens.count('dead-token'), 1)
+        self.assertFalse(FCMDevice.objects.filter(token='dead-token').exists())
+        self.assertFalse(PushNotification.objects.exclude(status=QueueStatus.SENT.value).exists())
+
+    def test_transient_failures_are_retried_then_dead_lettered(self):
+        FCMDevice.objects.create(user=self.user, token='flaky-token')
+        self.queue()
+
+        self.assertEqual(deliver_push_notifications(), 0)
+        notification = PushNotification.objects.get()
+        self.assertEqual(notification.status, QueueStatus.PENDING.value)
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+
+        PushNotification.objects.update(attempts=PUSH_MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+        deliver_push_notifications()
+        self.assertEqual(PushNotification.objects.get().status, QueueStatus.DEAD.value)
+
+
+    def test_partial_failure_retries_only_the_failed_devices(self):
+        FCMDevice.objects.create(user=self.user, token='phone-token')
+        FCMDevice.objects.create(user=self.user, token='flaky-token')
+        self.queue()
+
+        self.assertEqual(deliver_push_notifications(), 0)
+        notification = PushNotification.objects.get()
+        self.assertEqual(notification.status, QueueStatus.PENDING.value)
+        self.assertEqual(notification.retry_tokens, ['flaky-token'])
+
+        FakeFCMHandler.requests = []
+        PushNotification.objects.update(next_attempt_at=timezone.now())
+        deliver_push_notifications()
+        self.assertEqual({message['token'] for message in FakeFCMHandler.requests}, {'flaky-token'})
+        self.assertEqual(PushNotification.objects.get().attempts, 2)
+
+        # the failing device is gone: nothing is owed any more
+        FCMDevice.objects.filter(token='flaky-token').delete()
+        PushNotification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_push_notifications(), 1)
+        self.assertEqual(PushNotification.objects.get().status, QueueStatus.SENT.value)
+
+
+class BroadcastTests(FakeFCMTestCase):
+    def test_new_notification_is_broadcast_to_every_device(self):
+        FCMDevice.objects.bulk_create(
+            [FCMDevice(user=self.user, token=f'token-{i}') for i in range(25)]
+            + [FCMDevice(user=self.user, token=f'dead-{i}') for i in range(5)]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = Notification.objects.create(title='Festival', message='Chale Wote this weekend')
+
+        with mock.patch.object(broadcast, 'BROADCAST_CHUNK_SIZE', 7):
+            self.assertEqual(broadcast.deliver_broadcasts(), 1)
+
+        result = NotificationBroadcast.objects.get(notification=notification)
+        self.assertEqual(result.status, QueueStatus.SENT.value)
+        self.assertEqual(result.devices_total, 30)
+        self.assertEqual(result.devices_sent, 25)
+        self.assertEqual(result.tokens_pruned, 5)
+        self.assertEqual(len(FakeFCMHandler.requests), 30)
+        self.assertEqual(FCMDevice.objects.count(), 25)
+        self.assertIsNotNone(result.finished_at)
+
+    def test_updating_a_notification_does_not_broadcast_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = Notification.objects.create(title='Festival', message='Chale Wote')
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.title = 'Festival!'
+            notification.save()
+        self.assertEqual(NotificationBroadcast.objects.count(), 1)
+
+
+class ChatPushTests(FakeFCMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sender = User.objects.create_user(email='kofi@dxp.test', password='secret', name='Kofi', phone='0240000001')
+        self.room = ChatRoom.objects.create(room_id='room1', name='room1')
+        self.room.members.add(self.user, self.sender)
+
+    def test_messages_within_window_are_coalesced(self):
+        for text in ('hi', 'are you there?', 'call me'):
+            utils.queue_chat_push(self.user.id, self.room, self.sender.name, text)
+
+        push = PushNotification.objects.get()
+        self.assertEqual(push.coalesced_count, 3)
+        self.assertEqual(push.message, '3 new messages from Kofi')
+        self.assertEqual(push.collapse_key, f'chat_{self.room.id}')
+        self.assertGreater(push.next_attempt_at, timezone.now())
+
+    def test_chat_push_carries_collapse_key_and_unread_badge(self):
+        FCMDevice.objects.create(user=self.user, token='phone-token')
+        for text in ('hi', 'hello'):
+            Message.objects.create(room=self.room, sender=self.sender, content=text)
+            utils.queue_chat_push(self.user.id, self.room, self.sender.name, text)
+        PushNotification.objects.update(next_attempt_at=timezone.now())
+
+        self.assertEqual(deliver_push_notifications(), 1)
+
+        [message] = FakeFCMHandler.requests
+        self.assertEqual(message['android']['collapse_key'], f'chat_{self.room.id}')
+        self.assertEqual(message['apns']['payload']['aps']['badge'], 2)
+        self.assertEqual(message['data']['unread'], '2')
+
+    def test_quiet_period_spaces_chat_pushes(self):
+        sent_at = timezone.now()
+        PushNotification.objects.create(
+            user=self.user, title='Kofi', message='hi', collapse_key=f'chat_{self.room.id}',
+            status=QueueStatus.SENT.value, sent_at=sent_at,
+        )
+        push = utils.queue_chat_push(self.user.id, self.room, self.sender.name, 'again')
+        self.assertGreaterEqual(push.next_attempt_at, sent_at + utils.CHAT_QUIET_PERIOD)
+
+    def test_presence_counts_connections(self):
+        presence.user_connected(self.user.id)
+        presence.user_connected(self.user.id)
+        presence.user_disconnected(self.user.id)
+        self.assertEqual(presence.online_user_ids([self.user.id, self.sender.id]), {self.user.id})
+        presence.user_disconnected(self.user.id)
+        self.assertEqual(presence.online_user_ids([self.user.id]), set())
+
+
+class LazyPushServiceTests(TestCase):
+    def test_startup_does_not_load_the_fcm_client_or_pillow(self):
+        script = (
+            'import sys, dxpcore.wsgi\n'
+            'from django.urls import get_resolver\n'
+            'get_resolver().url_patterns\n'
+            'print("pyfcm" in sys.modules or "PIL" in sys.modules)'
+        )
+        env = dict(os.environ, FCM_SERVICE_ACCOUNT_FILE='/nonexistent/dxpmobile.json')
+        process = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.strip(), 'False')
+
+    def test_client_is_created_once_on_first_use(self):
+        factory = mock.Mock(return_value=mock.Mock(project='dxp'))
+        client = LazyClient(factory)
+        factory.assert_not_called()
+        self.assertEqual(client.project, 'dxp')
+        self.assertEqual(client.project, 'dxp')
+        factory.assert_called_once()
+
+
+class DeviceRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ama = User.objects.create_user(email='ama@dxp.test', password='secret', name='Ama', phone='0240000010')
+        self.kofi = User.objects.create_user(email='kofi@dxp.test', password='secret', name='Kofi', phone='0240000011')
+
+    def test_token_moves_between_accounts(self):
+        register_device(self.ama, 'shared-token', 'android')
+        register_device(self.kofi, 'shared-token', 'android')
+        device = FCMDevice.objects.get()
+        self.assertEqual(device.user, self.kofi)
+        self.assertEqual(device.platform, 'android')
+
+    def test_registration_needs_a_sign_in(self):
+        client = APIClient()
+        response = client.post('/api-fcm/save-fcm-token/', {'token': 'ama-token', 'user_id': self.ama.id})
+        self.assertEqual(response.status_code, 401)
+
+        client.force_authenticate(self.kofi)
+        response = client.post('/api-fcm/save-fcm-token/', {'token': 'ama-token', 'user_id': self.ama.id})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(FCMDevice.objects.exists())
+        response = client.post('/api-fcm/save-fcm-token/', {'token': 'kofi-token', 'user_id': self.kofi.id})
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(FCM_LEGACY_USER_ID_REGISTRATION=True)
+    def test_only_the_signed_in_owner_moves_a_token(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api-fcm/save-fcm-token/', {'token': 'ama-token', 'user_id': self.ama.id}).status_code, 201)
+        # the same account may register it again without signing in
+        forget_device('ama-token')
+        self.assertEqual(client.post('/api-fcm/save-fcm-token/', {'token': 'ama-token', 'user_id': self.ama.id}).status_code, 201)
+
+        response = client.post('/api-fcm/save-fcm-token/', {'token': 'ama-token', 'user_id': self.kofi.id})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(FCMDevice.objects.get(token='ama-token').user, self.ama)
+
+        client.force_authenticate(self.kofi)
+        self.assertEqual(client.post('/api-fcm/save-fcm-token/', {'token': 'ama-token'}).status_code, 201)
+        self.assertEqual(FCMDevice.objects.get(token='ama-token').user, self.kofi)
+
+    def test_repeated_launches_are_absorbed(self):
+        self.assertTrue(register_device(self.ama, 'ama-token', 'ios'))
+        with self.assertNumQueries(0):
+            self.assertFalse(register_device(self.ama, 'ama-token', 'ios'))
+
+    def test_pruned_token_is_registered_again(self):
+        register_device(self.ama, 'ama-token', 'ios')
+        FCMDevice.objects.all().delete()
+        self.assertTrue(register_device(self.ama, 'ama-token', 'ios'))
+        self.assertTrue(FCMDevice.objects.exists())
+
+    def test_sweeper_removes_stale_tokens(self):
+        register_device(self.ama, 'fresh-token')
+        register_device(self.kofi, 'stale-token')
+        FCMDevice.objects.filter(token='stale-token').update(last_seen=timezone.now() - timedelta(days=90))
+        self.assertEqual(prune_stale_devices(days=60), 1)
+        self.assertEqual(list(FCMDevice.objects.values_list('token', flat=True)), ['fresh-token'])
@@ -1,32 +1,93 @@
-from pyfcm import FCMNotification
-from .models import FCMDevice
-
-# push_service = FCMNotification(api_key="YOUR_SERVER_KEY")
-push_service = FCMNotification(
-    service_account_file="notifications/dxpmobile.json",
-    project_id="dxpmobile"
-)
-
-def send_push_notification(user, title, message):
-    devices = FCMDevice.objects.filter(user=user)
-    registration_ids = [device.token for device in devices]
-
-    if not registration_ids:
-        print("No devices found for user.")
-        return "No devices"
-    
-    params_list = [
-        {
-            "fcm_token": token,
-            "notification_title": title,
-            "notification_body": message,
-        }
-        for token in registration_ids
-    ]
-    result = push_service.async_notify_multiple_devices(
-        params_list=params_list,
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from dxpcore.utils.constants import QueueStatus
+from dxpcore.utils.services import LazyClient
+
+from .models import PushNotification
+
+
+def create_push_service():
+    '''Builds the FCM client. pyfcm and the credentials are only loaded here'''
+    from pyfcm import FCMNotification
+
+    return FCMNotification(
+        service_account_file=settings.FCM_SERVICE_ACCOUNT_FILE,
+        project_id=settings.FCM_PROJECT_ID,
     )
 
-    print(f"Push notification sent to {len(registration_ids)} devices: {result}")
 
-    return result
+# created on first use, so importing this module (URLconf, management
+# commands) neither pays for nor requires the service account file
+push_service = LazyClient(create_push_service)
+
+# chat messages to the same room within this window become a single push
+CHAT_COALESCE_WINDOW = timedelta(seconds=30)
+# minimum gap between two chat pushes to the same user
+CHAT_QUIET_PERIOD = timedelta(minutes=2)
+
+def queue_push_notification(user, title, message, data=None):
+    '''
+    Queue a push notification for all of user's devices.
+    The row is created once the current transaction commits and delivered
+    by `manage.py runnotificationworker`, so FCM latency never reaches the request.
+    '''
+    transaction.on_commit(lambda: PushNotification.objects.create(
+        user=user,
+        title=title,
+        message=message,
+        data=data or {},
+    ))
+
+
+def queue_chat_push(user_id, room, sender_name, content):
+    '''
+    Queue a chat push for an offline room member, or fold the message into
+    the push already waiting for that room ("5 new messages from X").
+    The unread badge is filled in by the worker at send time.
+    '''
+    now = timezone.now()
+    collapse_key = f'chat_{room.id}'
+    with transaction.atomic():
+        pending = (
+            PushNotification.objects.select_for_update()
+            .filter(
+                user_id=user_id,
+                collapse_key=collapse_key,
+                status=QueueStatus.PENDING.value,
+                # a row claimed by the worker has its due time pushed past this,
+                # so messages never fold into a push that is being sent
+                next_attempt_at__lte=now + CHAT_QUIET_PERIOD,
+            )
+            .first()
+        )
+        if pending:
+            pending.coalesced_count += 1
+            pending.title = sender_name
+            pending.message = f'{pending.coalesced_count} new messages from {sender_name}'
+            pending.save(update_fields=['coalesced_count', 'title', 'message'])
+            return pending
+
+        send_at = now + CHAT_COALESCE_WINDOW
+        last_sent = (
+            PushNotification.objects.filter(
+                user_id=user_id, collapse_key__startswith='chat_', status=QueueStatus.SENT.value
+            )
+            .order_by('-sent_at')
+            .values_list('sent_at', flat=True)
+            .first()
+        )
+        if last_sent:
+            send_at = max(send_at, last_sent + CHAT_QUIET_PERIOD)
+
+        return PushNotification.objects.create(
+            user_id=user_id,
+            title=sender_name,
+            message=content[:200],
+            data={'type': 'chat', 'room': room.name},
+            collapse_key=collapse_key,
+            next_attempt_at=send_at,
+        )
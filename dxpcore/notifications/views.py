@@ -1,20 +1,44 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from dxpcore.utils.constants import DevicePlatform
+from .devices import register_device
 from .models import FCMDevice
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+PLATFORMS = [platform.value for platform in DevicePlatform]
+
 class SaveFCMTokenView(APIView):
     def post(self, request):
         token = request.data.get("token")
         user_id = request.data.get("user_id")
+        platform = (request.data.get("platform") or "").lower()
 
-        if not token or not user_id:
+        if not token or not (user_id or request.user.is_authenticated):
             return Response({"error": "Missing token or user_id"}, status=400)
 
-        user = User.objects.get(id=user_id)
-        FCMDevice.objects.update_or_create(user=user, token=token)
+        if platform and platform not in PLATFORMS:
+            return Response({"error": f"platform must be one of {', '.join(PLATFORMS)}"}, status=400)
+
+        if request.user.is_authenticated:
+            user = request.user
+            if user_id and str(user_id) != str(user.id):
+                return Response({"error": "Cannot register a device for another user"}, status=403)
+        elif not settings.FCM_LEGACY_USER_ID_REGISTRATION:
+            return Response({"error": "Sign in to register this device"}, status=401)
+        else:
+            # legacy app versions register by user_id before signing in
+            user = User.objects.filter(id=user_id, deleted=False).first()
+            if not user:
+                return Response({"error": "User not found"}, status=404)
+            # only the signed-in owner may move a token to another account,
+            # or anyone could take over a device's pushes with a user_id
+            if FCMDevice.objects.filter(token=token).exclude(user=user).exists():
+                return Response({"error": "Sign in to register this device"}, status=401)
+
+        register_device(user, token, platform)
 
         return Response({"status": "Token saved"}, status=201)